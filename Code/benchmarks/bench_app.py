@@ -0,0 +1,216 @@
+"""
+Headless benchmark of the dashboard's rerun path.
+
+Drives streamlit_finale.py through streamlit.testing.v1.AppTest on the
+bundled data (no network) and replays interaction scripts against the
+Part 1 and Part 2 widgets. For every step it records the wall time of the
+rerun, the peak Python memory allocated during it (tracemalloc) and the
+serialized size of the chart elements sent to the browser. tracemalloc
+slows Python down several times over, so memory is measured in a separate
+pass from the timed ones, first, with the query caches empty: a pass after
+the timed ones would only see cache hits.
+
+AppTest always reruns the whole script, so the times are full-rerun times;
+fragment-only reruns in a live server are cheaper.
+
+Every session pass is preceded by a short calibration loop, and each step
+is also recorded relative to it (step time / calibration time). The gate
+compares the fastest relative times of the repeats, so a slower or busier
+machine, even one that changes speed during the run, does not read as a
+regression. A step regresses when it is slower by more than --threshold
+and by more than --min-delta-ms (the baseline scaled to this machine).
+
+    python Code/benchmarks/bench_app.py                    # compare with the saved baseline
+    python Code/benchmarks/bench_app.py --update-baseline  # record a new baseline
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from datetime import date
+
+CODE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, CODE_DIR)
+
+from data_loader import DATA_DIR, PLOT2_FILE, WEEKLY_FILE  # noqa: E402
+
+APP_PATH = os.path.join(CODE_DIR, 'streamlit_finale.py')
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines', 'bench_app.json')
+CHART_ELEMENTS = ['vega_lite_chart', 'arrow_vega_lite_chart']
+
+
+def widget(at, kind, label):
+    """The first widget of `kind` (e.g. 'selectbox') whose label starts with `label`."""
+    return next(w for w in getattr(at, kind) if w.label.startswith(label))
+
+
+# Each script is a list of (step name, action); the action changes widgets before the rerun
+SCRIPTS = {
+    'part1': [
+        ('date range', lambda at: widget(at, 'slider', 'Select a range of date').set_range(date(2020, 3, 1), date(2020, 6, 30))),
+        ('swap countries', lambda at: widget(at, 'multiselect', 'Countries').set_value(['Italy', 'Spain', 'Brazil', 'India'])),
+        ('metric', lambda at: widget(at, 'selectbox', 'Metric').set_value('Deaths')),
+        ('case unit', lambda at: widget(at, 'radio', 'Case Unit').set_value('Weekly Case per 100k')),
+        ('log10', lambda at: widget(at, 'checkbox', 'log10 scale').check()),
+    ],
+    'part2': [
+        ('x factor', lambda at: widget(at, 'selectbox', 'Select X-axis factor').set_value('GDP')),
+        ('ratio', lambda at: widget(at, 'selectbox', 'Ratio category').set_value('covid_deaths_ratio')),
+        ('countries', lambda at: widget(at, 'multiselect', 'Country').set_value(['US', 'Canada', 'Mexico', 'Brazil', 'Peru', 'Chile'])),
+        ('factor slider', lambda at: widget(at, 'slider', 'Select Range for').set_range(1000.0, 40000.0)),
+        ('case type', lambda at: widget(at, 'selectbox', 'Case Type').set_value('deaths')),
+    ],
+}
+
+
+def chart_payload_bytes(at):
+    return sum(element.proto.ByteSize() for kind in CHART_ELEMENTS for element in at.get(kind))
+
+
+def measure(at, action=None, trace_memory=False):
+    if action is not None:
+        action(at)
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    at.run()
+    seconds = time.perf_counter() - start
+    if trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return {'peak_bytes': peak}
+    if at.exception:
+        raise RuntimeError(f"App raised: {at.exception[0].message}")
+    return {'seconds': seconds, 'payload_bytes': chart_payload_bytes(at)}
+
+
+def calibrate(repeats=3):
+    """Fastest time of a fixed NumPy and pandas workload, the yardstick of this machine's speed."""
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({'key': rng.integers(0, 200, 200_000), 'value': rng.random(200_000)})
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        df.groupby('key')['value'].agg(['mean', 'sum', 'max'])
+        np.sort(df['value'].to_numpy())
+        sum(i * i for i in range(200_000))
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def clear_caches():
+    import streamlit as st
+
+    from query_cache import query_cache
+
+    query_cache.clear()
+    st.cache_data.clear()
+
+
+def run_script(script, timeout, trace_memory=False):
+    """{step: measurement} for one fresh session replaying `script`."""
+    from streamlit.testing.v1 import AppTest
+
+    if trace_memory:
+        clear_caches()
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    results = {f'{script}/initial load': measure(at, trace_memory=trace_memory)}
+    for name, action in SCRIPTS[script]:
+        results[f'{script}/{name}'] = measure(at, action, trace_memory)
+    return results
+
+
+def run_benchmarks(repeats=5, timeout=120):
+    # Point the loaders at the bundled files so the benchmark never touches the network, and keep the
+    # startup prewarm thread (see startup.py) from competing with the timed reruns
+    os.environ.setdefault('SKITTY_WEEKLY_SOURCE', os.path.join(DATA_DIR, WEEKLY_FILE))
+    os.environ.setdefault('SKITTY_PLOT2_SOURCE', os.path.join(DATA_DIR, PLOT2_FILE))
+    os.environ['SKITTY_PREWARM'] = '0'
+
+    # Peak memory of one traced pass per script, each starting from empty query caches
+    memory = {}
+    for script in SCRIPTS:
+        memory.update(run_script(script, timeout, trace_memory=True))
+
+    samples = {}
+    for _ in range(repeats):
+        for script in SCRIPTS:
+            calibration = calibrate()
+            for step, result in run_script(script, timeout).items():
+                result['relative'] = result['seconds'] / calibration
+                samples.setdefault(step, []).append(result)
+
+    # Fastest of the repeats (the others only add noise), with the payload and peak memory
+    return {step: {'seconds': min(s['seconds'] for s in runs), 'relative': min(s['relative'] for s in runs),
+                   'payload_bytes': runs[-1]['payload_bytes'], **memory[step]}
+            for step, runs in samples.items()}
+
+
+def compare(results, baseline, threshold, min_delta):
+    """Steps whose time or payload grew by more than `threshold` (fraction) over the baseline.
+
+    Times are compared relative to the calibration loop; a slowdown also has to exceed `min_delta`
+    seconds once the baseline is scaled to this run's speed.
+    """
+    regressions = []
+    for step, result in results.items():
+        if step not in baseline:
+            continue
+        if 'relative' in baseline[step]:
+            growth = result['relative'] / baseline[step]['relative']
+            expected = result['seconds'] / growth
+        else:
+            expected = baseline[step]['seconds']
+        if result['seconds'] > expected * (1 + threshold) and result['seconds'] - expected > min_delta:
+            regressions.append(f"{step}: seconds {expected:.4g} (baseline at this speed) -> {result['seconds']:.4g}")
+        if result['payload_bytes'] > baseline[step]['payload_bytes'] * (1 + threshold):
+            regressions.append(f"{step}: payload_bytes {baseline[step]['payload_bytes']:.4g} -> "
+                               f"{result['payload_bytes']:.4g}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed relative slowdown / payload growth')
+    parser.add_argument('--min-delta-ms', type=float, default=20, help='allowed absolute slowdown of a step')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--output', help='also write the results to this JSON file')
+    parser.add_argument('--update-baseline', action='store_true')
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    results = run_benchmarks(args.repeats)
+    print(f"{'step':32s} {'time (ms)':>10s} {'peak mem (MB)':>14s} {'charts (KB)':>12s}")
+    for step, result in results.items():
+        print(f"{step:32s} {result['seconds'] * 1000:10.1f} {result['peak_bytes'] / 2**20:14.1f} "
+              f"{result['payload_bytes'] / 1024:12.1f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print("No baseline yet; run with --update-baseline")
+        return 0
+
+    with open(args.baseline) as f:
+        regressions = compare(results, json.load(f), args.threshold, args.min_delta_ms / 1000)
+    for regression in regressions:
+        print("REGRESSION", regression)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
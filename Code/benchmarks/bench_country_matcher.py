@@ -0,0 +1,79 @@
+"""
+Benchmark the indexed country matcher against the all-pairs scoring the notebook used.
+
+Queries are noisy variants (typos, dropped letters, reordered tokens, extra
+qualifiers) of the real country names in 'Cleaned Data'.
+
+    python Code/benchmarks/bench_country_matcher.py --queries 3000 --workers 4
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from country_matcher import CountryMatcher  # noqa: E402
+from data_loader import load_plot2_data, load_weekly_data  # noqa: E402
+
+QUALIFIERS = ['Republic of', 'The', 'Rep.', 'State of', 'Islands']
+
+
+def noisy_variant(name, rng):
+    chars = list(name)
+    for _ in range(rng.randint(0, 2)):
+        i = rng.randrange(len(chars))
+        edit = rng.choice(['delete', 'substitute', 'transpose'])
+        if edit == 'delete' and len(chars) > 4:
+            del chars[i]
+        elif edit == 'substitute':
+            chars[i] = rng.choice('abcdefghijklmnopqrstuvwxyz')
+        elif i + 1 < len(chars):
+            chars[i], chars[i + 1] = chars[i + 1], chars[i]
+    tokens = ''.join(chars).split()
+    if rng.random() < 0.3:
+        rng.shuffle(tokens)
+    if rng.random() < 0.2:
+        tokens.append(rng.choice(QUALIFIERS))
+    return ' '.join(tokens)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--queries', type=int, default=3000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    weekly, _ = load_weekly_data()
+    plot2, _ = load_plot2_data()
+    choices = sorted(set(weekly['Country_Region'].astype(str)))
+    rng = random.Random(args.seed)
+    sources = choices + list(plot2['Country Name'])
+    queries = [noisy_variant(rng.choice(sources), rng) for _ in range(args.queries)]
+    matcher = CountryMatcher(choices)
+
+    start = time.perf_counter()
+    reference = [matcher.match_all_pairs(q) for q in queries]
+    all_pairs_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    indexed = [matcher.match(q) for q in queries]
+    indexed_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    parallel = matcher.match_many(queries, workers=args.workers)
+    parallel_seconds = time.perf_counter() - start
+
+    agreement = sum(a == b for a, b in zip(reference, indexed)) / len(queries)
+    assert all(parallel[q] == m for q, m in zip(queries, indexed))
+    print(f"{len(queries)} queries against {len(choices)} countries")
+    print(f"all pairs           {all_pairs_seconds:8.2f} s")
+    print(f"trigram index       {indexed_seconds:8.2f} s  ({all_pairs_seconds / indexed_seconds:.1f}x)")
+    print(f"index, {args.workers} workers   {parallel_seconds:8.2f} s  ({len(set(queries))} distinct names)")
+    print(f"agreement with all pairs: {agreement:.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""
+Load test of the query API (query_server.py) at increasing concurrency.
+
+Each client thread keeps one HTTP/1.1 connection open and sends requests
+drawn from a mix of Part 1 and Part 2 queries (random countries, date
+ranges, metrics, units and formats, with gzip accepted). A share of the
+requests revalidate with the ETag of an earlier response, as a browser or
+CDN would. Reports p50 / p99 latency, throughput and the 200 / 304 / error
+counts per concurrency level.
+
+Starts a server in this process on the bundled data unless --url is given:
+
+    python Code/benchmarks/bench_query_server.py --concurrency 1 4 16 64 --requests 2000
+    python Code/benchmarks/bench_query_server.py --url http://127.0.0.1:8765
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import sys
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_loader import DATA_DIR, PLOT2_FILE, WEEKLY_FILE  # noqa: E402
+
+FORMATS = ['json', 'csv', 'arrow']
+
+
+def random_request(meta, rng):
+    """Path and query string of one request of the mix."""
+    endpoint = rng.choices(['series', 'means', 'socioeconomic', 'correlations', 'regression'], [4, 2, 1, 1, 1])[0]
+    params = [('format', rng.choice(FORMATS))]
+    if endpoint in ('series', 'means'):
+        level = rng.choices(meta['levels'], [4, 1, 1])[0]
+        names = meta['countries'] if level == 'Countries' else meta['groups'][level]
+        params += [('country', c) for c in rng.sample(names, min(len(names), rng.randint(1, 7)))]
+        days = np.arange(np.datetime64(meta['start']), np.datetime64(meta['end']) + 1)
+        start, end = sorted(rng.sample(range(len(days)), 2))
+        params += [('start', str(days[start])), ('end', str(days[end])), ('level', level),
+                   ('metric', rng.choice(meta['metrics'])), ('unit', rng.choice(meta['units']))]
+    elif rng.random() < 0.5:
+        # Half of the Part 2 requests use all countries, like the app's default view
+        params += [('country', c) for c in rng.sample(meta['socioeconomic_countries'], 40)]
+    if endpoint == 'correlations':
+        params.append(('method', rng.choice(['pearson', 'spearman'])))
+    if endpoint == 'regression':
+        params += [('log', rng.choice('01')), ('robust', rng.choice('01'))]
+    return f'/{endpoint}?{urlencode(params)}'
+
+
+def client(url, paths, revalidate, seed, results):
+    rng = random.Random(seed)
+    parts = urlsplit(url)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=60)
+    etags = {}
+    for path in paths:
+        headers = {'Accept-Encoding': 'gzip'}
+        if path in etags and rng.random() < revalidate:
+            headers['If-None-Match'] = etags[path]
+        start = time.perf_counter()
+        try:
+            connection.request('GET', path, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            status = response.status
+            if response.getheader('ETag'):
+                etags[path] = response.getheader('ETag')
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=60)
+            status = 'error'
+        results.append((time.perf_counter() - start, status))
+    connection.close()
+
+
+def run_level(url, requests, concurrency, revalidate, rng):
+    """Send the request paths over `concurrency` connections; returns the latency and status summary."""
+    per_client = [[] for _ in range(concurrency)]
+    for i, path in enumerate(requests):
+        per_client[i % concurrency].append(path)
+    results = []
+    threads = [threading.Thread(target=client, args=(url, paths, revalidate, rng.random(), results))
+               for paths in per_client]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+
+    latencies = np.array([r[0] for r in results]) * 1000
+    statuses = [r[1] for r in results]
+    return {
+        'concurrency': concurrency,
+        'requests': len(results),
+        'p50_ms': round(float(np.percentile(latencies, 50)), 2),
+        'p99_ms': round(float(np.percentile(latencies, 99)), 2),
+        'requests_per_second': round(len(results) / seconds, 1),
+        'ok': statuses.count(200),
+        'not_modified': statuses.count(304),
+        'errors': len(statuses) - statuses.count(200) - statuses.count(304),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='server to test (default: start one in this process)')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument('--requests', type=int, default=1000, help='requests per concurrency level')
+    parser.add_argument('--distinct', type=int, default=200,
+                        help='distinct queries in the mix (repeats hit the result cache)')
+    parser.add_argument('--revalidate', type=float, default=0.3,
+                        help='share of repeated requests sent with If-None-Match')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='also write the results to this JSON file')
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if url is None:
+        os.environ.setdefault('SKITTY_WEEKLY_SOURCE', os.path.join(DATA_DIR, WEEKLY_FILE))
+        os.environ.setdefault('SKITTY_PLOT2_SOURCE', os.path.join(DATA_DIR, PLOT2_FILE))
+        from query_server import make_server
+        server = make_server(port=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f'http://127.0.0.1:{server.server_port}'
+
+    parts = urlsplit(url)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=60)
+    connection.request('GET', '/meta')
+    meta = json.loads(connection.getresponse().read())
+    connection.close()
+
+    rng = random.Random(args.seed)
+    mix = [random_request(meta, rng) for _ in range(args.distinct)]
+    print(f"{url}: {args.requests} requests per level, {len(set(mix))} distinct queries, "
+          f"{args.revalidate:.0%} revalidated")
+    print(f"{'clients':>8} {'p50 ms':>9} {'p99 ms':>9} {'req/s':>9} {'200':>6} {'304':>6} {'errors':>6}")
+    results = []
+    for concurrency in args.concurrency:
+        requests = [rng.choice(mix) for _ in range(args.requests)]
+        level = run_level(url, requests, concurrency, args.revalidate, rng)
+        results.append(level)
+        print(f"{concurrency:>8} {level['p50_ms']:>9.2f} {level['p99_ms']:>9.2f} {level['requests_per_second']:>9.1f} "
+              f"{level['ok']:>6} {level['not_modified']:>6} {level['errors']:>6}")
+
+    if server is not None:
+        server.shutdown()
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+Memory of several dashboard worker processes: private copies vs the shared store.
+
+Starts N processes that each load the dashboard data the way a Streamlit
+worker does, either privately (dashboard_snapshot.load_dashboard) or from a
+shared memory-mapped store (shared_store.open_dashboard). Every worker reads
+all the data arrays and builds the specs of the default charts. Then
+the memory of each is read from /proc/<pid>/smaps_rollup (Linux only):
+
+- RSS counts every resident page, including the ones it shares with others.
+- PSS divides each shared page among the processes that map it, so the sum
+  over the workers is what they really cost together.
+- Private counts the pages only that worker uses.
+
+    python Code/build_snapshot.py --publish /tmp/skitty-store
+    python Code/benchmarks/bench_shared_store.py --store /tmp/skitty-store --workers 1 2 4 8
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+
+CODE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, CODE_DIR)
+
+from data_loader import DATA_DIR, PLOT2_FILE, WEEKLY_FILE  # noqa: E402
+
+MODES = ['private', 'shared']
+
+
+def worker(mode, store_dir, ready, done):
+    import numpy as np
+
+    from chart_specs import LINE_WIDTH, MAP_HEIGHT, MAP_WIDTH, PROJECTION, heatmap_template, line_template, map_template
+    from dashboard_snapshot import load_dashboard
+    from shared_store import open_dashboard
+
+    queries, _ = load_dashboard() if mode == 'private' else open_dashboard(store_dir)
+    # Touch every array, as the queries of a few sessions would
+    arrays = [queries.cube.values, queries.prefix.prefix, queries.correlation.n, queries.correlation.sx,
+              queries.correlation.sxx, queries.correlation.sxy]
+    arrays += [rollup.cube.values for rollup in queries.rollups.values()]
+    for array in arrays:
+        np.nansum(array)
+    map_template(MAP_WIDTH, MAP_HEIGHT, PROJECTION)
+    line_template(queries.cube.units[0], False, LINE_WIDTH, 400)
+    heatmap_template()
+    ready.set()
+    done.wait()
+
+
+def smaps_rollup(pid):
+    """RSS, PSS and private memory of a process, in MB."""
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    return {'rss_mb': fields['Rss'], 'pss_mb': fields['Pss'],
+            'private_mb': fields['Private_Clean'] + fields['Private_Dirty']}
+
+
+def run(mode, n_workers, store_dir):
+    context = multiprocessing.get_context('spawn')
+    done = context.Event()
+    readies = [context.Event() for _ in range(n_workers)]
+    processes = [context.Process(target=worker, args=(mode, store_dir, ready, done)) for ready in readies]
+    for process in processes:
+        process.start()
+    for ready in readies:
+        ready.wait()
+    memory = [smaps_rollup(process.pid) for process in processes]
+    done.set()
+    for process in processes:
+        process.join()
+    return {
+        'mode': mode,
+        'workers': n_workers,
+        'rss_mb_per_worker': round(sum(m['rss_mb'] for m in memory) / n_workers, 1),
+        'private_mb_per_worker': round(sum(m['private_mb'] for m in memory) / n_workers, 1),
+        'total_pss_mb': round(sum(m['pss_mb'] for m in memory), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--store', default=os.environ.get('SKITTY_SHARED_STORE'),
+                        help='published shared store (see build_snapshot.py --publish)')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--output', help='also write the results to this JSON file')
+    args = parser.parse_args()
+    if not args.store:
+        parser.error('--store (or SKITTY_SHARED_STORE) is required')
+
+    os.environ.setdefault('SKITTY_WEEKLY_SOURCE', os.path.join(DATA_DIR, WEEKLY_FILE))
+    os.environ.setdefault('SKITTY_PLOT2_SOURCE', os.path.join(DATA_DIR, PLOT2_FILE))
+    print(f"{'mode':>8} {'workers':>8} {'RSS/worker':>11} {'private/worker':>15} {'total PSS':>10}  (MB)")
+    results = []
+    for n_workers in args.workers:
+        for mode in MODES:
+            result = run(mode, n_workers, args.store)
+            results.append(result)
+            print(f"{mode:>8} {n_workers:>8} {result['rss_mb_per_worker']:>11.1f} "
+                  f"{result['private_mb_per_worker']:>15.1f} {result['total_pss_mb']:>10.1f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,313 @@
+"""
+Concurrent-session load test of the dashboard server.
+
+Starts `streamlit run streamlit_finale.py` on the bundled data (or uses a
+running server with --url) and opens N browser-like sessions over
+Streamlit's websocket protocol (/_stcore/stream, protobuf BackMsg /
+ForwardMsg). Each session loads the page, then replays randomized widget
+interactions against the controls the page sends: it picks a widget, sets a
+random valid value (an option of a selectbox, radio or multiselect, a range
+of a slider, a checkbox state) and requests the rerun the browser would,
+scoped to the widget's fragment. The rerun latency is the time from the
+request to the server's script_finished message.
+
+Concurrency ramps through --sessions. Each level reports the p50 / p95 / p99
+rerun latency, reruns per second, errors, and the server's RSS (peak during
+the level and the growth per open session). Results are saved as JSON under
+benchmarks/results/ (one file per git revision by default), and --compare
+prints the change against an earlier file:
+
+    python Code/benchmarks/load_test.py --sessions 1 2 4 8 16 --interactions 20
+    python Code/benchmarks/load_test.py --compare Code/benchmarks/results/load_test-3a1e12d.json
+
+Load-test-only dependency: websockets.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import urllib.request
+
+import numpy as np
+from websockets.asyncio.client import connect
+
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+CODE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, CODE_DIR)
+
+from data_loader import DATA_DIR, PLOT2_FILE, WEEKLY_FILE  # noqa: E402
+
+APP_PATH = os.path.join(CODE_DIR, 'streamlit_finale.py')
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+WIDGETS = ['slider', 'selectbox', 'multiselect', 'radio', 'checkbox']
+DONE = {ForwardMsg.FINISHED_SUCCESSFULLY, ForwardMsg.FINISHED_FRAGMENT_RUN_SUCCESSFULLY}
+
+
+def random_state(kind, widget, rng):
+    """A WidgetState with a random valid value for a widget element of `kind`."""
+    state = WidgetState(id=widget.id)
+    if kind == 'slider':
+        steps = int(round((widget.max - widget.min) / widget.step))
+        picks = sorted(rng.sample(range(steps + 1), len(widget.default)) if steps >= len(widget.default)
+                       else [0] * len(widget.default))
+        state.double_array_value.data.extend(widget.min + pick * widget.step for pick in picks)
+    elif kind in ('selectbox', 'radio'):
+        state.string_value = rng.choice(list(widget.options))
+    elif kind == 'multiselect':
+        most = min(widget.max_selections or 7, len(widget.options))
+        state.string_array_value.data.extend(rng.sample(list(widget.options), rng.randint(1, most)))
+    else:
+        state.bool_value = rng.random() < 0.5
+    return state
+
+
+class Session:
+    """One browser tab: the widgets the page last sent and the values this session has set."""
+
+    def __init__(self, websocket, rng):
+        self.websocket = websocket
+        self.rng = rng
+        self.page_script_hash = ''
+        self.widgets = {}  # delta path -> (kind, element, fragment id)
+        self.states = {}  # widget id -> WidgetState
+        self.fragment_roots = {}  # fragment id -> delta path of the container the fragment draws into
+
+    async def rerun(self, fragment_id=''):
+        """Request a rerun with the current widget states; returns (seconds, ok)."""
+        live = {widget.id for _, widget, _ in self.widgets.values()}
+        msg = BackMsg()
+        msg.rerun_script.query_string = ''
+        msg.rerun_script.page_script_hash = self.page_script_hash
+        msg.rerun_script.fragment_id = fragment_id
+        msg.rerun_script.widget_states.widgets.extend(s for i, s in self.states.items() if i in live)
+        start = time.perf_counter()
+        await self.websocket.send(msg.SerializeToString())
+
+        seen, ok = set(), True
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(await self.websocket.recv())
+            kind = forward.WhichOneof('type')
+            if kind == 'new_session':
+                self.page_script_hash = forward.new_session.page_script_hash
+            elif kind == 'delta':
+                path = tuple(forward.metadata.delta_path)
+                seen.add(path)
+                fragment = forward.delta.fragment_id
+                if fragment and len(path) < len(self.fragment_roots.get(fragment, path + (0,))):
+                    self.fragment_roots[fragment] = path
+                if forward.delta.WhichOneof('type') != 'new_element':
+                    continue
+                element = forward.delta.new_element
+                element_type = element.WhichOneof('type')
+                if element_type == 'exception':
+                    ok = False
+                if element_type in WIDGETS:
+                    self.widgets[path] = (element_type, getattr(element, element_type), fragment)
+            elif kind == 'script_finished':
+                if forward.script_finished == ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    continue
+                ok = ok and forward.script_finished in DONE
+                break
+        seconds = time.perf_counter() - start
+
+        # Widgets the run did not send again are gone; a fragment run only redraws its own container
+        # (nested fragments included), as the browser does. Rerunning a fragment that is gone would hang.
+        root = self.fragment_roots.get(fragment_id, ()) if fragment_id else ()
+        for path in [p for p in self.widgets if p not in seen and p[:len(root)] == root]:
+            del self.widgets[path]
+        return seconds, ok
+
+    async def interact(self):
+        """Set a random widget to a random value and rerun its fragment."""
+        kind, widget, fragment_id = self.widgets[self.rng.choice(list(self.widgets))]
+        self.states[widget.id] = random_state(kind, widget, self.rng)
+        return await self.rerun(fragment_id)
+
+
+async def run_session(url, interactions, think, timeout, seed, results, close):
+    """Open a session, load the page, replay `interactions` reruns; append (phase, seconds, ok) to `results`."""
+    rng = random.Random(seed)
+    async with connect(url, subprotocols=['streamlit'], max_size=None, open_timeout=60) as websocket:
+        session = Session(websocket, rng)
+        seconds, ok = await asyncio.wait_for(session.rerun(), timeout)
+        results.append(('load', seconds, ok))
+        for _ in range(interactions):
+            if think:
+                await asyncio.sleep(rng.expovariate(1 / think))
+            seconds, ok = await asyncio.wait_for(session.interact(), timeout)
+            results.append(('rerun', seconds, ok))
+        await close.wait()
+
+
+async def first_load(url, timeout):
+    """Seconds one session takes to load the page (on a new server: the process's cold start)."""
+    async with connect(url, subprotocols=['streamlit'], max_size=None, open_timeout=60) as websocket:
+        seconds, _ = await asyncio.wait_for(Session(websocket, random.Random()).rerun(), timeout)
+    return seconds
+
+
+def server_rss(pid):
+    if pid is None:
+        return None
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            return next(int(line.split()[1]) * 1024 for line in f if line.startswith('VmRSS:'))
+    except (OSError, StopIteration):
+        return None
+
+
+async def run_level(url, n_sessions, interactions, think, timeout, seed, pid):
+    """Run `n_sessions` concurrent sessions; returns the level's summary."""
+    results, rss_samples = [], []
+    close = asyncio.Event()
+    rss_before = server_rss(pid)
+
+    async def sample_rss():
+        while True:
+            rss_samples.append(server_rss(pid) or 0)
+            await asyncio.sleep(0.25)
+
+    sampler = asyncio.create_task(sample_rss())
+    start = time.perf_counter()
+    sessions = [asyncio.create_task(run_session(url, interactions, think, timeout, seed * 1000 + i, results, close))
+                for i in range(n_sessions)]
+    # Every session stays open until all are done, so the RSS is read with all of them connected
+    while sum(phase == 'rerun' for phase, _, _ in results) < n_sessions * interactions:
+        if all(task.done() for task in sessions):
+            break
+        await asyncio.sleep(0.05)
+    seconds = time.perf_counter() - start
+    rss_open = server_rss(pid)
+    close.set()
+    await asyncio.gather(*sessions, return_exceptions=True)
+    sampler.cancel()
+    failed = [task.exception() for task in sessions if task.exception() is not None]
+
+    reruns = np.array([s for phase, s, _ in results if phase == 'rerun']) * 1000
+    loads = np.array([s for phase, s, _ in results if phase == 'load']) * 1000
+    summary = {
+        'sessions': n_sessions,
+        'reruns': len(reruns),
+        'p50_ms': round(float(np.percentile(reruns, 50)), 1) if len(reruns) else None,
+        'p95_ms': round(float(np.percentile(reruns, 95)), 1) if len(reruns) else None,
+        'p99_ms': round(float(np.percentile(reruns, 99)), 1) if len(reruns) else None,
+        'load_p50_ms': round(float(np.percentile(loads, 50)), 1) if len(loads) else None,
+        'reruns_per_second': round(len(reruns) / seconds, 2),
+        'errors': sum(not ok for _, _, ok in results) + len(failed),
+    }
+    if pid is not None:
+        summary['peak_rss_mb'] = round(max(rss_samples + [rss_open or 0]) / 2**20, 1)
+        summary['rss_per_session_mb'] = round((rss_open - rss_before) / n_sessions / 2**20, 2)
+    if failed:
+        summary['failure'] = repr(failed[0])
+    return summary
+
+
+def start_server(port):
+    """`streamlit run` the app headless on the bundled data; returns the process once it is healthy."""
+    env = dict(os.environ)
+    env.setdefault('SKITTY_WEEKLY_SOURCE', os.path.join(DATA_DIR, WEEKLY_FILE))
+    env.setdefault('SKITTY_PLOT2_SOURCE', os.path.join(DATA_DIR, PLOT2_FILE))
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'streamlit', 'run', APP_PATH, '--server.headless', 'true',
+         '--server.port', str(port), '--server.fileWatcherType', 'none', '--browser.gatherUsageStats', 'false'],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/_stcore/health', timeout=1):
+                return process
+        except OSError:
+            if process.poll() is not None:
+                break
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError('the Streamlit server did not become healthy')
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=CODE_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return time.strftime('%Y%m%d-%H%M%S')
+
+
+def print_levels(levels, previous=None, header=True):
+    previous = {level['sessions']: level for level in previous or []}
+    if header:
+        print(f"{'sessions':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'reruns/s':>9} {'errors':>6} "
+              f"{'peak RSS MB':>11} {'MB/session':>10}")
+    for level in levels:
+        print(f"{level['sessions']:>8} {level['p50_ms'] or 0:>8.1f} {level['p95_ms'] or 0:>8.1f} "
+              f"{level['p99_ms'] or 0:>8.1f} {level['reruns_per_second']:>9.2f} {level['errors']:>6} "
+              f"{level.get('peak_rss_mb', float('nan')):>11.1f} {level.get('rss_per_session_mb', float('nan')):>10.2f}")
+        before = previous.get(level['sessions'])
+        if before and before['p95_ms'] and level['p95_ms']:
+            print(f"{'':>8} vs previous: p95 {level['p95_ms'] / before['p95_ms'] - 1:+.0%}, "
+                  f"reruns/s {level['reruns_per_second'] / before['reruns_per_second'] - 1:+.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='running server to test, e.g. http://127.0.0.1:8501 (default: start one)')
+    parser.add_argument('--port', type=int, default=8599, help='port of the server this tool starts')
+    parser.add_argument('--pid', type=int, help='process id of the --url server, to report its RSS')
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 2, 4, 8], help='concurrency levels')
+    parser.add_argument('--interactions', type=int, default=10, help='reruns per session')
+    parser.add_argument('--think', type=float, default=0.0,
+                        help='mean pause between a session\'s interactions, in seconds (0: back to back)')
+    parser.add_argument('--timeout', type=float, default=120, help='seconds before a rerun counts as failed')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='results file (default: benchmarks/results/load_test-<git revision>.json)')
+    parser.add_argument('--compare', help='earlier results file to compare with')
+    args = parser.parse_args()
+
+    process = None
+    url = args.url
+    if url is None:
+        process = start_server(args.port)
+        url = f'http://127.0.0.1:{args.port}'
+    ws_url = url.replace('http', 'ws', 1).rstrip('/') + '/_stcore/stream'
+    pid = process.pid if process is not None else args.pid
+
+    levels = []
+    try:
+        # The first page load pays for the data load and caches; the levels measure the warm server
+        first_load_ms = round(asyncio.run(first_load(ws_url, args.timeout)) * 1000, 1)
+        print(f'First page load: {first_load_ms:.0f} ms')
+        for n_sessions in args.sessions:
+            levels.append(asyncio.run(run_level(ws_url, n_sessions, args.interactions, args.think, args.timeout,
+                                                args.seed + n_sessions, pid)))
+            print_levels(levels[-1:], header=len(levels) == 1)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        print(f"Compared with {previous['revision']} (first page load {previous['first_load_ms']:.0f} ms):")
+        print_levels(levels, previous['levels'])
+
+    revision = git_revision()
+    output = args.output or os.path.join(RESULTS_DIR, f'load_test-{revision}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({'revision': revision, 'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'url': url,
+                   'interactions': args.interactions, 'think': args.think, 'first_load_ms': first_load_ms,
+                   'levels': levels}, f, indent=2)
+    print(f'Saved {output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Build step: write the ready-to-serve dashboard snapshot before the app starts.
+
+Loads both sources (writing their Parquet snapshots, see data_loader.py),
+derives the weekly case cube, the region rollups, the Part 2 table and the
+similarity index of every metric and case unit, and builds the spec
+template of every chart variant the app can show:
+
+- Part 1: the map, the play-over-time map for every length of the date
+  range, and the line chart for every case unit, with and without log scale.
+- Part 2: bubble, scatter, bar and crossfilter charts for every factor,
+  ratio and case type combination, and the heatmap.
+
+Everything goes into the dashboard snapshot (see dashboard_snapshot.py), so
+a new app process starts from it without the CSV parsing, the reshapes or
+Altair. Run it after the data changes, e.g. after ingest.py in the deploy
+step; the rollups and similarity indexes of the previous snapshot are then
+extended with the changed weeks rather than built again:
+
+    python Code/build_snapshot.py
+
+With several app processes on one host, also publish it to their shared
+memory-mapped store (see shared_store.py); running workers switch to the new
+version on their next rerun:
+
+    python Code/build_snapshot.py --publish /srv/skitty/store
+"""
+import argparse
+import os
+import time
+
+import pandas as pd
+
+from chart_specs import (CASE_TYPES, LINE_WIDTH, MAP_HEIGHT, MAP_WIDTH, PROJECTION, animated_map_template, bar_spec,
+                         bubble_spec, crossfilter_spec, export_templates, heatmap_template, line_spec, map_template,
+                         scatter_spec)
+from dashboard_snapshot import load_dashboard, previous_dashboard, save_snapshot
+from data_loader import COVID_RATIOS, SOCIOECONOMIC_FACTORS
+from queries import DashboardQueries
+from shared_store import STORE_DIR, publish
+from similarity import SimilarityIndex
+
+
+def build_similarity(queries):
+    """Build the similarity indexes the previous snapshot did not have; returns how many there are."""
+    cube = queries.cube
+    for metric in cube.metrics:
+        for unit in cube.units:
+            if (metric, unit) not in queries.similarity:
+                queries.similarity[(metric, unit)] = SimilarityIndex.from_cube(cube, metric, unit)
+    return len(queries.similarity)
+
+
+def build_templates(queries):
+    """Build (and cache) the template of every chart variant of the app; returns how many there are."""
+    cube = queries.cube
+    plot2 = queries.plot2
+
+    map_template(MAP_WIDTH, MAP_HEIGHT, PROJECTION)
+    for n_weeks in range(1, len(cube.weeks) + 1):
+        animated_map_template(MAP_WIDTH, MAP_HEIGHT, PROJECTION, n_weeks)
+    lines = pd.DataFrame(columns=['Country_Region', 'Week_Start_Date', 'Case'])
+    for unit in cube.units:
+        for log_scale in (False, True):
+            line_spec(lines, unit, cube.metrics[0], log_scale, LINE_WIDTH)
+
+    heatmap_template()
+    no_fit = pd.DataFrame(columns=['x', 'fit', 'lower', 'upper'])
+    for x_axis in SOCIOECONOMIC_FACTORS:
+        for ratio in COVID_RATIOS:
+            for log_scale in (False, True):
+                scatter_spec(plot2, no_fit, x_axis, ratio, log_scale, [])
+            for y_axis in SOCIOECONOMIC_FACTORS:
+                bubble_spec(plot2, x_axis, y_axis, ratio)
+                for log_scale in (False, True):
+                    # The crossfilter shows every country, so its factor range is the whole table's
+                    crossfilter_spec(plot2, x_axis, y_axis, ratio, log_scale)
+        for case_type in CASE_TYPES:
+            bar_spec(plot2, case_type, x_axis)
+    return len(export_templates())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data-only', action='store_true', help='skip the chart templates')
+    parser.add_argument('--publish', nargs='?', const='', metavar='STORE',
+                        help='also publish to this shared store (default: SKITTY_SHARED_STORE)')
+    args = parser.parse_args()
+    store_dir = None
+    if args.publish is not None:
+        store_dir = args.publish or STORE_DIR
+        if not store_dir:
+            parser.error('--publish needs a store directory or SKITTY_SHARED_STORE')
+
+    start = time.perf_counter()
+    queries = DashboardQueries.from_sources(previous=previous_dashboard())
+    indexes = build_similarity(queries)
+    print(f'Derived the dashboard data (version {queries.version}, {indexes} similarity indexes) '
+          f'in {time.perf_counter() - start:.2f} s')
+
+    templates = 0
+    if not args.data_only:
+        start = time.perf_counter()
+        templates = build_templates(queries)
+        print(f'Built {templates} chart templates in {time.perf_counter() - start:.2f} s')
+
+    path = save_snapshot(queries, templates=not args.data_only)
+    print(f'Wrote {path} ({os.path.getsize(path) / 2**20:.1f} MB)')
+
+    _, report = load_dashboard(save=False)
+    print(report.summary())
+
+    if store_dir:
+        name = publish(queries, store_dir)
+        print(f'Published {name} to {store_dir}')
+
+
+if __name__ == '__main__':
+    main()
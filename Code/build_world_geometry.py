@@ -0,0 +1,62 @@
+"""
+Build the bundled world TopoJSON used by the Part 1 choropleth.
+
+Reads the Natural Earth 1:110m admin-0 countries shapefile (the same source
+as vega_datasets' world_110m), keys every country by its ISO 3166 numeric
+code (the `country-code` column of Weekly Data.csv) and writes one TopoJSON
+file per simplification level into 'Cleaned Data/geo'.
+
+Build-only dependencies: pyshp, pycountry, topojson (+ shapely).
+
+    python Code/build_world_geometry.py ne_110m_admin_0_countries.shp
+"""
+import argparse
+import json
+import os
+
+import pycountry
+import shapefile
+import topojson
+
+from world_geometry import GEOMETRY_DIR, GEOMETRY_LEVELS, geometry_path
+
+
+def read_countries(shapefile_path):
+    reader = shapefile.Reader(shapefile_path)
+    fields = [f[0] for f in reader.fields[1:]]
+    iso_field = next(f for f in ['ISO_A3', 'iso_a3', 'ADM0_A3'] if f in fields)
+    name_field = next(f for f in ['NAME', 'name', 'ADMIN'] if f in fields)
+
+    features = []
+    for shape_record in reader.shapeRecords():
+        record = shape_record.record.as_dict()
+        country = pycountry.countries.get(alpha_3=record[iso_field])
+        features.append({
+            'type': 'Feature',
+            # Countries without an ISO numeric code (e.g. Kosovo) keep the Natural Earth placeholder
+            'properties': {'id': int(country.numeric) if country else -99, 'name': record[name_field]},
+            'geometry': shape_record.shape.__geo_interface__,
+        })
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def build(shapefile_path):
+    countries = read_countries(shapefile_path)
+    os.makedirs(GEOMETRY_DIR, exist_ok=True)
+    for level, (quantization, tolerance) in GEOMETRY_LEVELS.items():
+        topology = topojson.Topology(countries, object_name='countries', prequantize=quantization,
+                                     toposimplify=tolerance, presimplify=False, ignore_index=True)
+        topo = json.loads(topology.to_json())
+        # Keep only the numeric id: the app joins its own country names server-side
+        for geometry in topo['objects']['countries']['geometries']:
+            geometry['id'] = geometry.pop('properties')['id']
+        path = geometry_path(level)
+        with open(path, 'w') as f:
+            json.dump(topo, f, separators=(',', ':'))
+        print(f"{level}: {len(topo['arcs'])} arcs, {os.path.getsize(path) / 1024:.0f} KB -> {path}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('shapefile', help='Natural Earth 1:110m admin-0 countries shapefile')
+    build(parser.parse_args().shapefile)
@@ -0,0 +1,195 @@
+"""
+Dense country x week x metric x unit cube for the Part 1 charts.
+
+Replaces the long (melted) frame: every Part 1 selection is an array slice,
+and only the selected slice is turned into a DataFrame for Altair.
+
+Weeks are indexed by their sorted Week_Start_Date, and a day -> week table
+built once from two binary searches over them turns a date range into two
+lookups whatever the number of years loaded. MMWR_week is kept as a
+label only: the notebook derived it from the ISO week number, which repeats
+every year.
+
+Besides the three scalings of the weekly sums, the unit axis carries trend
+measures (rolling mean, cumulative to date, week-over-week growth and
+doubling time), derived once for every country in a single vectorized pass
+along the sorted week axis.
+"""
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+
+from data_loader import CASE_METRICS
+
+BASE_UNITS = ['Weekly Case', 'Weekly Case per 100k', 'Weekly Case per km2']
+UNIT_SUFFIXES = ['', '_per_100k', '_per_km2']
+
+ROLLING_WEEKS = 4
+TREND_UNITS = [f'Weekly Case ({ROLLING_WEEKS}-week mean)', f'Weekly Case per 100k ({ROLLING_WEEKS}-week mean)',
+               'Cumulative Case', 'Cumulative Case per 100k', 'Week-over-week growth (%)', 'Doubling time (weeks)']
+CASE_UNITS = BASE_UNITS + TREND_UNITS
+
+
+def rolling_mean(x, window):
+    """Mean of the reported values in the last `window` weeks (axis 1); NaN where the week itself is missing."""
+    present = ~np.isnan(x)
+    sums = np.cumsum(np.where(present, x, 0.0), axis=1)
+    counts = np.cumsum(present, axis=1)
+    sums[:, window:] -= sums[:, :-window].copy()
+    counts[:, window:] -= counts[:, :-window].copy()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(present & (counts > 0), sums / counts, np.nan)
+
+
+def cumulative(x):
+    """Running total along axis 1 (missing weeks add nothing and stay NaN)."""
+    return np.where(np.isnan(x), np.nan, np.nancumsum(x, axis=1))
+
+
+def previous_week(x):
+    shifted = np.full_like(x, np.nan)
+    shifted[:, 1:] = x[:, :-1]
+    return shifted
+
+
+def derive_trends(weekly, weekly_per_100k, window=ROLLING_WEEKS):
+    """
+    TREND_UNITS of (country, week, metric) arrays, stacked on a last axis.
+    Growth compares each week with the previous one; doubling time is
+    ln 2 / ln(cumulative growth factor), undefined when the total did not grow.
+    """
+    weekly = weekly.astype(np.float64)
+    weekly_per_100k = weekly_per_100k.astype(np.float64)
+    total = cumulative(weekly)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        last_week = previous_week(weekly)
+        growth = np.where(last_week > 0, (weekly / last_week - 1) * 100, np.nan)
+        factor = total / previous_week(total)
+        doubling = np.where(factor > 1, np.log(2) / np.log(factor), np.nan)
+    return np.stack([rolling_mean(weekly, window), rolling_mean(weekly_per_100k, window),
+                     total, cumulative(weekly_per_100k), growth, doubling], axis=-1)
+
+
+class CaseCube:
+    def __init__(self, values, countries, country_codes, weeks, mmwr_weeks, metrics=CASE_METRICS, units=CASE_UNITS):
+        self.values = values  # float32, shape (country, week, metric, unit); NaN where a country has no report
+        self.countries = np.asarray(countries, dtype=object)
+        self.country_codes = np.asarray(country_codes)
+        self.weeks = np.asarray(weeks, dtype='datetime64[D]')  # sorted week start dates
+        self.mmwr_weeks = np.asarray(mmwr_weeks)
+        self.metrics = list(metrics)
+        self.units = list(units)
+
+        self.country_index = {name: i for i, name in enumerate(self.countries)}
+        self.metric_index = {name: i for i, name in enumerate(self.metrics)}
+        self.unit_index = {name: i for i, name in enumerate(self.units)}
+
+    @classmethod
+    def from_weekly(cls, df1):
+        """Scatter the derived weekly table (one row per country-week) into the cube."""
+        countries, country_pos = np.unique(df1['Country_Region'].astype(str).to_numpy(), return_inverse=True)
+        weeks, week_pos = np.unique(df1['Week_Start_Date'].to_numpy(), return_inverse=True)
+
+        values = np.full((len(countries), len(weeks), len(CASE_METRICS), len(CASE_UNITS)), np.nan, dtype=np.float32)
+        for m, metric in enumerate(CASE_METRICS):
+            for u, suffix in enumerate(UNIT_SUFFIXES):
+                values[country_pos, week_pos, m, u] = df1[metric + suffix].to_numpy(dtype=np.float32)
+        values[..., len(BASE_UNITS):] = derive_trends(values[..., 0], values[..., 1])
+
+        country_codes = np.zeros(len(countries), dtype=np.int16)
+        country_codes[country_pos] = df1['country-code'].to_numpy()
+        mmwr_weeks = np.zeros(len(weeks), dtype=np.int16)
+        mmwr_weeks[week_pos] = df1['MMWR_week'].to_numpy()
+        return cls(values, countries, country_codes, weeks, mmwr_weeks)
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes + self.weeks.nbytes + self.country_codes.nbytes + self.mmwr_weeks.nbytes
+
+    @property
+    def date_bounds(self):
+        """(first day, last day) covered by the weeks, as datetime.date."""
+        return self.weeks[0].item(), (self.weeks[-1] + 6).item()
+
+    @cached_property
+    def weeks_started(self):
+        """Number of weeks starting on or before each day, from a week before the first week to the last week end.
+
+        Built on the first date range, so the rollup cubes, which are never sliced by date, skip it.
+        """
+        days = np.arange(self.weeks[0] - 7, self.weeks[-1] + 7)
+        return np.searchsorted(self.weeks, days, side='right').astype(np.int32)
+
+    def _weeks_started_by(self, day):
+        offset = int((np.datetime64(day, 'D') - self.weeks[0] + 7).astype(int))
+        return int(self.weeks_started[min(max(offset, 0), len(self.weeks_started) - 1)])
+
+    def date_slice(self, start_date, end_date):
+        """Positions of the weeks overlapping [start_date, end_date] (both inclusive)."""
+        # A week overlaps the range when it starts on or before the end and after the start - 7
+        lo = self._weeks_started_by(np.datetime64(start_date, 'D') - 7)
+        hi = self._weeks_started_by(end_date)
+        return slice(lo, max(lo, hi))
+
+    def first_changed_week(self, previous):
+        """Position of the first week whose values differ from `previous` (the cube of an earlier load).
+
+        len(weeks) when none does; None when the countries, metrics or units differ, i.e. anything
+        derived from `previous` has to be built again.
+        """
+        if not (np.array_equal(self.countries, previous.countries) and self.metrics == previous.metrics
+                and self.units == previous.units):
+            return None
+        n = min(len(self.weeks), len(previous.weeks))
+        same_week = self.weeks[:n] == previous.weeks[:n]
+        n = n if same_week.all() else int(np.argmin(same_week))
+        # The trend units follow from the base ones (and only from earlier weeks)
+        new = self.values[:, :n, :, :len(BASE_UNITS)]
+        old = previous.values[:, :n, :, :len(BASE_UNITS)]
+        changed = np.flatnonzero((~((new == old) | (np.isnan(new) & np.isnan(old)))).any(axis=(0, 2, 3)))
+        return int(changed[0]) if len(changed) else n
+
+    def _country_positions(self, countries):
+        return np.array([self.country_index[c] for c in countries if c in self.country_index], dtype=np.intp)
+
+    def select(self, countries, weeks, metric, unit):
+        """Long frame (Country_Region, country-code, Week_Start_Date, MMWR_week, Case) for one metric and unit."""
+        rows = self._country_positions(countries)
+        block = self.values[rows, weeks, self.metric_index[metric], self.unit_index[unit]]
+        n_weeks = block.shape[1]
+        present = ~np.isnan(block)
+        country_pos = np.repeat(rows, n_weeks).reshape(block.shape)[present]
+        week_pos = np.tile(np.arange(n_weeks), len(rows)).reshape(block.shape)[present]
+        return pd.DataFrame({
+            'Country_Region': self.countries[country_pos],
+            'country-code': self.country_codes[country_pos],
+            'Week_Start_Date': self.weeks[weeks][week_pos],
+            'MMWR_week': self.mmwr_weeks[weeks][week_pos],
+            'Case': block[present],
+        })
+
+    def all_countries(self, weeks, metric, unit):
+        """Every country's value in each selected week: id (country code), week (position in the slice), Week_Start_Date, Country_Region, Case."""
+        block = self.values[:, weeks, self.metric_index[metric], self.unit_index[unit]]
+        country_pos, week_pos = np.nonzero(~np.isnan(block))
+        return pd.DataFrame({
+            'id': self.country_codes[country_pos],
+            'week': week_pos.astype(np.int16),
+            'Week_Start_Date': self.weeks[weeks][week_pos],
+            'Country_Region': pd.Categorical.from_codes(country_pos, self.countries),
+            'Case': block[country_pos, week_pos],
+        })
+
+    def mean_by_country(self, countries, weeks, metric, unit):
+        """Mean weekly value per country over the selected weeks (countries without data are dropped)."""
+        rows = self._country_positions(countries)
+        block = self.values[rows, weeks, self.metric_index[metric], self.unit_index[unit]]
+        counts = (~np.isnan(block)).sum(axis=1)
+        keep = counts > 0
+        means = np.nansum(block, axis=1)[keep] / counts[keep]
+        return pd.DataFrame({
+            'Country_Region': self.countries[rows[keep]],
+            'country-code': self.country_codes[rows[keep]],
+            'Case': means,
+        })
@@ -0,0 +1,377 @@
+"""
+Vega-Lite spec templates for the dashboard charts.
+
+Each chart is built with Altair once per layout variant (the fields and
+scales it encodes) around named datasets, converted to a spec dict and
+cached. A rerun only fills in the datasets and a few top-level values such
+as the title, so Altair's validation and serialization no longer run on
+every interaction. Tabular datasets are shipped to the browser as Arrow by
+st.vega_lite_chart; only the columns a chart encodes are sent.
+
+Altair is imported by the template builders only: templates restored from
+the dashboard snapshot (see build_snapshot.py) or attached from the shared
+store (see shared_store.py) are served without it.
+"""
+import functools
+import json
+
+# Layout of the live app (also used by export_charts.py and build_snapshot.py)
+MAP_WIDTH, MAP_HEIGHT, PROJECTION = 600, 300, 'equirectangular'
+LINE_WIDTH = 600
+
+# (builder name, *layout arguments) -> template spec, shared by every session
+_templates = {}
+# Same keys -> JSON bytes (e.g. views of a memory-mapped file), parsed the first time a template is used
+_serialized = {}
+
+
+def template(build):
+    """Cache the spec `build(*args)` returns, under the builder's name and arguments."""
+    @functools.wraps(build)
+    def cached(*args):
+        key = (build.__name__,) + args
+        if key not in _templates:
+            serialized = _serialized.get(key)
+            _templates[key] = json.loads(bytes(serialized)) if serialized is not None else build(*args)
+        return _templates[key]
+    return cached
+
+
+def export_templates():
+    """Every template built so far, as JSON-able [key, spec] pairs."""
+    return [[list(key), spec] for key, spec in _templates.items()]
+
+
+def load_templates(entries):
+    """Add templates saved with export_templates (already built ones are kept)."""
+    for key, spec in entries:
+        _templates.setdefault(tuple(key), spec)
+
+
+def attach_templates(serialized):
+    """Use the JSON `serialized` templates (key tuple -> bytes-like) for keys not built yet, parsing them lazily."""
+    global _serialized
+    _serialized = dict(serialized)
+
+
+def _title(name):
+    return name.replace('_', ' ').title()
+
+
+def fill(template, datasets=None, **top_level):
+    """Spec of one rerun: the cached template with its datasets and top-level values (e.g. title) set."""
+    spec = dict(template)
+    if datasets:
+        spec['datasets'] = datasets
+    spec.update(top_level)
+    return spec
+
+
+# Part 1
+@template
+def map_template(width, height, projection):
+    """Choropleth over the joined topology (pass it as `data`); countries without a value are gray."""
+    import altair as alt
+
+    chart = alt.Chart(alt.Data(name='countries')).mark_geoshape(stroke='white').encode(
+        color=alt.condition('isValid(datum.properties.Case)',
+                            alt.Color('properties.Case:Q', scale=alt.Scale(scheme="yelloworangebrown"), title='Case'),
+                            alt.value('#aaa')),
+        tooltip=[
+            alt.Tooltip('properties.Country_Region:N', title='Country_Region'),
+            alt.Tooltip('properties.Case:Q', title='Case')
+        ]
+    ).properties(
+        width=width,
+        height=height
+    ).project(projection)
+    return chart.to_dict()
+
+
+def map_spec(topology, title, width, height, projection):
+    # TopoJSON stays inline in the spec; Streamlit only moves tabular data to Arrow
+    data = {'values': topology, 'format': {'type': 'topojson', 'feature': 'countries'}}
+    return fill(map_template(width, height, projection), data=data, title=title)
+
+
+@template
+def animated_map_template(width, height, projection, n_weeks):
+    """
+    Choropleth of one week at a time, picked with a slider bound to the `week` param.
+    The bare topology ('world') is sent once with every week's values ('weeks': id, week,
+    Country_Region, Case); moving the slider only re-filters in the browser.
+    """
+    import altair as alt
+
+    week = alt.param(name='week', value=0, bind=alt.binding_range(min=0, max=n_weeks - 1, step=1, name='Week '))
+    case_max = alt.param(name='case_max', value=1.0)  # fixed color domain, so the weeks are comparable
+    week_labels = alt.param(name='week_labels', value=[])
+    world = alt.Data(name='world', format=alt.DataFormat(type='topojson', feature='countries'))
+
+    background = alt.Chart(world).mark_geoshape(fill='#aaa', stroke='white')
+    countries = alt.Chart(alt.Data(name='weeks')).transform_filter(
+        'datum.week == week'
+    ).transform_lookup(
+        lookup='id', from_=alt.LookupData(data=world, key='id'), as_='geo'
+    ).mark_geoshape(stroke='white').encode(
+        shape='geo:G',
+        color=alt.Color('Case:Q', title='Case',
+                        scale=alt.Scale(scheme="yelloworangebrown", domainMin=0, domainMax=alt.ExprRef('case_max'))),
+        tooltip=[
+            alt.Tooltip('Country_Region:N', title='Country_Region'),
+            alt.Tooltip('Case:Q', title='Case')
+        ]
+    )
+    chart = alt.layer(background, countries).add_params(
+        week, case_max, week_labels
+    ).properties(
+        width=width,
+        height=height
+    ).project(projection)
+    return chart.to_dict()
+
+
+def animated_map_spec(topology, weeks, week_labels, title, width, height, projection):
+    template = animated_map_template(width, height, projection, len(week_labels))
+    values = {'case_max': float(weeks['Case'].max()) if len(weeks) else 1.0, 'week_labels': list(week_labels)}
+    params = [dict(param, value=values[param['name']]) if param['name'] in values else param
+              for param in template['params']]
+    title = {'text': {'expr': f"{json.dumps(title)} + ', week of ' + week_labels[week]"}}
+    return fill(template, {'world': topology, 'weeks': weeks[['id', 'week', 'Country_Region', 'Case']]},
+                params=params, title=title)
+
+
+@template
+def line_template(y_title, log_scale, width, height):
+    """Weekly line per country; `lines` has Country_Region, Week_Start_Date and Case."""
+    import altair as alt
+
+    scale = alt.Scale(type='log', base=10) if log_scale else alt.Undefined
+    chart = alt.Chart(alt.Data(name='lines')).mark_line(point=True).encode(
+        x=alt.X("Week_Start_Date:T", title='Week'),
+        y=alt.Y("Case:Q", scale=scale, title=y_title),
+        color=alt.Color(field='Country_Region'),
+        tooltip=[alt.Tooltip('Country_Region:N'), alt.Tooltip('Week_Start_Date:T'), alt.Tooltip('Case:Q')]
+    ).properties(
+        width=width,
+        height=height
+    )
+    return chart.to_dict()
+
+
+def line_spec(lines, case_cat, metric, log_scale, width, height=400):
+    y_title = f'log10 {case_cat}' if log_scale else case_cat
+    template = line_template(y_title, log_scale, width, height)
+    return fill(template, {'lines': lines[['Country_Region', 'Week_Start_Date', 'Case']]},
+                title=f'{case_cat} of {metric}')
+
+
+# Part 2
+@template
+def bubble_template(x_axis, y_axis, ratio_category):
+    import altair as alt
+
+    chart = alt.Chart(alt.Data(name='countries')).mark_circle().encode(
+        x=alt.X(f'{x_axis}:Q', title=_title(x_axis)),
+        y=alt.Y(f'{y_axis}:Q', title=_title(y_axis)),
+        size=alt.Size(f'{ratio_category}:Q', title=_title(ratio_category), scale=alt.Scale(range=[100, 1000])),
+        color=alt.Color('country:N', legend=None),
+        tooltip=['country:N', f'{ratio_category}:Q', f'{x_axis}:Q', f'{y_axis}:Q']
+    ).properties(
+        width=700,
+        height=500,
+        title=f'Bubble Chart: {_title(x_axis)} vs {_title(y_axis)} (Size: {_title(ratio_category)})'
+    )
+    return chart.to_dict()
+
+
+def bubble_spec(df, x_axis, y_axis, ratio_category):
+    columns = list(dict.fromkeys(['country', x_axis, y_axis, ratio_category]))
+    return fill(bubble_template(x_axis, y_axis, ratio_category), {'countries': df[columns]})
+
+
+@template
+def scatter_template(x_axis, ratio_category, log_scale):
+    """Countries, the fitted line and its confidence band (datasets 'countries' and 'fit')."""
+    import altair as alt
+
+    scale = alt.Scale(type='log') if log_scale else alt.Scale()
+    scatter_plot = alt.Chart(alt.Data(name='countries')).mark_circle(size=100).encode(
+        x=alt.X(f'{x_axis}:Q', title=_title(x_axis), scale=scale),
+        y=alt.Y(f'{ratio_category}:Q', title=_title(ratio_category), scale=scale),
+        color=alt.Color('country:N', legend=None),
+        tooltip=['country:N', f'{x_axis}:Q', f'{ratio_category}:Q']
+    )
+
+    # Regression line with slope and intercept in the tooltip, over its 95% confidence band
+    regression_line = alt.Chart(alt.Data(name='fit')).mark_line(color='red').encode(
+        x=alt.X('x:Q', title=_title(x_axis), scale=scale),
+        y=alt.Y('fit:Q', title=_title(ratio_category), scale=scale),
+        tooltip=[
+            alt.Tooltip('slope:Q', title='Slope'),
+            alt.Tooltip('intercept:Q', title='Intercept'),
+            alt.Tooltip('r2:Q', title='R²')
+        ]
+    )
+    regression_band = alt.Chart(alt.Data(name='fit')).mark_area(color='red', opacity=0.15).encode(
+        x=alt.X('x:Q', scale=scale),
+        y=alt.Y('lower:Q', scale=scale),
+        y2='upper:Q'
+    )
+
+    chart = alt.layer(
+        regression_band + scatter_plot + regression_line
+    ).properties(
+        width=700,
+        height=500
+    ).configure_title(
+        anchor='start',
+        fontSize=16,
+        fontWeight='bold',
+        subtitleFontSize=16,  # Subtitle styling
+        subtitleFontWeight='normal',
+        lineHeight=25  # Adjust title-subtitle spacing
+    )
+    return chart.to_dict()
+
+
+def scatter_spec(df, fit_line, x_axis, ratio_category, log_scale, subtitle):
+    columns = list(dict.fromkeys(['country', x_axis, ratio_category]))
+    title = {'text': f'Scatterplot: {_title(x_axis)} vs {_title(ratio_category)}', 'subtitle': subtitle}
+    return fill(scatter_template(x_axis, ratio_category, log_scale), {'countries': df[columns], 'fit': fit_line},
+                title=title)
+
+
+@template
+def heatmap_template():
+    import altair as alt
+
+    chart = alt.Chart(alt.Data(name='correlations')).mark_rect().encode(
+        x=alt.X('Variable 1:N', title='Socioeconomic Factors and COVID-19 Metrics'),
+        y=alt.Y('Variable 2:N', title='Socioeconomic Factors and COVID-19 Metrics'),
+        color=alt.Color('Correlation:Q', scale=alt.Scale(scheme='redblue')),
+        tooltip=['Variable 1:N', 'Variable 2:N', 'Correlation:Q']
+    ).properties(
+        width=600,
+        height=600
+    )
+    return chart.to_dict()
+
+
+def heatmap_spec(correlation_long, method):
+    return fill(heatmap_template(), {'correlations': correlation_long},
+                title=f"Correlation Heatmap ({method.title()})")
+
+
+@template
+def bar_template(case_type, x_axis):
+    import altair as alt
+
+    chart = alt.Chart(alt.Data(name='countries')).mark_bar().encode(
+        x=alt.X('country:N', title='Country', sort=alt.EncodingSortField(field=case_type, order='descending')),
+        y=alt.Y(f'{case_type}:Q', title=f'Total {case_type.capitalize()} Cases'),
+        color=alt.Color('country:N', legend=None),
+        tooltip=['country:N', f'{case_type}:Q', f'{x_axis}:Q']
+    ).properties(
+        width=700,
+        height=500,
+        title=f'Total {case_type.capitalize()} Cases by Country (Filtered by {_title(x_axis)})'
+    ).configure_axisX(
+        labelFontSize=10  # Set the font size for the x-axis labels
+    )
+    return chart.to_dict()
+
+
+def bar_spec(df, case_type, x_axis):
+    columns = list(dict.fromkeys(['country', case_type, x_axis]))
+    return fill(bar_template(case_type, x_axis), {'countries': df[columns]})
+
+
+CASE_TYPES = ['confirmed', 'active', 'deaths', 'recovered']
+
+
+@template
+def crossfilter_template(x_axis, y_axis, ratio_category, log_scale, x_min, x_max):
+    """
+    Bubble chart, scatter + regression and bar chart in one view over the 'countries' dataset,
+    linked by Vega-Lite params so selections filter in the browser without a rerun:
+    click (shift-click to add) countries on the bubble chart, brush the scatter, and set the
+    factor range and case type with the bound inputs under the chart.
+    """
+    import altair as alt
+
+    countries = alt.selection_point(name='picked', fields=['country'], on='click', clear='dblclick')
+    brush = alt.selection_interval(name='brush', encodings=['x', 'y'])
+    factor_min = alt.param(name='factor_min', value=x_min,
+                           bind=alt.binding_range(min=x_min, max=x_max, name=f'{_title(x_axis)} from '))
+    factor_max = alt.param(name='factor_max', value=x_max,
+                           bind=alt.binding_range(min=x_min, max=x_max, name=f'{_title(x_axis)} to '))
+    case_type = alt.param(name='case_type', value=CASE_TYPES[0],
+                          bind=alt.binding_radio(options=CASE_TYPES, name='Case type '))
+    in_range = f"datum['{x_axis}'] >= factor_min && datum['{x_axis}'] <= factor_max"
+    highlight = alt.condition(countries & brush, alt.value(0.9), alt.value(0.15))
+    scale = alt.Scale(type='log') if log_scale else alt.Scale()
+    base = alt.Chart(alt.Data(name='countries'))
+
+    bubble = base.mark_circle().encode(
+        x=alt.X(f'{x_axis}:Q', title=_title(x_axis)),
+        y=alt.Y(f'{y_axis}:Q', title=_title(y_axis)),
+        size=alt.Size(f'{ratio_category}:Q', title=_title(ratio_category), scale=alt.Scale(range=[100, 1000])),
+        color=alt.Color('country:N', legend=None),
+        opacity=highlight,
+        tooltip=['country:N', f'{ratio_category}:Q', f'{x_axis}:Q', f'{y_axis}:Q']
+    ).add_params(
+        countries
+    ).properties(
+        width=700,
+        height=400,
+        title='Click countries (shift-click for several, double-click to reset)'
+    )
+
+    points = base.mark_circle(size=100).encode(
+        x=alt.X(f'{x_axis}:Q', title=_title(x_axis), scale=scale),
+        y=alt.Y(f'{ratio_category}:Q', title=_title(ratio_category), scale=scale),
+        color=alt.Color('country:N', legend=None),
+        opacity=highlight,
+        tooltip=['country:N', f'{x_axis}:Q', f'{ratio_category}:Q']
+    ).add_params(
+        brush
+    )
+    # Fitted on the picked countries in the browser; a power fit is the straight line of the log-log view
+    regression_line = base.transform_filter(countries).transform_regression(
+        x_axis, ratio_category, method='pow' if log_scale else 'linear'
+    ).mark_line(color='red').encode(
+        x=alt.X(f'{x_axis}:Q', scale=scale),
+        y=alt.Y(f'{ratio_category}:Q', scale=scale)
+    )
+    scatter = alt.layer(points, regression_line).properties(
+        width=700,
+        height=400,
+        title=f'Scatterplot: {_title(x_axis)} vs {_title(ratio_category)} (drag to brush)'
+    )
+
+    bar = base.transform_filter(countries & brush).transform_filter(in_range).transform_fold(
+        CASE_TYPES, as_=['case_type', 'cases']
+    ).transform_filter('datum.case_type == case_type').mark_bar().encode(
+        x=alt.X('country:N', title='Country', sort=alt.EncodingSortField(field='cases', order='descending'),
+                axis=alt.Axis(labelFontSize=10)),
+        y=alt.Y('cases:Q', title='Total Cases'),
+        color=alt.Color('country:N', legend=None),
+        tooltip=['country:N', 'cases:Q', f'{x_axis}:Q']
+    ).add_params(
+        factor_min, factor_max, case_type
+    ).properties(
+        width=700,
+        height=400,
+        title=f'Total cases of the selected countries (filtered by {_title(x_axis)})'
+    )
+
+    return alt.vconcat(bubble, scatter, bar).to_dict()
+
+
+def crossfilter_spec(df, x_axis, y_axis, ratio_category, log_scale):
+    columns = list(dict.fromkeys(['country', x_axis, y_axis, ratio_category] + CASE_TYPES))
+    x_values = df[x_axis].dropna()
+    template = crossfilter_template(x_axis, y_axis, ratio_category, log_scale,
+                                    float(x_values.min()), float(x_values.max()))
+    return fill(template, {'countries': df[columns]})
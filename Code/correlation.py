@@ -0,0 +1,101 @@
+"""
+Subset-aware correlation engine for the Part 2 heatmap and scatter subtitle.
+
+Per-country sufficient statistics (pairwise-complete counts, sums, sums of
+squares and cross-products) are stored once. The Pearson matrix of any
+country subset is then a sum over the stored rows instead of a rescan of
+the data, and results are cached by subset.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+METHODS = ['pearson', 'spearman']
+
+
+class CorrelationEngine:
+    def __init__(self, df, columns, key='country', cache_size=128):
+        self.columns = list(columns)
+        self.keys = df[key].to_numpy()
+        self.values = df[self.columns].to_numpy(dtype=np.float64)
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()  # the engine is shared by every session
+
+        # Centre each column first (correlation is shift invariant) to keep the sums well conditioned
+        present = ~np.isnan(self.values)
+        centred = np.where(present, self.values - np.nanmean(self.values, axis=0), 0.0)
+        mask = present.astype(np.float64)
+        # Each array has shape (rows, p, p); entry [i, a, b] only counts row i if both a and b are present
+        self.n = mask[:, :, None] * mask[:, None, :]
+        self.sx = centred[:, :, None] * mask[:, None, :]
+        self.sxx = (centred ** 2)[:, :, None] * mask[:, None, :]
+        self.sxy = centred[:, :, None] * centred[:, None, :]
+        self.totals = [stat.sum(axis=0) for stat in (self.n, self.sx, self.sxx, self.sxy)]
+
+    def __getstate__(self):
+        # The subset cache and its lock belong to one process
+        state = self.__dict__.copy()
+        del state['_cache'], state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def rows(self, countries=None):
+        """Boolean row mask of the selected countries (all rows when None)."""
+        if countries is None:
+            return np.ones(len(self.keys), dtype=bool)
+        return np.isin(self.keys, list(countries))
+
+    def _sufficient_stats(self, rows):
+        # Sum whichever side of the subset is smaller
+        if rows.all():
+            return self.totals
+        if rows.sum() <= len(rows) / 2:
+            return [stat[rows].sum(axis=0) for stat in (self.n, self.sx, self.sxx, self.sxy)]
+        return [total - stat[~rows].sum(axis=0) for total, stat in zip(self.totals, (self.n, self.sx, self.sxx, self.sxy))]
+
+    def _pearson(self, rows):
+        n, sx, sxx, sxy = self._sufficient_stats(rows)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cov = n * sxy - sx * sx.T
+            var_a = n * sxx - sx ** 2
+            corr = cov / np.sqrt(var_a * var_a.T)
+        corr[n < 2] = np.nan
+        np.fill_diagonal(corr, np.where(np.diag(var_a) > 0, 1.0, np.nan))
+        return np.clip(corr, -1.0, 1.0)
+
+    def _spearman(self, rows):
+        # Ranks depend on the subset, so this one rescans the selected rows (pairwise complete, like pandas)
+        return pd.DataFrame(self.values[rows]).corr(method='spearman').to_numpy()
+
+    def matrix(self, countries=None, method='pearson'):
+        """Correlation matrix (DataFrame) of the selected countries."""
+        rows = self.rows(countries)
+        key = (np.packbits(rows).tobytes(), method)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        values = self._pearson(rows) if method == 'pearson' else self._spearman(rows)
+        result = pd.DataFrame(values, index=self.columns, columns=self.columns)
+        with self._lock:
+            self._cache[key] = result
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def pair(self, a, b, countries=None, method='pearson'):
+        """Correlation of two columns over the selected countries."""
+        return float(self.matrix(countries, method).loc[a, b])
+
+    def long(self, countries=None, method='pearson'):
+        """Matrix in the long (Variable 1, Variable 2, Correlation) format used by the heatmap."""
+        correlation_long = self.matrix(countries, method).reset_index().melt(id_vars='index')
+        correlation_long.columns = ['Variable 1', 'Variable 2', 'Correlation']
+        return correlation_long
@@ -0,0 +1,135 @@
+"""
+Country-name matching between the JHU, population, country-code and World Bank tables.
+
+Known mappings live in the persisted alias table 'Cleaned Data/country_aliases.csv'
+(one row per source name). Names that are neither aliased nor an exact match
+are resolved through a character trigram inverted index: only the candidate
+block sharing the most trigrams with the query is scored, instead of every
+choice as the notebook's process.extractOne did.
+"""
+import csv
+import os
+import re
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from difflib import SequenceMatcher
+
+import numpy as np
+
+from data_loader import DATA_DIR
+
+ALIAS_PATH = os.path.join(DATA_DIR, 'country_aliases.csv')
+
+
+def load_aliases(source=None, path=ALIAS_PATH):
+    """{source name: canonical name} for one source ('population', 'country_codes', 'world_bank') or all."""
+    aliases = {}
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            if source is None or row['source'] == source:
+                aliases[row['name']] = row['canonical']
+    return aliases
+
+
+def save_aliases(source, aliases, path=ALIAS_PATH):
+    """Add or update the aliases of one source in the persisted table."""
+    with open(path, newline='', encoding='utf-8') as f:
+        rows = [row for row in csv.DictReader(f)
+                if not (row['source'] == source and row['name'] in aliases)]
+    rows += [{'source': source, 'name': name, 'canonical': canonical} for name, canonical in aliases.items()]
+    rows.sort(key=lambda row: (row['source'], row['name']))
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=['source', 'name', 'canonical'])
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp_path, path)
+
+
+def normalize(name):
+    """Lowercase, drop punctuation and sort the tokens (the token_sort part of fuzz.token_sort_ratio)."""
+    return ' '.join(sorted(re.sub(r'[^\w\s]', ' ', name.lower()).split()))
+
+
+def compact(name):
+    """Lowercase with spaces and punctuation removed (the notebook's Clean_Country_Name)."""
+    return re.sub(r'[^\w]', '', name.lower())
+
+
+def score(a, b):
+    """0-100 similarity of two normalized names."""
+    return 100 * SequenceMatcher(None, a, b).ratio()
+
+
+def trigrams(text):
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class CountryMatcher:
+    def __init__(self, choices, aliases=None, threshold=80, block_size=8):
+        self.choices = list(dict.fromkeys(choices))
+        self.aliases = dict(aliases or {})
+        self.threshold = threshold
+        self.block_size = block_size
+
+        self.normalized = [normalize(c) for c in self.choices]
+        self.exact = {compact(c): c for c in self.choices}
+        postings = defaultdict(list)
+        for i, norm in enumerate(self.normalized):
+            for gram in trigrams(norm):
+                postings[gram].append(i)
+        self.postings = {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()}
+
+    def candidates(self, norm):
+        """Indices of the choices sharing the most trigrams with `norm`."""
+        hits = [self.postings[g] for g in trigrams(norm) if g in self.postings]
+        if not hits:
+            return np.empty(0, dtype=np.int32)
+        shared = np.bincount(np.concatenate(hits), minlength=len(self.choices))
+        n = min(self.block_size, np.count_nonzero(shared))
+        return np.argpartition(-shared, n - 1)[:n]
+
+    def match(self, name):
+        """Best choice for `name`, or None when nothing scores above the threshold."""
+        if name in self.aliases:
+            return self.aliases[name]
+        if compact(name) in self.exact:
+            return self.exact[compact(name)]
+        norm = normalize(name)
+        best, best_score = None, self.threshold
+        for i in self.candidates(norm):
+            s = score(norm, self.normalized[i])
+            if s > best_score:
+                best, best_score = self.choices[i], s
+        return best
+
+    def match_all_pairs(self, name):
+        """Reference implementation scoring every choice (what process.extractOne did)."""
+        if name in self.aliases:
+            return self.aliases[name]
+        if compact(name) in self.exact:
+            return self.exact[compact(name)]
+        norm = normalize(name)
+        best, best_score = None, self.threshold
+        for choice, choice_norm in zip(self.choices, self.normalized):
+            s = score(norm, choice_norm)
+            if s > best_score:
+                best, best_score = choice, s
+        return best
+
+    def match_many(self, names, workers=None):
+        """{name: match} for every distinct name; `workers` > 1 splits the batch over processes."""
+        unique = list(dict.fromkeys(names))
+        if not workers or workers < 2 or len(unique) < 2 * workers:
+            return {name: self.match(name) for name in unique}
+        batches = [unique[i::workers] for i in range(workers)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(self._match_batch, batches)
+        matches = {}
+        for batch, result in zip(batches, results):
+            matches.update(zip(batch, result))
+        return {name: matches[name] for name in unique}
+
+    def _match_batch(self, names):
+        return [self.match(name) for name in names]
@@ -0,0 +1,123 @@
+"""
+Ready-to-serve snapshot of everything the dashboard derives from the data.
+
+The snapshot holds the weekly case cube, the region rollups, the prepared
+Part 2 table, the prebuilt similarity indexes and the chart templates built
+so far (see chart_specs.py), in one pickle keyed by the data version. The
+version is computed from the source checksums, so a stale snapshot is never
+used. A new process that finds the snapshot skips the Parquet load, the cube
+scatter, the rollups and Altair altogether; one that does not builds them
+from the sources and writes the snapshot for the next. After an ingest, the
+newest snapshot of earlier data is the starting point: its rollups and
+similarity indexes are extended with the changed weeks only.
+
+Build it ahead of time (with every chart template) with build_snapshot.py.
+"""
+import glob
+import logging
+import os
+import pickle
+import time
+from dataclasses import dataclass
+
+from chart_specs import export_templates, load_templates
+from data_loader import (CACHE_DIR, PLOT2_FILE, WEEKLY_FILE, current_rss_bytes, resolve_source,
+                         source_checksum)
+from queries import DashboardQueries, data_version
+
+logger = logging.getLogger(__name__)
+
+# Bump when the pickled objects change shape so old snapshots are ignored
+DASHBOARD_SNAPSHOT_VERSION = 1
+
+
+@dataclass
+class SnapshotReport:
+    version: str
+    from_snapshot: bool
+    seconds: float
+    rss_bytes: int
+    templates: int
+    shared: bool = False  # opened from the shared store (see shared_store.py)
+
+    def summary(self):
+        origin = 'the shared store' if self.shared else 'snapshot' if self.from_snapshot else 'sources'
+        return (f"Loaded the dashboard data (version {self.version}) from {origin} in {self.seconds * 1000:.0f} ms "
+                f"({self.templates} prebuilt chart templates, process RSS {self.rss_bytes / 2**20:.0f} MB)")
+
+
+def sources():
+    return resolve_source(WEEKLY_FILE, 'SKITTY_WEEKLY_SOURCE'), resolve_source(PLOT2_FILE, 'SKITTY_PLOT2_SOURCE')
+
+
+def snapshot_path(version):
+    return os.path.join(CACHE_DIR, f'dashboard-v{DASHBOARD_SNAPSHOT_VERSION}-{version}.pkl')
+
+
+def save_snapshot(queries, templates=True):
+    """Write the derived data of `queries` (and the chart templates built so far) to its snapshot."""
+    content = {
+        'version': queries.version,
+        'modified': queries.modified,
+        'cube': queries.cube,
+        'rollups': queries.rollups,
+        'plot2': queries.plot2,
+        'similarity': queries.similarity,
+        'templates': export_templates() if templates else [],
+    }
+    path = snapshot_path(queries.version)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    # Write to a temp file first so concurrent processes never read a partial snapshot
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(content, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    return path
+
+
+def _read_snapshot(path):
+    try:
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError) as error:
+        logger.warning('Ignoring unreadable dashboard snapshot %s: %s', path, error)
+        return None
+
+
+def _queries(content):
+    return DashboardQueries(content['cube'], content['rollups'], content['plot2'], content['version'],
+                            content['modified'], similarity=content.get('similarity'))
+
+
+def previous_dashboard(version=None):
+    """DashboardQueries of the newest snapshot (of other data than `version`), or None when there is none."""
+    paths = [path for path in glob.glob(snapshot_path('*')) if path != snapshot_path(version)]
+    for path in sorted(paths, key=os.path.getmtime, reverse=True):
+        content = _read_snapshot(path)
+        if content is not None:
+            return _queries(content)
+    return None
+
+
+def load_dashboard(save=True):
+    """DashboardQueries of the current sources, from the snapshot when there is one; returns (queries, SnapshotReport)."""
+    start = time.perf_counter()
+    weekly_source, plot2_source = sources()
+    version = data_version(source_checksum(weekly_source), source_checksum(plot2_source))
+    path = snapshot_path(version)
+    content = _read_snapshot(path) if os.path.exists(path) else None
+
+    if content is not None:
+        queries = _queries(content)
+        load_templates(content['templates'])
+        templates = len(content['templates'])
+    else:
+        queries = DashboardQueries.from_sources(previous=previous_dashboard(version))
+        if save:
+            save_snapshot(queries, templates=False)
+        templates = 0
+
+    report = SnapshotReport(version=version, from_snapshot=content is not None, seconds=time.perf_counter() - start,
+                            rss_bytes=current_rss_bytes(), templates=templates)
+    logger.info(report.summary())
+    return queries, report
@@ -0,0 +1,202 @@
+"""
+Data loading layer for the Streamlit app.
+
+The weekly COVID-19 table is read from the local 'Cleaned Data' folder (or a
+configurable URL), derived once, and stored as a Parquet snapshot with compact
+dtypes. Snapshots are keyed by the checksum of the source file, so a new
+process only parses the CSV when the data actually changed.
+
+Run `python Code/data_loader.py` to build the snapshot ahead of time.
+"""
+import hashlib
+import io
+import json
+import logging
+import os
+import resource
+import time
+import urllib.error
+import urllib.request
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+CODE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(os.path.dirname(CODE_DIR), 'Cleaned Data')
+CACHE_DIR = os.environ.get('SKITTY_CACHE_DIR', os.path.join(CODE_DIR, '.cache'))
+
+REMOTE_DATA_URL = "https://raw.githubusercontent.com/wany115/BMI-706-SKITTY-Final-Project/refs/heads/main/Cleaned%20Data/"
+WEEKLY_FILE = 'Weekly Data.csv'
+PLOT2_FILE = 'plot2.csv'
+
+# Bump when the derived columns or dtypes change so old snapshots are ignored
+SNAPSHOT_VERSION = 2
+
+CASE_METRICS = ['Confirmed', 'Deaths', 'Recovered', 'Active']
+WEEKLY_COLUMNS = ['Country_Region', 'MMWR_week', 'Week_Start_Date', 'Confirmed', 'Deaths', 'Recovered', 'Active',
+                  'Population', 'Density (P/Km²)', 'alpha-2', 'alpha-3', 'country-code', 'region', 'sub-region']
+
+# Part 2 short column names (in plot2.csv order), factors and COVID ratios
+PLOT2_COLUMNS = ['country', 'health_expenditure', 'death_rate', 'GDP', 'life_expectancy', 'literacy_rate',
+                 'net_migration', 'poverty_ratio', 'unemployment', 'population', 'density', 'confirmed', 'deaths',
+                 'recovered', 'active']
+SOCIOECONOMIC_FACTORS = ['health_expenditure', 'death_rate', 'GDP', 'life_expectancy', 'literacy_rate',
+                         'net_migration', 'poverty_ratio', 'unemployment']
+COVID_RATIOS = ['covid_confirmed_ratio', 'covid_active_ratio', 'covid_deaths_ratio', 'covid_recovered_ratio']
+
+
+@dataclass
+class LoadReport:
+    source: str
+    checksum: str
+    from_snapshot: bool
+    seconds: float
+    rss_bytes: int
+    frame_bytes: int
+
+    def summary(self):
+        origin = 'snapshot' if self.from_snapshot else 'CSV'
+        return (f"Loaded {os.path.basename(self.source)} from {origin} in {self.seconds * 1000:.0f} ms "
+                f"({self.frame_bytes / 2**20:.1f} MB in memory, process RSS {self.rss_bytes / 2**20:.0f} MB)")
+
+
+def current_rss_bytes():
+    """Resident set size of this process (peak RSS where /proc is unavailable)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        # ru_maxrss is in KiB on Linux and bytes on macOS
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if os.uname().sysname == 'Darwin' else maxrss * 1024
+
+
+def resolve_source(file_name, env_var):
+    """Return the env override, the bundled local file, or the GitHub URL, in that order."""
+    override = os.environ.get(env_var)
+    if override:
+        return override
+    local_path = os.path.join(DATA_DIR, file_name)
+    if os.path.exists(local_path):
+        return local_path
+    return REMOTE_DATA_URL + urllib.request.quote(file_name)
+
+
+def _is_url(source):
+    return source.startswith(('http://', 'https://'))
+
+
+def _read_source_bytes(source):
+    if not _is_url(source):
+        with open(source, 'rb') as f:
+            return f.read()
+
+    # Remember the ETag of the last download so an unchanged remote file costs a 304
+    index_path = os.path.join(CACHE_DIR, 'remote_index.json')
+    index = {}
+    if os.path.exists(index_path):
+        with open(index_path) as f:
+            index = json.load(f)
+    cached = index.get(source)
+    request = urllib.request.Request(source)
+    if cached and os.path.exists(cached['path']):
+        request.add_header('If-None-Match', cached['etag'])
+    try:
+        with urllib.request.urlopen(request) as response:
+            content = response.read()
+            etag = response.headers.get('ETag')
+    except urllib.error.HTTPError as e:
+        if e.code != 304:
+            raise
+        with open(cached['path'], 'rb') as f:
+            return f.read()
+
+    if etag:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        path = os.path.join(CACHE_DIR, 'remote-' + hashlib.sha256(source.encode()).hexdigest()[:16] + '.csv')
+        with open(path, 'wb') as f:
+            f.write(content)
+        index[source] = {'etag': etag, 'path': path}
+        with open(index_path, 'w') as f:
+            json.dump(index, f)
+    return content
+
+
+def prepare_weekly(raw):
+    """Derive the per-100k / per-km² columns and downcast to compact dtypes."""
+    df1 = raw[WEEKLY_COLUMNS].copy()
+    df1['Country_Region'] = df1['Country_Region'].astype('category')
+    df1['MMWR_week'] = df1['MMWR_week'].astype(np.int16)
+    df1['Week_Start_Date'] = pd.to_datetime(df1['Week_Start_Date'])
+    df1['country-code'] = df1['country-code'].astype(np.int16)
+    for col in ['alpha-2', 'alpha-3', 'region', 'sub-region']:
+        df1[col] = df1[col].astype('category')
+
+    # Derive in float64, then store every measure as float32
+    for metric in CASE_METRICS:
+        df1[f'{metric}_per_100k'] = (df1[metric] / df1['Population']) * 100000
+    for metric in CASE_METRICS:
+        df1[f'{metric}_per_km2'] = df1[metric] / df1['Population'] * df1['Density (P/Km²)']
+    float_columns = df1.select_dtypes('float64').columns
+    df1[float_columns] = df1[float_columns].astype(np.float32)
+    return df1
+
+
+def source_checksum(source):
+    """sha256 of a source's bytes, without parsing it (a remote source is revalidated with its ETag)."""
+    return hashlib.sha256(_read_source_bytes(source)).hexdigest()
+
+
+def _load_snapshot(source, parse, name):
+    start = time.perf_counter()
+    content = _read_source_bytes(source)
+    checksum = hashlib.sha256(content).hexdigest()
+    snapshot_path = os.path.join(CACHE_DIR, f'{name}-v{SNAPSHOT_VERSION}-{checksum[:16]}.parquet')
+
+    from_snapshot = os.path.exists(snapshot_path)
+    if from_snapshot:
+        df = pd.read_parquet(snapshot_path)
+    else:
+        df = parse(pd.read_csv(io.BytesIO(content)))
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        # Write to a temp file first so concurrent processes never read a partial snapshot
+        tmp_path = f'{snapshot_path}.{os.getpid()}.tmp'
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, snapshot_path)
+
+    report = LoadReport(source=source, checksum=checksum, from_snapshot=from_snapshot,
+                        seconds=time.perf_counter() - start, rss_bytes=current_rss_bytes(),
+                        frame_bytes=int(df.memory_usage(deep=True).sum()))
+    logger.info(report.summary())
+    return df, report
+
+
+def load_weekly_data(source=None):
+    """Load the derived weekly table; returns (DataFrame, LoadReport)."""
+    source = source or resolve_source(WEEKLY_FILE, 'SKITTY_WEEKLY_SOURCE')
+    return _load_snapshot(source, prepare_weekly, 'weekly')
+
+
+def load_plot2_data(source=None):
+    """Load the raw annual socioeconomic table used by Part 2; returns (DataFrame, LoadReport)."""
+    source = source or resolve_source(PLOT2_FILE, 'SKITTY_PLOT2_SOURCE')
+    return _load_snapshot(source, lambda df: df, 'plot2')
+
+
+def prepare_plot2(df):
+    """Part 2 table: short column names plus each COVID count divided by population."""
+    df = df.copy()
+    df.columns = PLOT2_COLUMNS
+    for case in ['confirmed', 'deaths', 'recovered', 'active']:
+        df[f'covid_{case}_ratio'] = df[case] / df['population']
+    return df
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    for loader in [load_weekly_data, load_plot2_data]:
+        _, report = loader()
+        print(report.summary())
@@ -0,0 +1,74 @@
+"""
+Largest-Triangle-Three-Buckets downsampling for the Part 1 line chart.
+
+Each country series is reduced to a point budget derived from the chart
+width, so the payload stays bounded however much history is selected.
+The first and last points and each series' maximum and minimum are always
+kept; series already under budget are returned unchanged.
+
+At the app's chart width the budget is 300 points per series, so the
+bundled 2020 weekly data (52 weeks) is drawn whole and DashboardQueries.series
+skips the pass; the budget bounds the payload once several years of weekly
+data, or daily data, are loaded. It is not lowered to apply to one year:
+that would drop real weeks from a chart wide enough to show them all.
+"""
+import numpy as np
+import pandas as pd
+
+PIXELS_PER_POINT = 2
+
+
+def point_budget(width, pixels_per_point=PIXELS_PER_POINT):
+    """Points per series for a chart `width` pixels wide."""
+    return max(3, int(width) // pixels_per_point)
+
+
+def lttb(x, y, threshold):
+    """Indices of the points LTTB keeps out of (x, y), sorted by x."""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # Buckets between the fixed first and last points
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.intp)
+    keep = np.empty(threshold, dtype=np.intp)
+    keep[0] = 0
+    a = 0
+    for i in range(threshold - 2):
+        start, stop = edges[i], edges[i + 1]
+        # Average of the next bucket (the last point for the final bucket)
+        next_start, next_stop = stop, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_stop].mean()
+        avg_y = y[next_start:next_stop].mean()
+        # Point of this bucket forming the largest triangle with the previous pick and that average
+        area = np.abs((x[a] - avg_x) * (y[start:stop] - y[a]) - (x[a] - x[start:stop]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        keep[i + 1] = a
+    keep[-1] = n - 1
+    return keep
+
+
+def downsample_series(df, x, y, group, threshold):
+    """Rows of `df` kept by LTTB within each `group` series, plus every series' extremes."""
+    if len(df) == 0:
+        return df
+    # Order by series then x, and find each series' row range
+    df = df.sort_values([group, x], kind='stable')
+    groups = df[group].to_numpy()
+    bounds = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1], True])
+    x_values = df[x].to_numpy()
+    if np.issubdtype(x_values.dtype, np.datetime64):
+        x_values = x_values.astype('datetime64[ns]').astype(np.int64)
+    y_values = df[y].to_numpy(dtype=np.float64)
+
+    keep = []
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        if stop - start <= threshold:
+            keep.append(np.arange(start, stop))
+            continue
+        series_y = y_values[start:stop]
+        peaks = [np.argmax(series_y), np.argmin(series_y)]
+        keep.append(start + np.union1d(lttb(x_values[start:stop], series_y, threshold), peaks))
+    return df.iloc[np.concatenate(keep)].reset_index(drop=True)
@@ -0,0 +1,221 @@
+"""
+Pre-render the dashboard's default views to static HTML / SVG / PNG files.
+
+Enumerates every chart combination of the app, built with the same spec
+builders (chart_specs.py) and queries (DashboardQueries, loaded from the
+dashboard snapshot) as streamlit_finale.py:
+
+- Part 1: map and line chart for each Metric x Case_Category x region preset
+  over the full date range. The 'World' preset compares the regions, a
+  region preset its sub-regions; as in the app, the line chart has one
+  series per compared group and the map shows each group's mean on its
+  countries.
+- Part 2: bubble chart and scatter + OLS line for each factor x ratio pair,
+  over all countries (the bubble's Y axis is GDP, the app default).
+
+Specs are built in this process and rendered in a process pool with
+vl-convert. Each chart's inline spec (data included) is hashed; charts whose
+hash matches the manifest of the previous export, with all their files
+present, are skipped. SVG is rendered once and PNG converted from it.
+
+Export-only dependency: vl-convert-python.
+
+    python Code/export_charts.py --out exports --formats html svg png
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from chart_specs import LINE_WIDTH, MAP_HEIGHT, MAP_WIDTH, PROJECTION, bubble_spec, line_spec, map_spec, scatter_spec
+from dashboard_snapshot import load_dashboard
+from data_loader import CODE_DIR, COVID_RATIOS, SOCIOECONOMIC_FACTORS
+from downsample import point_budget
+from world_geometry import join_country_values
+
+FORMATS = ['html', 'svg', 'png']
+DEFAULT_OUT = os.path.join(os.path.dirname(CODE_DIR), 'exports')
+MANIFEST = 'manifest.json'
+
+
+def slug(text):
+    return re.sub(r'[^a-z0-9]+', '-', text.lower()).strip('-')
+
+
+def inline_spec(spec):
+    """Standalone spec: named DataFrame datasets become JSON records."""
+    spec = dict(spec)
+    if 'datasets' in spec:
+        spec['datasets'] = {name: json.loads(data.to_json(orient='records', date_format='iso'))
+                            if isinstance(data, pd.DataFrame) else data
+                            for name, data in spec['datasets'].items()}
+    return spec
+
+
+# Chart combinations: (name, spec) pairs, names are relative output paths without extension.
+# The data comes from the same DashboardQueries methods as the app's charts.
+def part1_charts(queries, map_detail='Standard'):
+    cube, regions, sub_regions = queries.cube, queries.rollups['Regions'], queries.rollups['Sub-regions']
+
+    # preset -> (level, compared groups)
+    presets = {'World': ('Regions', list(regions.groups))}
+    for region in regions.groups:
+        presets[region] = ('Sub-regions', [g for g in sub_regions.groups if sub_regions.parents[g] == region])
+
+    budget = point_budget(LINE_WIDTH)
+    for preset, (level, groups) in presets.items():
+        for metric in cube.metrics:
+            for case_cat in cube.units:
+                name = f'part1/{slug(preset)}/{slug(metric)}--{slug(case_cat)}'
+                means = queries.country_means(groups, None, None, metric, case_cat, level)
+                topology = join_country_values(map_detail, means)
+                yield (f'{name}--map',
+                       map_spec(topology, f'Average {case_cat} of {metric}', MAP_WIDTH, MAP_HEIGHT, PROJECTION))
+
+                lines = queries.series(groups, None, None, metric, case_cat, level, budget=budget)
+                yield f'{name}--line', line_spec(lines, case_cat, metric, False, LINE_WIDTH)
+
+
+def part2_charts(queries):
+    df = queries.socioeconomic()
+    for x_axis in SOCIOECONOMIC_FACTORS:
+        for ratio in COVID_RATIOS:
+            name = f'part2/{slug(x_axis)}--{slug(ratio)}'
+            yield f'{name}--bubble', bubble_spec(df, x_axis, 'GDP', ratio)
+
+            fit_line, subtitle = queries.scatter_fit(x_axis, ratio)
+            yield f'{name}--scatter', scatter_spec(df, fit_line, x_axis, ratio, False, subtitle)
+
+
+PARTS = {'part1': part1_charts, 'part2': part2_charts}
+
+
+# Rendering (runs in the worker processes)
+def _render(job):
+    name, spec_json, paths, png_scale = job
+    import vl_convert
+
+    start = time.perf_counter()
+    written = 0
+    svg = None
+    for fmt, path in paths.items():
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if fmt == 'html':
+            output = vl_convert.vegalite_to_html(spec_json).encode()
+        elif fmt == 'svg':
+            output = svg = svg or vl_convert.vegalite_to_svg(spec_json)
+            output = output.encode()
+        else:
+            svg = svg or vl_convert.vegalite_to_svg(spec_json)
+            output = vl_convert.svg_to_png(svg, scale=png_scale)
+        # Write next to the target and rename, so an interrupted export never leaves a partial file
+        tmp = f'{path}.tmp{os.getpid()}'
+        with open(tmp, 'wb') as f:
+            f.write(output)
+        os.replace(tmp, path)
+        written += len(output)
+    return name, time.perf_counter() - start, written
+
+
+def load_manifest(out):
+    try:
+        with open(os.path.join(out, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def export(out=DEFAULT_OUT, formats=FORMATS, parts=tuple(PARTS), workers=None, force=False, png_scale=1.0,
+           map_detail='Standard'):
+    """Render every chart whose data changed since the last export; returns the throughput report."""
+    import vl_convert
+
+    started = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    manifest = load_manifest(out)
+    # A new renderer or PNG scale can change every output
+    renderer = f'vl-convert {vl_convert.__version__}, png scale {png_scale}'
+    if manifest.get('renderer') != renderer:
+        force = True
+    charts = dict(manifest.get('charts', {}))
+
+    # Build the specs and keep only the charts that changed
+    queries, _ = load_dashboard()
+    jobs, skipped = [], 0
+    for part in parts:
+        generate = part1_charts(queries, map_detail) if part == 'part1' else part2_charts(queries)
+        for name, spec in generate:
+            spec_json = json.dumps(inline_spec(spec), sort_keys=True, separators=(',', ':'), default=str)
+            digest = hashlib.sha256(spec_json.encode()).hexdigest()
+            paths = {fmt: os.path.join(out, f'{name}.{fmt}') for fmt in formats}
+            previous = charts.get(name, {})
+            if (not force and previous.get('hash') == digest and set(formats) <= set(previous.get('formats', []))
+                    and all(os.path.exists(p) for p in paths.values())):
+                skipped += 1
+                continue
+            charts[name] = {'hash': digest, 'formats': list(formats)}
+            jobs.append((name, spec_json, paths, png_scale))
+    build_seconds = time.perf_counter() - started
+
+    render_started = time.perf_counter()
+    results = []
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for future in as_completed([pool.submit(_render, job) for job in jobs]):
+                results.append(future.result())
+    else:
+        results = [_render(job) for job in jobs]
+    render_seconds = time.perf_counter() - render_started
+
+    os.makedirs(out, exist_ok=True)
+    tmp = os.path.join(out, f'{MANIFEST}.tmp')
+    with open(tmp, 'w') as f:
+        json.dump({'renderer': renderer, 'charts': charts}, f, indent=1, sort_keys=True)
+    os.replace(tmp, os.path.join(out, MANIFEST))
+
+    total_seconds = time.perf_counter() - started
+    chart_seconds = np.array([r[1] for r in results])
+    written = sum(r[2] for r in results)
+    return {
+        'charts': len(jobs) + skipped,
+        'rendered': len(jobs),
+        'skipped': skipped,
+        'files': len(jobs) * len(formats),
+        'bytes_written': written,
+        'workers': workers,
+        'build_seconds': round(build_seconds, 3),
+        'render_seconds': round(render_seconds, 3),
+        'total_seconds': round(total_seconds, 3),
+        'charts_per_second': round(len(jobs) / render_seconds, 2) if jobs else 0.0,
+        'mb_per_second': round(written / 2**20 / render_seconds, 2) if jobs else 0.0,
+        'chart_ms_p50': round(float(np.median(chart_seconds)) * 1000, 1) if len(results) else 0.0,
+        'chart_ms_max': round(float(chart_seconds.max()) * 1000, 1) if len(results) else 0.0,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--out', default=DEFAULT_OUT, help='output directory (default: exports/ at the repo root)')
+    parser.add_argument('--formats', nargs='+', choices=FORMATS, default=FORMATS)
+    parser.add_argument('--parts', nargs='+', choices=list(PARTS), default=list(PARTS))
+    parser.add_argument('--workers', type=int, default=None, help='render processes (default: CPU count)')
+    parser.add_argument('--png-scale', type=float, default=1.0)
+    parser.add_argument('--map-detail', default='Standard', help='world geometry level of the maps')
+    parser.add_argument('--force', action='store_true', help='re-render charts whose data did not change')
+    parser.add_argument('--report', help='also write the throughput report to this JSON file')
+    args = parser.parse_args()
+
+    report = export(args.out, args.formats, args.parts, args.workers, args.force, args.png_scale, args.map_detail)
+    print(f"{report['rendered']} of {report['charts']} charts rendered ({report['skipped']} unchanged) "
+          f"in {report['total_seconds']:.1f} s: build {report['build_seconds']:.1f} s, "
+          f"render {report['render_seconds']:.1f} s with {report['workers']} workers, "
+          f"{report['charts_per_second']:.1f} charts/s, {report['mb_per_second']:.1f} MB/s")
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,206 @@
+"""
+Incremental ingestion of the JHU daily COVID-19 file into the cleaned tables.
+
+Runnable replacement for section 1.1 (and the annual totals of 1.2) of
+Data_wrangling.ipynb. The daily file is streamed in chunks and summed
+straight into country-week and country-year totals, so memory is bounded by
+the number of countries x weeks rather than by the size of the daily file.
+
+The last processed ObservationDate is kept in 'ingest_state.json' next to the
+outputs. A later run only aggregates the days after it and adds them to the
+existing 'Weekly Data.csv' and 'Annual Data.csv' (and to the case columns of
+'plot2.csv'), so a refresh never re-reads the full history into memory.
+Revisions to days that were already ingested are not picked up; use --full
+to rebuild from scratch. Then run build_snapshot.py, which extends the
+rollups and similarity indexes of the previous dashboard snapshot from the
+first week that changed.
+
+    python Code/ingest.py covid19_world.csv --population population_by_country_2020.csv \
+        --country-codes country_codes.csv
+"""
+import argparse
+import json
+import logging
+import os
+import time
+
+import pandas as pd
+
+from country_matcher import CountryMatcher, load_aliases
+from data_loader import CASE_METRICS, DATA_DIR, WEEKLY_FILE, PLOT2_FILE, current_rss_bytes
+
+logger = logging.getLogger(__name__)
+
+ANNUAL_FILE = 'Annual Data.csv'
+STATE_FILE = 'ingest_state.json'
+COUNTRY_CODES_URL = 'https://raw.githubusercontent.com/hms-dbmi/bmi706-2022/main/cancer_data/country_codes.csv'
+
+CODE_COLUMNS = ['alpha-2', 'alpha-3', 'country-code', 'iso_3166-2', 'region', 'sub-region', 'intermediate-region',
+                'region-code', 'sub-region-code', 'intermediate-region-code']
+WEEKLY_COLUMNS = ['Country_Region', 'MMWR_week', 'Week_Start_Date'] + CASE_METRICS + \
+                 ['Population', 'Density (P/Km²)'] + CODE_COLUMNS
+ANNUAL_COLUMNS = ['Country_Region', 'Year', 'Population', 'Density (P/Km²)'] + CASE_METRICS
+
+
+def read_daily_chunks(path, since=None, chunksize=500_000):
+    """Yield chunks of the daily file with normalised column names, keeping only days after `since`."""
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        chunk.columns = [c.replace('/', '_').replace(' ', '_') for c in chunk.columns]
+        chunk = chunk[['ObservationDate', 'Country_Region'] + [c for c in CASE_METRICS if c in chunk.columns]].copy()
+        chunk['ObservationDate'] = pd.to_datetime(chunk['ObservationDate'])
+        if 'Active' not in chunk.columns:
+            chunk['Active'] = chunk['Confirmed'] - chunk['Deaths'] - chunk['Recovered']
+        if since is not None:
+            chunk = chunk[chunk['ObservationDate'] > since]
+        if len(chunk):
+            yield chunk
+
+
+def aggregate_daily(path, since=None, chunksize=500_000):
+    """
+    Stream the daily file once and return (weekly, annual, last_date) partial sums
+    for the days after `since`: weekly is keyed by Country_Region and Week_Start_Date,
+    annual by Country_Region and Year.
+    """
+    weekly = None
+    annual = None
+    last_date = since
+    for chunk in read_daily_chunks(path, since, chunksize):
+        # Collapse provincial data into country-level data, then straight into weeks and years
+        chunk['Week_Start_Date'] = chunk['ObservationDate'] - pd.to_timedelta(chunk['ObservationDate'].dt.weekday, unit='D')
+        chunk['Year'] = chunk['ObservationDate'].dt.year
+        chunk_weekly = chunk.groupby(['Country_Region', 'Week_Start_Date'])[CASE_METRICS].sum()
+        chunk_annual = chunk.groupby(['Country_Region', 'Year'])[CASE_METRICS].sum()
+        weekly = chunk_weekly if weekly is None else weekly.add(chunk_weekly, fill_value=0)
+        annual = chunk_annual if annual is None else annual.add(chunk_annual, fill_value=0)
+        chunk_last = chunk['ObservationDate'].max()
+        last_date = chunk_last if last_date is None else max(last_date, chunk_last)
+    return weekly, annual, last_date
+
+
+def load_country_metadata(population_path, country_codes_path=COUNTRY_CODES_URL):
+    """Population, density and ISO/UN M49 codes per Country_Region (JHU naming)."""
+    pop = pd.read_csv(population_path)
+    pop_df = pop[['Country (or dependency)', 'Population (2020)', 'Density (P/Km²)']].copy()
+    pop_df = pop_df.rename(columns={'Country (or dependency)': 'Country_Region', 'Population (2020)': 'Population'})
+    pop_df['Country_Region'] = pop_df['Country_Region'].replace(load_aliases('population'))
+
+    country_df = pd.read_csv(country_codes_path)
+    country_df['Country_Region'] = country_df.pop('Country').replace(load_aliases('country_codes'))
+
+    # Several source names collapse onto one JHU name (e.g. Saint Martin); keep the first, as the notebook's 'first' did
+    pop_df = pop_df.drop_duplicates('Country_Region').set_index('Country_Region')
+    country_df = country_df.drop_duplicates('Country_Region').set_index('Country_Region')
+    return pop_df.join(country_df[CODE_COLUMNS], how='inner')
+
+
+def merge_weekly(existing, new_weekly, metadata):
+    """Add new country-week sums onto the existing weekly table (weeks straddling the cutoff are summed)."""
+    if existing is not None and len(existing):
+        existing = existing.copy()
+        existing['Week_Start_Date'] = pd.to_datetime(existing['Week_Start_Date'])
+        totals = existing.set_index(['Country_Region', 'Week_Start_Date'])[CASE_METRICS]
+        totals = totals.add(new_weekly, fill_value=0) if new_weekly is not None else totals
+        known = existing.drop_duplicates('Country_Region').set_index('Country_Region')[['Population', 'Density (P/Km²)'] + CODE_COLUMNS]
+        metadata = known if metadata is None else pd.concat([known, metadata[~metadata.index.isin(known.index)]])
+    else:
+        totals = new_weekly
+
+    weekly = totals.reset_index()
+    dropped = sorted(set(weekly['Country_Region']) - set(metadata.index))
+    if dropped:
+        logger.warning("No population/country code for %d countries, skipped: %s", len(dropped), ', '.join(dropped))
+    weekly = weekly.join(metadata, on='Country_Region', how='inner')
+    weekly[CASE_METRICS] = weekly[CASE_METRICS].astype(float)
+    weekly['MMWR_week'] = weekly['Week_Start_Date'].dt.isocalendar().week.astype(int)
+    weekly['Week_Start_Date'] = weekly['Week_Start_Date'].dt.strftime('%Y-%m-%d')
+    return weekly[WEEKLY_COLUMNS].sort_values(['Country_Region', 'Week_Start_Date']).reset_index(drop=True)
+
+
+def merge_annual(existing, new_annual, metadata):
+    """Add new country-year sums onto the existing annual table."""
+    if existing is not None and len(existing):
+        totals = existing.set_index(['Country_Region', 'Year'])[CASE_METRICS]
+        totals = totals.add(new_annual, fill_value=0) if new_annual is not None else totals
+        known = existing.drop_duplicates('Country_Region').set_index('Country_Region')[['Population', 'Density (P/Km²)']]
+        metadata = known if metadata is None else pd.concat([known, metadata[~metadata.index.isin(known.index)]])
+    else:
+        totals = new_annual
+    annual = totals.reset_index().join(metadata[['Population', 'Density (P/Km²)']], on='Country_Region', how='inner')
+    annual[CASE_METRICS] = annual[CASE_METRICS].astype(float)
+    return annual[ANNUAL_COLUMNS].sort_values(['Country_Region', 'Year']).reset_index(drop=True)
+
+
+def refresh_plot2(plot2, annual, year):
+    """Overwrite the Confirmed/Deaths/Recovered/Active columns of plot2 with the annual totals of `year`."""
+    year_totals = annual[annual['Year'] == year].set_index('Country_Region')[CASE_METRICS]
+    matcher = CountryMatcher(year_totals.index, aliases=load_aliases('world_bank'))
+    matched = plot2['Country Name'].map(matcher.match_many(plot2['Country Name']))
+    plot2 = plot2.copy()
+    plot2[CASE_METRICS] = year_totals.reindex(matched).to_numpy()
+    return plot2
+
+
+def _write_csv(df, path):
+    tmp_path = f'{path}.tmp'
+    df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def ingest(daily_path, population_path=None, country_codes_path=COUNTRY_CODES_URL, output_dir=DATA_DIR,
+           full=False, chunksize=500_000, plot2_year=2020):
+    start = time.perf_counter()
+    state_path = os.path.join(output_dir, STATE_FILE)
+    weekly_path = os.path.join(output_dir, WEEKLY_FILE)
+    annual_path = os.path.join(output_dir, ANNUAL_FILE)
+    plot2_path = os.path.join(output_dir, PLOT2_FILE)
+
+    state = {}
+    if not full and os.path.exists(state_path):
+        with open(state_path) as f:
+            state = json.load(f)
+    since = pd.Timestamp(state['last_observation_date']) if state else None
+    if since is None and population_path is None:
+        raise ValueError("A full ingestion needs --population (no ingest state found in %s)" % output_dir)
+
+    new_weekly, new_annual, last_date = aggregate_daily(daily_path, since, chunksize)
+    if new_weekly is None:
+        logger.info("No days after %s in %s, nothing to do", since.date(), daily_path)
+        return state
+
+    metadata = load_country_metadata(population_path, country_codes_path) if population_path else None
+    existing_weekly = pd.read_csv(weekly_path) if since is not None else None
+    existing_annual = pd.read_csv(annual_path) if since is not None else None
+    weekly = merge_weekly(existing_weekly, new_weekly, metadata)
+    annual = merge_annual(existing_annual, new_annual, metadata)
+
+    _write_csv(weekly, weekly_path)
+    _write_csv(annual, annual_path)
+    if os.path.exists(plot2_path):
+        _write_csv(refresh_plot2(pd.read_csv(plot2_path), annual, plot2_year), plot2_path)
+
+    state = {
+        'last_observation_date': last_date.strftime('%Y-%m-%d'),
+        'previous_observation_date': since.strftime('%Y-%m-%d') if since is not None else None,
+        'weekly_rows': len(weekly),
+        'annual_rows': len(annual),
+    }
+    with open(state_path, 'w') as f:
+        json.dump(state, f, indent=2)
+    logger.info("Ingested %s..%s in %.1f s (RSS %.0f MB)", state['previous_observation_date'] or 'start',
+                state['last_observation_date'], time.perf_counter() - start, current_rss_bytes() / 2**20)
+    return state
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('daily', help='JHU daily file (ObservationDate, Province/State, Country/Region, Confirmed, ...)')
+    parser.add_argument('--population', help='Population by country 2020 CSV (needed for the first run and for new countries)')
+    parser.add_argument('--country-codes', default=COUNTRY_CODES_URL, help='ISO / UN M49 country codes CSV')
+    parser.add_argument('--output-dir', default=DATA_DIR)
+    parser.add_argument('--full', action='store_true', help='ignore the ingest state and rebuild from scratch')
+    parser.add_argument('--chunksize', type=int, default=500_000)
+    parser.add_argument('--plot2-year', type=int, default=2020, help='year whose totals go into plot2.csv')
+    args = parser.parse_args()
+    ingest(args.daily, args.population, args.country_codes, args.output_dir, args.full, args.chunksize, args.plot2_year)
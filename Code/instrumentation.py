@@ -0,0 +1,150 @@
+"""
+Per-rerun timing spans for the Streamlit app.
+
+Each script run creates a Timings object and wraps its stages (load,
+reshape, filter, aggregate, chart build, render) in `timings.span(name)`.
+At the end of a run the spans are written as one JSON log line and added to
+process-wide totals, which can be written as a Prometheus text file (for the
+node_exporter textfile collector) by setting SKITTY_METRICS_FILE.
+
+Instrumentation is off unless SKITTY_TIMING=1 is set or the page is opened
+with `?timing=1`; disabled spans are a shared no-op context manager.
+"""
+import contextlib
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+METRICS_FILE = os.environ.get('SKITTY_METRICS_FILE')
+_NULL_SPAN = contextlib.nullcontext()
+
+# Totals over every run in this process: {span name: [count, seconds]}
+_totals = defaultdict(lambda: [0, 0.0])
+_totals_lock = threading.Lock()
+_collectors = []  # functions returning extra Prometheus lines (e.g. query cache counters)
+
+
+def timing_enabled(query_params=None):
+    """Whether timing is on, from SKITTY_TIMING or a `timing=1` query parameter."""
+    if os.environ.get('SKITTY_TIMING', '') not in ('', '0'):
+        return True
+    return query_params is not None and query_params.get('timing') == '1'
+
+
+def configure_logging():
+    """Send the JSON timing lines to stderr (Streamlit does not configure this logger)."""
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+
+class Timings:
+    def __init__(self, enabled=False, metrics_file=METRICS_FILE):
+        self.enabled = enabled
+        self.metrics_file = metrics_file
+        self.spans = []  # (run, span name, seconds) of the last emitted run
+        self._pending = []
+        self._run = 'script'
+        self._depth = 1  # the script run itself is open until finish()
+        self._start = time.perf_counter()
+
+    @contextlib.contextmanager
+    def _span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._pending.append((self._run, name, time.perf_counter() - start))
+
+    def span(self, name):
+        """Context manager timing one stage of the current run."""
+        return self._span(name) if self.enabled else _NULL_SPAN
+
+    def section(self, name):
+        """
+        Decorator for a fragment function. Its body is timed as one span, and
+        when the fragment reruns on its own (after the script run finished)
+        its spans are emitted as a separate run.
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                if self._depth == 0:
+                    self._run = name
+                    self._start = time.perf_counter()
+                self._depth += 1
+                try:
+                    with self._span(name):
+                        return func(*args, **kwargs)
+                finally:
+                    self._depth -= 1
+                    if self._depth == 0:
+                        self._emit()
+            return wrapper
+        return decorator
+
+    def finish(self):
+        """Close the script run and emit its spans."""
+        if self.enabled and self._depth:
+            self._depth = 0
+            self._emit()
+
+    def _emit(self):
+        spans, self._pending = self._pending, []
+        self.spans = spans
+        logger.info(json.dumps({
+            'event': 'rerun_timing',
+            'run': self._run,
+            'time': round(time.time(), 3),
+            'total_ms': round((time.perf_counter() - self._start) * 1000, 3),
+            'spans': [{'span': name, 'ms': round(seconds * 1000, 3)} for _, name, seconds in spans],
+        }))
+        with _totals_lock:
+            for _, name, seconds in spans:
+                _totals[name][0] += 1
+                _totals[name][1] += seconds
+        if self.metrics_file:
+            write_prometheus(self.metrics_file)
+
+    def table(self):
+        """Rows of (run, span, ms) for display."""
+        return [{'run': run, 'span': name, 'ms': round(seconds * 1000, 1)} for run, name, seconds in self.spans]
+
+
+def add_collector(func):
+    """Register a function returning extra lines for the Prometheus text file."""
+    _collectors.append(func)
+
+
+def prometheus_text():
+    """Process-wide span totals in the Prometheus text exposition format."""
+    with _totals_lock:
+        totals = sorted((name, count, seconds) for name, (count, seconds) in _totals.items())
+    lines = ['# HELP skitty_span_seconds Time spent in each stage of the Streamlit app.',
+             '# TYPE skitty_span_seconds summary']
+    for name, count, seconds in totals:
+        label = name.replace('\\', '\\\\').replace('"', '\\"')
+        lines.append(f'skitty_span_seconds_sum{{span="{label}"}} {seconds:.6f}')
+        lines.append(f'skitty_span_seconds_count{{span="{label}"}} {count}')
+    for collector in _collectors:
+        lines.extend(collector())
+    return '\n'.join(lines) + '\n'
+
+
+def write_prometheus(path):
+    """Atomically (re)write the Prometheus text file."""
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(prometheus_text())
+    os.replace(tmp_path, path)
@@ -0,0 +1,63 @@
+"""
+Per-country case totals over any date window, for the Part 2 ratios.
+
+plot2.csv carries the notebook's 2020 totals (the sum of every weekly value
+of a country). The store keeps, for each country and metric, the running
+sum of the weekly values with a leading zero, so the total over the weeks
+[lo, hi) is prefix[:, hi] - prefix[:, lo]: two lookups per country for any
+window, with no groupby over the weekly rows. Over the whole loaded range
+the totals are the plot2.csv ones.
+
+Part 2 rows are keyed by World Bank country names; they are mapped once to
+the weekly (JHU) names with the country matcher and its 'world_bank'
+aliases. Rows without a match get NaN totals.
+"""
+import numpy as np
+
+from country_matcher import CountryMatcher, load_aliases
+from data_loader import CASE_METRICS
+
+# Part 2 count columns, in CASE_METRICS order
+PLOT2_CASES = [metric.lower() for metric in CASE_METRICS]
+
+
+class PrefixStore:
+    def __init__(self, cube):
+        self.cube = cube
+        weekly = cube.values[:, :, :, cube.unit_index['Weekly Case']].astype(np.float64)
+        # (country, week + 1, metric); missing weeks add nothing
+        self.prefix = np.zeros((weekly.shape[0], weekly.shape[1] + 1, weekly.shape[2]))
+        np.cumsum(np.nan_to_num(weekly), axis=1, out=self.prefix[:, 1:])
+        self.matcher = CountryMatcher(cube.countries, aliases=load_aliases('world_bank'))
+        self._aligned = {}  # tuple of names -> cube rows; Part 2 always asks for the same names
+
+    @property
+    def nbytes(self):
+        return self.prefix.nbytes
+
+    def totals(self, weeks, rows=None):
+        """(country, metric) totals over the weeks of a slice, for the cube rows `rows` (all by default)."""
+        rows = slice(None) if rows is None else rows
+        return self.prefix[rows, weeks.stop] - self.prefix[rows, weeks.start]
+
+    def align(self, names):
+        """Cube row of each name (-1 where no weekly country matches)."""
+        names = tuple(names)
+        if names not in self._aligned:
+            matches = self.matcher.match_many(names)
+            self._aligned[names] = np.array([self.cube.country_index.get(matches[name], -1) for name in names],
+                                            dtype=np.intp)
+        return self._aligned[names]
+
+    def window_table(self, plot2, weeks):
+        """Copy of the Part 2 table with the case counts and COVID ratios of the window `weeks` (a slice)."""
+        rows = self.align(plot2['country'])
+        matched = rows >= 0
+        counts = np.full((len(plot2), len(PLOT2_CASES)), np.nan)
+        counts[matched] = self.totals(weeks, rows[matched])
+
+        table = plot2.copy()
+        table[PLOT2_CASES] = counts
+        for case in PLOT2_CASES:
+            table[f'covid_{case}_ratio'] = table[case] / table['population']
+        return table
@@ -0,0 +1,255 @@
+"""
+Filtering and aggregation behind the dashboard, importable without Streamlit.
+
+DashboardQueries holds the loaded data (weekly case cube, region rollups,
+Part 2 table and correlation engine) and answers the selections the app
+charts: Part 1 series and per-country means for a country or region
+selection, date range, metric and case unit, and the countries with the
+most similar curve (see similarity.py); Part 2 rows, correlations and
+regression fits (with the scatter chart's line and subtitle) for a
+country subset, with the case counts either the annual ones of plot2.csv
+or those of a date window (see prefix_store.py). streamlit_finale.py and
+export_charts.py draw from the same methods. Results go through the
+process-wide query cache (see query_cache.py), keyed by the normalized
+arguments and the data version, so streamlit_finale.py and query_server.py
+share them.
+Cached results are shared: treat them as read-only.
+"""
+import copy
+import hashlib
+import logging
+import os
+import time
+
+import numpy as np
+
+from case_cube import CaseCube
+from correlation import METHODS, CorrelationEngine
+from data_loader import COVID_RATIOS, SOCIOECONOMIC_FACTORS, load_plot2_data, load_weekly_data, prepare_plot2
+from downsample import downsample_series
+from prefix_store import PrefixStore
+from query_cache import query_cache
+from regression import fit_table, line_data
+from rollups import LEVELS, RegionRollup
+from similarity import SimilarityIndex
+
+logger = logging.getLogger(__name__)
+
+COMPARE_LEVELS = ['Countries'] + list(LEVELS)
+CORRELATION_COLUMNS = ['health_expenditure', 'death_rate', 'GDP', 'life_expectancy', 'literacy_rate', 'net_migration',
+                       'poverty_ratio', 'unemployment', 'population', 'density',
+                       'covid_confirmed_ratio', 'covid_deaths_ratio', 'covid_recovered_ratio', 'covid_active_ratio']
+
+
+def data_version(*checksums):
+    """Short hash of the source checksums (e.g. LoadReport.checksum)."""
+    return hashlib.sha256(''.join(checksums).encode()).hexdigest()[:16]
+
+
+def source_modified(*sources):
+    """Latest modification time of the local sources (now, if any source is remote)."""
+    if not all(os.path.exists(source) for source in sources):
+        return time.time()
+    return max(os.path.getmtime(source) for source in sources)
+
+
+class DashboardQueries:
+    def __init__(self, cube, rollups, plot2, version, modified=None, cache=query_cache, correlation=None, prefix=None,
+                 similarity=None):
+        self.cube = cube
+        self.rollups = rollups  # level name -> RegionRollup
+        self.plot2 = plot2  # prepared Part 2 table (data_loader.prepare_plot2)
+        # Derived from the above unless given (e.g. opened from the shared store, see shared_store.py)
+        self.correlation = CorrelationEngine(plot2, CORRELATION_COLUMNS) if correlation is None else correlation
+        self.prefix = PrefixStore(cube) if prefix is None else prefix
+        self.similarity = similarity or {}  # (metric, unit) -> SimilarityIndex prebuilt by build_snapshot.py
+        self.version = version
+        self.modified = modified or time.time()
+        self.cache = cache
+
+    @classmethod
+    def from_sources(cls, previous=None):
+        """Load both tables (through their Parquet snapshots) and derive everything from them.
+
+        With `previous` (the queries of an earlier load, e.g. the last dashboard snapshot), the rollups
+        and the prebuilt similarity indexes are extended from the first week the new data changed
+        rather than built again, as long as the countries are the same; a rollup is built again when
+        the population, area, region or sub-region of a country changed.
+        """
+        df1, weekly_report = load_weekly_data()
+        plot2, plot2_report = load_plot2_data()
+        cube = CaseCube.from_weekly(df1)
+        start = None if previous is None else cube.first_changed_week(previous.cube)
+        rollups, extended = {}, []
+        for level in LEVELS:
+            rollup = RegionRollup.from_countries(df1, cube.countries, level)
+            if start is not None and rollup.same_metadata(previous.rollups[level]):
+                # Shallow copy: extend replaces the arrays it changes, so `previous` stays as it was
+                rollups[level] = copy.copy(previous.rollups[level]).extend(cube, start)
+                extended.append(level)
+            else:
+                rollups[level] = rollup.extend(cube)
+        if start is None:
+            similarity = {key: SimilarityIndex.from_cube(cube, *key) for key in getattr(previous, 'similarity', {})}
+        else:
+            similarity = {key: copy.copy(index).extend(cube, previous.cube)
+                          for key, index in previous.similarity.items()}
+            logger.info('Extended the %s rollups and %d similarity indexes of version %s from week %d of %d',
+                        ', '.join(extended) or 'no', len(similarity), previous.version, start, len(cube.weeks))
+        return cls(cube, rollups, prepare_plot2(plot2), data_version(weekly_report.checksum, plot2_report.checksum),
+                   source_modified(weekly_report.source, plot2_report.source), similarity=similarity)
+
+    def _cached(self, key, compute):
+        return self.cache.get((self.version,) + key, compute)
+
+    def level_cube(self, level):
+        if level not in COMPARE_LEVELS:
+            raise ValueError(f'level must be one of {COMPARE_LEVELS}, got {level!r}')
+        return self.cube if level == 'Countries' else self.rollups[level].cube
+
+    def week_range(self, start_date=None, end_date=None):
+        """Week positions overlapping the dates (defaults: the first and last loaded day)."""
+        first_day, last_day = self.cube.date_bounds
+        return self.cube.date_slice(start_date or first_day, end_date or last_day)
+
+    def _check(self, metric, unit):
+        if metric not in self.cube.metric_index:
+            raise ValueError(f'metric must be one of {self.cube.metrics}, got {metric!r}')
+        if unit not in self.cube.unit_index:
+            raise ValueError(f'unit must be one of {self.cube.units}, got {unit!r}')
+
+    # Part 1
+    def series(self, countries, start_date, end_date, metric, unit, level='Countries', budget=None):
+        """Weekly rows (Country_Region, country-code, Week_Start_Date, MMWR_week, Case), LTTB-downsampled to `budget` points per series."""
+        self._check(metric, unit)
+        weeks = self.week_range(start_date, end_date)
+        # A series has at most one point per week, so under the budget LTTB would keep every point
+        if budget is not None and weeks.stop - weeks.start <= budget:
+            budget = None
+        key = ('series', level, tuple(sorted(countries)), weeks.start, weeks.stop, metric, unit, budget)
+
+        def compute():
+            selection = self.level_cube(level).select(countries, weeks, metric, unit)
+            if budget is None:
+                return selection
+            return downsample_series(selection, 'Week_Start_Date', 'Case', 'Country_Region', budget)
+        return self._cached(key, compute)
+
+    def country_means(self, countries, start_date, end_date, metric, unit, level='Countries'):
+        """Mean per country over the weeks (Country_Region, country-code, Case); a region's mean is repeated on its countries."""
+        self._check(metric, unit)
+        weeks = self.week_range(start_date, end_date)
+        key = ('means', level, tuple(sorted(countries)), weeks.start, weeks.stop, metric, unit)
+
+        def compute():
+            means = self.level_cube(level).mean_by_country(countries, weeks, metric, unit)
+            if level != 'Countries':
+                means = self.rollups[level].expand_to_countries(means, self.cube)
+            return means
+        return self._cached(key, compute)
+
+    def all_countries(self, start_date, end_date, metric, unit):
+        """Every country's value in each week (see CaseCube.all_countries)."""
+        self._check(metric, unit)
+        weeks = self.week_range(start_date, end_date)
+        key = ('all countries', weeks.start, weeks.stop, metric, unit)
+        return self._cached(key, lambda: self.cube.all_countries(weeks, metric, unit))
+
+    def similarity_index(self, metric, unit):
+        """Shape-similarity index of every country's series of one metric and unit, built once."""
+        self._check(metric, unit)
+        if (metric, unit) in self.similarity:
+            return self.similarity[(metric, unit)]
+        return self.cache.get((self.version, 'similarity index', metric, unit),
+                              lambda: SimilarityIndex.from_cube(self.cube, metric, unit),
+                              size=lambda index: index.nbytes)
+
+    def similar(self, country, metric, unit, k=6):
+        """The `k` countries whose curve is closest to `country`'s (Country_Region, distance, correlation)."""
+        if country not in self.cube.country_index:
+            raise ValueError(f'unknown country {country!r}')
+        if k < 1:
+            raise ValueError(f'k must be at least 1, got {k}')
+        # There are only so many other countries
+        k = min(int(k), len(self.cube.countries) - 1)
+        return self._cached(('similar', country, metric, unit, k),
+                            lambda: self.similarity_index(metric, unit).most_similar(country, k))
+
+    # Part 2: `window` is a (start date, end date) pair; None, or the whole loaded range, means the annual totals
+    def window_weeks(self, window):
+        """(start, stop) week positions of a date window, or None for the annual totals."""
+        if window is None:
+            return None
+        weeks = self.week_range(*window)
+        if (weeks.start, weeks.stop) == (0, len(self.cube.weeks)):
+            return None
+        return weeks.start, weeks.stop
+
+    def plot2_table(self, window=None):
+        """Part 2 table with the case counts and COVID ratios of the window."""
+        weeks = self.window_weeks(window)
+        if weeks is None:
+            return self.plot2
+        return self._cached(('plot2 window', weeks), lambda: self.prefix.window_table(self.plot2, slice(*weeks)))
+
+    def correlation_engine(self, window=None):
+        weeks = self.window_weeks(window)
+        if weeks is None:
+            return self.correlation
+        return self.cache.get((self.version, 'correlation engine', weeks),
+                              lambda: CorrelationEngine(self.plot2_table(window), CORRELATION_COLUMNS),
+                              size=lambda engine: sum(a.nbytes for a in (engine.n, engine.sx, engine.sxx, engine.sxy)))
+
+    def _countries(self, countries):
+        return tuple(sorted(self.plot2['country'] if countries is None else countries))
+
+    def socioeconomic(self, countries=None, window=None):
+        """Part 2 rows of the selected countries (all by default)."""
+        countries = self._countries(countries)
+        key = ('plot2 rows', countries, self.window_weeks(window))
+
+        def compute():
+            table = self.plot2_table(window)
+            return table[table['country'].isin(countries)]
+        return self._cached(key, compute)
+
+    def correlations(self, countries=None, method='pearson', window=None):
+        """Correlation matrix in long (Variable 1, Variable 2, Correlation) format."""
+        if method not in METHODS:
+            raise ValueError(f'method must be one of {METHODS}, got {method!r}')
+        countries = self._countries(countries)
+        return self._cached(('correlation', countries, method, self.window_weeks(window)),
+                            lambda: self.correlation_engine(window).long(countries, method))
+
+    def regression(self, countries=None, log_scale=False, robust=False, window=None):
+        """OLS (or Huber) fit of every socioeconomic factor x COVID ratio pair, indexed by (factor, ratio)."""
+        countries = self._countries(countries)
+        key = ('regression', countries, bool(log_scale), bool(robust), self.window_weeks(window))
+        return self._cached(key, lambda: fit_table(self.socioeconomic(countries, window), SOCIOECONOMIC_FACTORS,
+                                                   COVID_RATIOS, log_x=log_scale, log_y=log_scale, robust=robust))
+
+    def scatter_fit(self, x_axis, ratio, countries=None, log_scale=False, robust=False, window=None):
+        """Regression line of one factor x ratio pair over the countries' factor range, and the chart subtitle.
+
+        Returns (line, subtitle): the line has x, fit, lower, upper (regression.line_data) and the slope,
+        intercept and r2 of the fit; the subtitle lines give the correlation and the fit.
+        """
+        countries = self._countries(countries)
+        key = ('scatter fit', x_axis, ratio, countries, bool(log_scale), bool(robust), self.window_weeks(window))
+
+        def compute():
+            fit = self.regression(countries, log_scale, robust, window).loc[(x_axis, ratio)]
+            x_values = self.socioeconomic(countries, window)[x_axis].dropna()
+            if log_scale:
+                x_values = np.log10(x_values[x_values > 0])
+            line = line_data(fit, x_values.min(), x_values.max(), log_x=log_scale, log_y=log_scale)
+            line['slope'] = fit['slope']
+            line['intercept'] = fit['intercept']
+            line['r2'] = fit['r2']
+
+            correlation = self.correlation_engine(window).pair(x_axis, ratio, countries)
+            summary = f'Slope: {fit["slope"]:.3g} ± {fit["slope_se"]:.2g} (SE), R²: {fit["r2"]:.2f}, n = {int(fit["n"])}'
+            if log_scale:
+                summary += ' (log10 scale)'
+            return line, [f'Correlation: {correlation:.2f}', summary]
+        return self._cached(key, compute)
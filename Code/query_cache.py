@@ -0,0 +1,115 @@
+"""
+Process-wide memo cache for derived query results shared by every session.
+
+Entries are keyed by the normalized widget state (e.g. the sorted country
+tuple), evicted least-recently-used once their estimated size exceeds the
+memory budget, and computed only once when several sessions ask for the same
+key at the same time (single flight): the other callers wait for the first
+one's result. Cached values are shared, so callers must not modify them.
+
+The budget is SKITTY_QUERY_CACHE_MB (default 256 MB).
+"""
+import os
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import add_collector
+
+DEFAULT_BUDGET_MB = float(os.environ.get('SKITTY_QUERY_CACHE_MB', 256))
+
+
+def estimate_size(value):
+    """Approximate bytes held by a cached value."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class QueryCache:
+    def __init__(self, max_bytes=DEFAULT_BUDGET_MB * 2**20):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (value, size)
+        self._inflight = {}  # key -> Future of the computation in progress
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0  # requests that waited for an identical in-flight computation
+
+    def get(self, key, compute, size=estimate_size):
+        """Cached value of `key`, calling `compute()` once on a miss; `size(value)` estimates its bytes."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            waiting = self._inflight.get(key)
+            if waiting is None:
+                self.misses += 1
+                future = self._inflight[key] = Future()
+            else:
+                self.coalesced += 1
+        if waiting is not None:
+            return waiting.result()
+
+        try:
+            value = compute()
+            nbytes = size(value)
+            with self._lock:
+                if nbytes <= self.max_bytes:
+                    self._entries[key] = (value, nbytes)
+                    self.bytes += nbytes
+                    while self.bytes > self.max_bytes:
+                        _, (_, evicted) = self._entries.popitem(last=False)
+                        self.bytes -= evicted
+                        self.evictions += 1
+        except BaseException as error:
+            # The waiters get the error too, and the next caller of `key` computes it again
+            future.set_exception(error)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+        future.set_result(value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self.bytes, 'max_bytes': int(self.max_bytes),
+                    'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'coalesced': self.coalesced}
+
+    def prometheus_lines(self):
+        stats = self.stats()
+        lines = []
+        for name in ['hits', 'misses', 'evictions', 'coalesced']:
+            lines.append(f'# TYPE skitty_query_cache_{name}_total counter')
+            lines.append(f'skitty_query_cache_{name}_total {stats[name]}')
+        for name in ['entries', 'bytes']:
+            lines.append(f'# TYPE skitty_query_cache_{name} gauge')
+            lines.append(f'skitty_query_cache_{name} {stats[name]}')
+        return lines
+
+
+# Shared by every session of this process
+query_cache = QueryCache()
+add_collector(query_cache.prometheus_lines)
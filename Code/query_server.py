@@ -0,0 +1,336 @@
+"""
+Local HTTP API over the dashboard queries (see queries.py), for other dashboards.
+
+    python Code/query_server.py --port 8765
+
+GET endpoints (countries are repeated parameters, e.g. ?country=Italy&country=Spain):
+
+    /meta                                       metrics, units, levels, countries, groups, date bounds, factors
+    /series?country=&start=&end=&metric=&unit=&level=&budget=
+                                                Part 1 weekly rows (level: Countries, Regions or Sub-regions)
+    /means?country=&start=&end=&metric=&unit=&level=
+                                                mean per country over the weeks (the map values)
+    /similar?country=&metric=&unit=&k=         the k countries whose curve looks most like the country's
+    /socioeconomic?country=&start=&end=         Part 2 rows with the COVID ratios (all countries by default)
+    /correlations?country=&method=&start=&end=  correlation matrix, long format (pearson or spearman)
+    /regression?country=&log=&robust=&start=&end=
+                                                fit of every factor x ratio pair
+
+Dates are ISO (YYYY-MM-DD) and default to the loaded range; without a
+start or end, Part 2 uses the annual totals of plot2.csv. The format is
+?format=json|csv|arrow or the Accept header (JSON by default); JSON rows are
+records. Parameters are checked first: an unknown country, metric or
+date, or a malformed number, gets 400 with a JSON error. Every response
+carries an ETag (the data version and a hash of the normalized request)
+and a Last-Modified of the data snapshot (a request with a matching
+If-None-Match or If-Modified-Since gets 304), and is gzipped when the
+client accepts it. Encoded bodies are kept in the process-wide query
+cache, so a repeated request skips the query, the serialization and the
+compression.
+"""
+import argparse
+import datetime
+import gzip
+import hashlib
+import io
+import json
+import logging
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pyarrow as pa
+
+from correlation import METHODS
+from data_loader import COVID_RATIOS, SOCIOECONOMIC_FACTORS
+from queries import COMPARE_LEVELS
+from query_cache import query_cache
+from shared_store import open_dashboard
+from startup import start_prewarm
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPES = {
+    'json': 'application/json',
+    'csv': 'text/csv; charset=utf-8',
+    'arrow': 'application/vnd.apache.arrow.stream',
+}
+GZIP_MIN_BYTES = 1024
+
+
+def encode(df, fmt):
+    if fmt == 'csv':
+        return df.to_csv(index=False).encode()
+    if fmt == 'arrow':
+        sink = io.BytesIO()
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue()
+    return df.to_json(orient='records', date_format='iso').encode()
+
+
+def negotiate(params, accept):
+    fmt = params.get('format', [None])[0]
+    if fmt is None:
+        fmt = next((f for f, content_type in CONTENT_TYPES.items() if content_type.split(';')[0] in accept), 'json')
+    if fmt not in CONTENT_TYPES:
+        raise ValueError(f'format must be one of {list(CONTENT_TYPES)}, got {fmt!r}')
+    return fmt
+
+
+def _one(params, name, default=None):
+    return params.get(name, [default])[-1]
+
+
+def _flag(params, name):
+    return _one(params, name, '0').lower() in ('1', 'true', 'yes')
+
+
+def _int(params, name, default=None, minimum=None):
+    value = _one(params, name)
+    if not value:
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise ValueError(f'{name} must be an integer, got {value!r}') from None
+    if minimum is not None and value < minimum:
+        raise ValueError(f'{name} must be at least {minimum}, got {value}')
+    return value
+
+
+def _choice(params, name, options, default=None):
+    value = _one(params, name, default)
+    if value not in options:
+        raise ValueError(f'{name} must be one of {list(options)}, got {value!r}')
+    return value
+
+
+def _date(params, name):
+    value = _one(params, name)
+    return datetime.date.fromisoformat(value) if value else None
+
+
+def _window(params):
+    start, end = _date(params, 'start'), _date(params, 'end')
+    return None if start is None and end is None else (start, end)
+
+
+def _countries(params, known):
+    countries = params.get('country') or None
+    unknown = [c for c in countries or [] if c not in known]
+    if unknown:
+        raise ValueError(f'unknown country {unknown[0]!r}')
+    return countries
+
+
+def normalize(params):
+    """The request parameters in a canonical order (the countries sorted), without the format."""
+    return tuple(sorted((name, tuple(sorted(values)) if name == 'country' else tuple(values))
+                        for name, values in params.items() if name != 'format'))
+
+
+class QueryApi:
+    """Routes a parsed query to DashboardQueries.
+
+    Each handler checks its parameters (ValueError when they are invalid) and returns the call that
+    answers them, which gives a DataFrame or a JSON-able dict.
+    """
+
+    def __init__(self, queries):
+        self.queries = queries
+        self.socioeconomic_countries = set(queries.plot2['country'])
+        self.last_modified = formatdate(queries.modified, usegmt=True)
+        self.routes = {
+            '/meta': self.meta,
+            '/series': self.series,
+            '/means': self.means,
+            '/similar': self.similar,
+            '/socioeconomic': self.socioeconomic,
+            '/correlations': self.correlations,
+            '/regression': self.regression,
+        }
+
+    def meta(self, params):
+        q = self.queries
+        first_day, last_day = q.cube.date_bounds
+        return lambda: {
+            'version': q.version,
+            'start': first_day.isoformat(), 'end': last_day.isoformat(),
+            'metrics': q.cube.metrics, 'units': q.cube.units, 'levels': COMPARE_LEVELS,
+            'countries': list(q.cube.countries),
+            'groups': {level: list(rollup.groups) for level, rollup in q.rollups.items()},
+            'socioeconomic_countries': list(q.plot2['country']),
+            'factors': SOCIOECONOMIC_FACTORS, 'ratios': COVID_RATIOS,
+        }
+
+    def _metric_unit(self, params):
+        cube = self.queries.cube
+        return _choice(params, 'metric', cube.metrics, 'Confirmed'), _choice(params, 'unit', cube.units, 'Weekly Case')
+
+    def _part1_args(self, params):
+        level = _choice(params, 'level', COMPARE_LEVELS, 'Countries')
+        level_cube = self.queries.level_cube(level)
+        countries = _countries(params, level_cube.country_index)
+        if countries is None:
+            countries = list(level_cube.countries)
+        return (countries, _date(params, 'start'), _date(params, 'end'), *self._metric_unit(params), level)
+
+    def series(self, params):
+        args = self._part1_args(params)
+        budget = _int(params, 'budget', minimum=3)
+        return lambda: self.queries.series(*args, budget=budget)
+
+    def means(self, params):
+        args = self._part1_args(params)
+        return lambda: self.queries.country_means(*args)
+
+    def similar(self, params):
+        country = _one(params, 'country')
+        if country not in self.queries.cube.country_index:
+            raise ValueError(f'unknown country {country!r}')
+        metric, unit = self._metric_unit(params)
+        k = _int(params, 'k', 6, minimum=1)
+        return lambda: self.queries.similar(country, metric, unit, k)
+
+    def _part2_args(self, params):
+        return _countries(params, self.socioeconomic_countries), _window(params)
+
+    def socioeconomic(self, params):
+        countries, window = self._part2_args(params)
+        return lambda: self.queries.socioeconomic(countries, window)
+
+    def correlations(self, params):
+        countries, window = self._part2_args(params)
+        method = _choice(params, 'method', METHODS, 'pearson')
+        return lambda: self.queries.correlations(countries, method, window)
+
+    def regression(self, params):
+        countries, window = self._part2_args(params)
+        log_scale, robust = _flag(params, 'log'), _flag(params, 'robust')
+        return lambda: self.queries.regression(countries, log_scale, robust, window).reset_index()
+
+    def etag(self, path, params, fmt):
+        """Weak ETag of one representation: the data version and a hash of the normalized request."""
+        digest = hashlib.sha256(repr((path, normalize(params), fmt)).encode()).hexdigest()[:16]
+        return f'W/"{self.queries.version}-{digest}"'
+
+    def body(self, path, params, fmt, compress, answer):
+        """Encoded (and possibly gzipped) result of `answer`, cached per normalized request."""
+        key = ('http', self.queries.version, path, normalize(params), fmt, compress)
+
+        def compute():
+            result = answer()
+            content = json.dumps(result).encode() if isinstance(result, dict) else encode(result, fmt)
+            if compress and len(content) >= GZIP_MIN_BYTES:
+                return gzip.compress(content, compresslevel=5), True
+            return content, False
+        return query_cache.get(key, compute, size=lambda value: len(value[0]))
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive; every response sets Content-Length
+    disable_nagle_algorithm = True  # headers and body are separate writes; don't wait for the delayed ACK
+    api = None
+    max_age = 60
+
+    def do_GET(self):
+        start = time.perf_counter()
+        url = urlsplit(self.path)
+        if url.path not in self.api.routes:
+            return self._error(404, f'unknown endpoint {url.path}; try /meta')
+        params = parse_qs(url.query)
+        # Invalid parameters get 400 even when the client holds a matching ETag
+        try:
+            fmt = 'json' if url.path == '/meta' else negotiate(params, self.headers.get('Accept', ''))
+            answer = self.api.routes[url.path](params)
+        except ValueError as error:
+            return self._error(400, str(error))
+
+        # The data only changes when the snapshot does, so the version and the request identify the representation
+        etag = self.api.etag(url.path, params, fmt)
+        if self._not_modified(etag):
+            self.send_response(304)
+            self._cache_headers(etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        compress = 'gzip' in self.headers.get('Accept-Encoding', '')
+        try:
+            content, gzipped = self.api.body(url.path, params, fmt, compress, answer)
+        except (KeyError, ValueError, TypeError) as error:
+            return self._error(400, str(error))
+
+        self.send_response(200)
+        self._cache_headers(etag)
+        self.send_header('Content-Type', CONTENT_TYPES[fmt])
+        if gzipped:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(content)))
+        self.send_header('Server-Timing', f'app;dur={(time.perf_counter() - start) * 1000:.1f}')
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _not_modified(self, etag):
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            return etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since:
+            try:
+                return parsedate_to_datetime(if_modified_since).timestamp() >= int(self.api.queries.modified)
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def _cache_headers(self, etag):
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', self.api.last_modified)
+        self.send_header('Cache-Control', f'public, max-age={self.max_age}')
+        self.send_header('Vary', 'Accept, Accept-Encoding')
+
+    def _error(self, status, message):
+        content = json.dumps({'error': message}).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', CONTENT_TYPES['json'])
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+
+def make_server(host='127.0.0.1', port=8765, queries=None, max_age=60):
+    """Threaded server answering from `queries` (the shared store or the dashboard snapshot by default)."""
+    if queries is None:
+        queries, _ = open_dashboard()
+    handler = type('Handler', (QueryHandler,), {'api': QueryApi(queries), 'max_age': max_age})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--max-age', type=int, default=60, help='Cache-Control max-age in seconds')
+    parser.add_argument('--verbose', action='store_true', help='log every request')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO, format='%(message)s')
+
+    queries, _ = open_dashboard()
+    # Fill the query cache with the default views while the first clients connect (SKITTY_PREWARM=0 to skip)
+    start_prewarm(queries)
+    server = make_server(args.host, args.port, queries, max_age=args.max_age)
+    logger.info('Serving dashboard queries on http://%s:%d/meta', args.host, server.server_port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
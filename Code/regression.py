@@ -0,0 +1,171 @@
+"""
+Vectorized regressions of every socioeconomic factor against every COVID ratio.
+
+All factor x ratio pairs are fitted in one NumPy pass over a (rows, factors,
+ratios) weight array, with pairwise-complete rows like the correlation
+engine. Supports log10 transforms, Huber robust fits (IRLS) and bootstrap
+confidence intervals of the least-squares fit.
+"""
+import warnings
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+HUBER_C = 1.345
+
+# Two-sided Student t quantiles for 1 to 30 degrees of freedom, where the expansion below is too low
+# (9.71 instead of 12.71 at one degree of freedom for 95%)
+T_TABLE = {
+    0.90: [6.314, 2.920, 2.353, 2.132, 2.015, 1.943, 1.895, 1.860, 1.833, 1.812, 1.796, 1.782, 1.771, 1.761, 1.753,
+           1.746, 1.740, 1.734, 1.729, 1.725, 1.721, 1.717, 1.714, 1.711, 1.708, 1.706, 1.703, 1.701, 1.699, 1.697],
+    0.95: [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228, 2.201, 2.179, 2.160, 2.145, 2.131,
+           2.120, 2.110, 2.101, 2.093, 2.086, 2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042],
+    0.99: [63.657, 9.925, 5.841, 4.604, 4.032, 3.707, 3.499, 3.355, 3.250, 3.169, 3.106, 3.055, 3.012, 2.977, 2.947,
+           2.921, 2.898, 2.878, 2.861, 2.845, 2.831, 2.819, 2.807, 2.797, 2.787, 2.779, 2.771, 2.763, 2.756, 2.750],
+}
+
+
+def t_critical(dof, level=0.95):
+    """Two-sided Student t quantile: T_TABLE up to 30 degrees of freedom, else a Cornish-Fisher expansion
+    of the normal quantile (within 2e-5 of the exact value above 30). NaN below one degree of freedom."""
+    z = NormalDist().inv_cdf(0.5 + level / 2)
+    dof = np.asarray(dof, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        approx = (z + (z ** 3 + z) / (4 * dof) + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * dof ** 2)
+                  + (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / (384 * dof ** 3))
+    table = T_TABLE.get(round(level, 4))
+    if table is not None:
+        # A fractional dof takes the (wider) quantile of the degree below it
+        exact = np.asarray(table)[np.clip(np.nan_to_num(dof), 1, len(table)).astype(int) - 1]
+        approx = np.where(dof <= len(table), exact, approx)
+    return np.where(dof >= 1, approx, np.nan)
+
+
+def prepare(df, factors, ratios, log_x=False, log_y=False):
+    """(X, Y) float arrays, log10-transformed on request (non-positive values become NaN)."""
+    X = df[factors].to_numpy(dtype=np.float64)
+    Y = df[ratios].to_numpy(dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if log_x:
+            X = np.where(X > 0, np.log10(X), np.nan)
+        if log_y:
+            Y = np.where(Y > 0, np.log10(Y), np.nan)
+    return X, Y
+
+
+def _weighted_fit(X0, Y0, W):
+    """Weighted least squares for every (factor, ratio) pair; W has shape ([draws,] rows, factors, ratios)."""
+    s0 = W.sum(axis=-3)
+    sx = np.einsum('nf,...nfr->...fr', X0, W)
+    sy = np.einsum('nr,...nfr->...fr', Y0, W)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_mean = sx / s0
+        y_mean = sy / s0
+        sxx = np.einsum('nf,...nfr->...fr', X0 ** 2, W) - s0 * x_mean ** 2
+        syy = np.einsum('nr,...nfr->...fr', Y0 ** 2, W) - s0 * y_mean ** 2
+        sxy = np.einsum('nf,nr,...nfr->...fr', X0, Y0, W, optimize=True) - s0 * x_mean * y_mean
+        slope = sxy / sxx
+        intercept = y_mean - slope * x_mean
+    return s0, x_mean, y_mean, sxx, syy, sxy, slope, intercept
+
+
+def fit_arrays(X, Y, robust=False, iterations=20):
+    """Dict of (factors, ratios) arrays: n, slope, intercept, r2, standard errors and band inputs."""
+    mask = (~np.isnan(X))[:, :, None] & (~np.isnan(Y))[:, None, :]
+    X0 = np.nan_to_num(X)
+    Y0 = np.nan_to_num(Y)
+    W = mask.astype(np.float64)
+    n = W.sum(axis=0)
+    s0, x_mean, y_mean, sxx, syy, sxy, slope, intercept = _weighted_fit(X0, Y0, W)
+
+    if robust:
+        for _ in range(iterations):
+            residuals = np.where(mask, Y0[:, None, :] - (intercept + slope * X0[:, :, None]), np.nan)
+            # MAD scale per pair, ignoring rows outside the pair (NaN for a pair without complete rows)
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning)
+                scale = np.nanmedian(np.abs(residuals - np.nanmedian(residuals, axis=0)), axis=0) / 0.6745
+            with np.errstate(divide='ignore', invalid='ignore'):
+                u = np.abs(residuals) / np.where(scale > 0, scale, np.nan)
+                W = np.where(mask, np.minimum(1.0, HUBER_C / np.where(u > 0, u, np.nan)), 0.0)
+            W = np.where(np.isnan(W), 1.0, W) * mask
+            previous = slope
+            s0, x_mean, y_mean, sxx, syy, sxy, slope, intercept = _weighted_fit(X0, Y0, W)
+            if np.allclose(slope, previous, equal_nan=True, rtol=1e-8):
+                break
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dof = n - 2
+        sse = np.maximum(syy - slope * sxy, 0.0) * n / s0  # rescaled to the unweighted row count
+        residual_var = np.where(dof > 0, sse / dof, np.nan)
+        sxx_n = sxx * n / s0
+        return {
+            'n': n,
+            'slope': slope,
+            'intercept': intercept,
+            'r2': sxy ** 2 / (sxx * syy),
+            'slope_se': np.sqrt(residual_var / sxx_n),
+            'intercept_se': np.sqrt(residual_var * (1 / n + x_mean ** 2 / sxx_n)),
+            'residual_se': np.sqrt(residual_var),
+            'x_mean': x_mean,
+            'sxx': sxx_n,
+        }
+
+
+def fit_table(df, factors, ratios, log_x=False, log_y=False, robust=False):
+    """Long coefficient table with one row per (factor, ratio) pair."""
+    fits = fit_arrays(*prepare(df, factors, ratios, log_x, log_y), robust=robust)
+    index = pd.MultiIndex.from_product([factors, ratios], names=['factor', 'ratio'])
+    table = pd.DataFrame({name: values.ravel() for name, values in fits.items()}, index=index)
+    table['n'] = table['n'].astype(int)
+    return table
+
+
+def line_data(fit, x_min, x_max, level=0.95, points=50, log_x=False, log_y=False):
+    """Fitted line and confidence band of one coefficient-table row, in the original units."""
+    x = np.linspace(x_min, x_max, points)
+    fitted = fit['intercept'] + fit['slope'] * x
+    with np.errstate(divide='ignore', invalid='ignore'):  # no band below 3 rows
+        half_width = (t_critical(fit['n'] - 2, level) * fit['residual_se']
+                      * np.sqrt(1 / fit['n'] + (x - fit['x_mean']) ** 2 / fit['sxx']))
+    line = pd.DataFrame({'x': x, 'fit': fitted, 'lower': fitted - half_width, 'upper': fitted + half_width})
+    if log_x:
+        line['x'] = 10 ** line['x']
+    if log_y:
+        line[['fit', 'lower', 'upper']] = 10 ** line[['fit', 'lower', 'upper']]
+    return line
+
+
+def bootstrap_table(df, factors, ratios, log_x=False, log_y=False, draws=1000, level=0.95, seed=0, chunk=100):
+    """Percentile bootstrap intervals for every least-squares slope and intercept.
+
+    A resample is a row weighting (how often each row was drawn), so each chunk of
+    draws is one weighted fit over all pairs. The robust fit is not resampled: its
+    iterations would run once per draw.
+    """
+    columns = ['slope_lower', 'slope_upper', 'intercept_lower', 'intercept_upper']
+    index = pd.MultiIndex.from_product([factors, ratios], names=['factor', 'ratio'])
+    X, Y = prepare(df, factors, ratios, log_x, log_y)
+    if len(X) < 3:
+        # No line to resample (and nothing to draw from in an empty selection)
+        return pd.DataFrame(np.nan, index=index, columns=columns)
+    mask = (~np.isnan(X))[:, :, None] & (~np.isnan(Y))[:, None, :]
+    X0 = np.nan_to_num(X)
+    Y0 = np.nan_to_num(Y)
+    rng = np.random.default_rng(seed)
+    slopes, intercepts = [], []
+    for start in range(0, draws, chunk):
+        counts = rng.multinomial(len(X), np.full(len(X), 1 / len(X)), size=min(chunk, draws - start))
+        W = counts[:, :, None, None] * mask
+        *_, slope, intercept = _weighted_fit(X0, Y0, W)
+        slopes.append(slope)
+        intercepts.append(intercept)
+    slopes = np.concatenate(slopes)
+    intercepts = np.concatenate(intercepts)
+
+    tail = 100 * (1 - level) / 2
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # pairs with too few complete rows have no draws
+        bounds = [np.nanpercentile(values, q, axis=0).ravel() for values in (slopes, intercepts) for q in (tail, 100 - tail)]
+    return pd.DataFrame(dict(zip(columns, bounds)), index=index)
@@ -0,0 +1,118 @@
+"""
+UN M49 region and sub-region rollups of the weekly case cube.
+
+Each level is a 0/1 membership matrix (groups x countries). Weekly totals
+of a group are one matrix product over the country axis of the cube;
+per-100k and per-km² values are the group totals over the population and
+area of the countries reporting that week, i.e. population-weighted rather
+than a mean of country rates. The trend units are derived from the group
+totals like the country ones.
+
+A rollup is itself a CaseCube whose rows are groups, so the line chart,
+map and query cache work on it unchanged. `extend` aggregates only the
+weeks the rollup has not seen yet, or those from the first week a refresh
+changed. It reuses the rollup's groups, population and area, so the
+countries and their metadata must not change: a new country, a new
+population or a country moved to another group means building the rollup
+again. DashboardQueries.from_sources extends the rollups of the previous
+dashboard snapshot this way after an ingest, when `same_metadata` holds.
+"""
+import numpy as np
+import pandas as pd
+
+from case_cube import BASE_UNITS, CaseCube, derive_trends
+
+LEVELS = {'Regions': 'region', 'Sub-regions': 'sub-region'}
+
+
+class RegionRollup:
+    def __init__(self, countries, groups, membership, population, area, parents=None):
+        self.countries = np.asarray(countries, dtype=object)
+        self.groups = np.asarray(groups, dtype=object)
+        self.membership = membership  # float64 (group, country)
+        self.population = population  # per country
+        self.area = area  # per country, km² (population / density); NaN where the density is unknown (0)
+        self.parents = parents or {}  # group -> parent group (sub-region -> region)
+        self.cube = None
+
+    @classmethod
+    def from_countries(cls, df1, countries, level):
+        """Groups, population and area of `countries` from the weekly table, with no weeks rolled up yet."""
+        column = LEVELS.get(level, level)
+        names = countries
+        countries = df1.drop_duplicates('Country_Region').set_index('Country_Region')
+        countries.index = countries.index.astype(str)
+        countries = countries.reindex(names)
+        groups, group_pos = np.unique(countries[column].astype(str).to_numpy(), return_inverse=True)
+        membership = np.zeros((len(groups), len(names)))
+        membership[group_pos, np.arange(len(names))] = 1.0
+        population = countries['Population'].to_numpy(dtype=np.float64)
+        density = countries['Density (P/Km²)'].to_numpy(dtype=np.float64)
+        area = np.divide(population, density, out=np.full_like(population, np.nan), where=density > 0)
+        parents = {}
+        if column != 'region':
+            parents = dict(zip(countries[column].astype(str), countries['region'].astype(str)))
+        return cls(names, groups, membership, population, area, parents)
+
+    @classmethod
+    def from_weekly(cls, df1, cube, level):
+        """Rollup of `cube` by the `level` column of the weekly table ('region' or 'sub-region')."""
+        return cls.from_countries(df1, cube.countries, level).extend(cube)
+
+    def same_metadata(self, other):
+        """Whether `other` has the same countries, groups, memberships, population and area."""
+        return (np.array_equal(self.countries, other.countries) and np.array_equal(self.groups, other.groups)
+                and np.array_equal(self.membership, other.membership) and self.parents == other.parents
+                and np.array_equal(self.population, other.population, equal_nan=True)
+                and np.array_equal(self.area, other.area, equal_nan=True))
+
+    def members(self, group):
+        """Row positions (in the country cube) of the countries in `group`."""
+        return np.flatnonzero(self.membership[list(self.groups).index(group)])
+
+    def _aggregate(self, values):
+        """Group base units of (country, week, metric, unit) country values."""
+        weekly = values[..., 0].astype(np.float64)
+        present = ~np.isnan(weekly)
+        totals = np.einsum('gc,cwm->gwm', self.membership, np.where(present, weekly, 0.0))
+        reporting = np.einsum('gc,cwm->gwm', self.membership, present.astype(np.float64))
+        population = np.einsum('gc,cwm->gwm', self.membership, present * self.population[:, None, None])
+        # per km² only over the countries with a known area
+        with_area = present & ~np.isnan(self.area)[:, None, None]
+        area_totals = np.einsum('gc,cwm->gwm', self.membership, np.where(with_area, weekly, 0.0))
+        area = np.einsum('gc,cwm->gwm', self.membership, np.where(with_area, self.area[:, None, None], 0.0))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            base = np.stack([totals, totals / population * 100000, area_totals / area], axis=-1)
+        return np.where((reporting > 0)[..., None], base, np.nan)
+
+    def extend(self, cube, start=None):
+        """Aggregate the weeks of `cube` from position `start` (default: after the last rolled-up week).
+
+        Earlier weeks are kept from the rollup and must be the same in `cube`.
+        """
+        if not np.array_equal(cube.countries, self.countries):
+            raise ValueError("The cube's countries changed since the rollup was built; build it again")
+        if self.cube is None:
+            start = 0
+        elif start is None:
+            start = int(np.searchsorted(cube.weeks, self.cube.weeks[-1], side='right'))
+        if self.cube is not None and start == len(cube.weeks) == len(self.cube.weeks):
+            return self
+        kept = (np.empty((len(self.groups), 0, len(cube.metrics), len(BASE_UNITS))) if self.cube is None
+                else self.cube.values[:, :start, :, :len(BASE_UNITS)])
+        base = np.concatenate([kept, self._aggregate(cube.values[:, start:])], axis=1)
+
+        # Trends depend on earlier weeks but are cheap at group scale, so they are derived again
+        values = np.empty(base.shape[:3] + (len(cube.units),), dtype=np.float32)
+        values[..., :len(BASE_UNITS)] = base
+        values[..., len(BASE_UNITS):] = derive_trends(base[..., 0], base[..., 1])
+        self.cube = CaseCube(values, self.groups, np.full(len(self.groups), -1, dtype=np.int16), cube.weeks,
+                             cube.mmwr_weeks, cube.metrics, cube.units)
+        return self
+
+    def expand_to_countries(self, group_values, cube):
+        """Country rows (Country_Region = group, country-code, Case) repeating each group's value on its members, for the map."""
+        rows = [(group, code, case)
+                for group, case in zip(group_values['Country_Region'], group_values['Case'])
+                for code in cube.country_codes[self.members(group)]]
+        return pd.DataFrame(rows, columns=['Country_Region', 'country-code', 'Case'])
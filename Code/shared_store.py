@@ -0,0 +1,146 @@
+"""
+Memory-mapped dashboard data shared by several app processes on one host.
+
+Each Streamlit worker behind a load balancer would otherwise hold its own
+copy of the case cube, the rollups, the Part 2 table, the correlation,
+prefix-sum and similarity arrays and the parsed chart templates. The store
+writes them once to a versioned directory:
+
+    <store>/CURRENT                 name of the version to serve
+    <store>/<stamp>-<data version>/
+        meta.pkl                    the object graph, pickled with its arrays out of band
+        data.npy                    one uint8 array: every array buffer, then every template as JSON
+
+Workers memory-map data.npy read-only and rebuild the objects around views
+of it (pickle protocol 5 buffers), so their NumPy arrays are zero-copy and
+the page cache holds one copy for all of them. Templates stay JSON bytes in
+the mapping until a chart first asks for one (see chart_specs.py).
+
+Publishing writes a new version directory, then atomically replaces CURRENT.
+Workers compare CURRENT on every rerun and open the new version without a
+restart; a version being served is never modified. The store is used when
+SKITTY_SHARED_STORE names its directory. Publish with build_snapshot.py.
+"""
+import json
+import logging
+import os
+import pickle
+import shutil
+import time
+
+import numpy as np
+
+from chart_specs import attach_templates, export_templates
+from dashboard_snapshot import SnapshotReport, load_dashboard
+from data_loader import current_rss_bytes
+from queries import DashboardQueries
+
+logger = logging.getLogger(__name__)
+
+STORE_DIR = os.environ.get('SKITTY_SHARED_STORE')
+CURRENT = 'CURRENT'
+ALIGN = 64  # byte alignment of every buffer in data.npy
+
+
+def current_version(store_dir=STORE_DIR):
+    """Name of the version CURRENT points at (None without a store or before the first publish)."""
+    if not store_dir:
+        return None
+    try:
+        with open(os.path.join(store_dir, CURRENT)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _aligned(offset):
+    return -(-offset // ALIGN) * ALIGN
+
+
+def publish(queries, store_dir=STORE_DIR, keep=2):
+    """Write the data of `queries` and the templates built so far as a new version and make it current."""
+    buffers = []
+    parts = {
+        'cube': queries.cube, 'rollups': queries.rollups, 'plot2': queries.plot2,
+        'correlation': queries.correlation, 'prefix': queries.prefix, 'similarity': queries.similarity,
+        'version': queries.version, 'modified': queries.modified,
+    }
+    graph = pickle.dumps(parts, protocol=5, buffer_callback=buffers.append)
+    blobs = [buffer.raw() for buffer in buffers]
+    templates = [(tuple(key), json.dumps(spec).encode()) for key, spec in export_templates()]
+
+    # Lay out every buffer, then every template, at aligned offsets of one file
+    offsets, size = [], 0
+    for blob in blobs + [spec for _, spec in templates]:
+        size = _aligned(size)
+        offsets.append((size, len(blob)))
+        size += len(blob)
+    data = np.zeros(size, dtype=np.uint8)
+    for (offset, length), blob in zip(offsets, blobs + [spec for _, spec in templates]):
+        data[offset:offset + length] = np.frombuffer(blob, dtype=np.uint8)
+    meta = {
+        'graph': graph,
+        'buffers': offsets[:len(blobs)],
+        'templates': {key: span for (key, _), span in zip(templates, offsets[len(blobs):])},
+    }
+
+    name = f'{time.time_ns()}-{queries.version}'
+    os.makedirs(store_dir, exist_ok=True)
+    tmp_dir = os.path.join(store_dir, f'.tmp-{name}')
+    os.makedirs(tmp_dir)
+    np.save(os.path.join(tmp_dir, 'data.npy'), data)
+    with open(os.path.join(tmp_dir, 'meta.pkl'), 'wb') as f:
+        pickle.dump(meta, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.rename(tmp_dir, os.path.join(store_dir, name))
+
+    # The swap: readers see either the old name or the new one
+    tmp_current = os.path.join(store_dir, f'.{CURRENT}.{os.getpid()}')
+    with open(tmp_current, 'w') as f:
+        f.write(name)
+    os.replace(tmp_current, os.path.join(store_dir, CURRENT))
+    prune(store_dir, keep)
+    return name
+
+
+def prune(store_dir=STORE_DIR, keep=2):
+    """Delete all but the `keep` newest versions (and never the current one)."""
+    current = current_version(store_dir)
+    names = sorted((name for name in os.listdir(store_dir) if name[0].isdigit()), reverse=True)
+    for name in names[keep:]:
+        if name != current:
+            # Workers still mapping it keep their pages until they switch
+            shutil.rmtree(os.path.join(store_dir, name), ignore_errors=True)
+
+
+def open_version(name, store_dir=STORE_DIR):
+    """DashboardQueries over the arrays of the version `name`, mapped read-only; returns (queries, SnapshotReport)."""
+    start = time.perf_counter()
+    path = os.path.join(store_dir, name)
+    with open(os.path.join(path, 'meta.pkl'), 'rb') as f:
+        meta = pickle.load(f)
+    data = np.load(os.path.join(path, 'data.npy'), mmap_mode='r')
+    parts = pickle.loads(meta['graph'], buffers=[data[offset:offset + length] for offset, length in meta['buffers']])
+    attach_templates({key: data[offset:offset + length] for key, (offset, length) in meta['templates'].items()})
+
+    queries = DashboardQueries(parts['cube'], parts['rollups'], parts['plot2'], parts['version'], parts['modified'],
+                               correlation=parts['correlation'], prefix=parts['prefix'],
+                               similarity=parts.get('similarity'))
+    report = SnapshotReport(version=parts['version'], from_snapshot=True, seconds=time.perf_counter() - start,
+                            rss_bytes=current_rss_bytes(), templates=len(meta['templates']), shared=True)
+    logger.info('%s (%s)', report.summary(), name)
+    return queries, report
+
+
+def open_dashboard(store_dir=STORE_DIR, name=None):
+    """Version `name` (by default the current one) of the shared store when there is one, else this process's own
+    copy (load_dashboard). A version pruned before it is opened is replaced by the one CURRENT names by then."""
+    for _ in range(3):
+        name = name or current_version(store_dir)
+        if name is None:
+            break
+        try:
+            return open_version(name, store_dir)
+        except FileNotFoundError:
+            # Pruned since CURRENT named it; CURRENT has moved on
+            name = None
+    return load_dashboard()
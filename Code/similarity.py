@@ -0,0 +1,110 @@
+"""
+"Countries whose curve looks like this one": similarity search over the weekly series.
+
+Every country's series of one metric and case unit is a vector over the
+shared week axis (missing weeks count as 0). Two series are compared after
+z-normalization, so the shape of the curve matters rather than its scale:
+the squared Euclidean distance of two z-normalized series of length T is
+2T(1 - r), with r their Pearson correlation.
+
+The index keeps the sufficient statistics of every pair (row sums, sums of
+squares and the Gram matrix of cross products). The distance matrix follows
+from them in one vectorized pass on the first query, so a query is a row
+read and a partial sort; snapshots keep only the statistics. New weeks only
+add their own terms to the statistics (`extend`), instead of recomputing
+the products over the whole history; weeks a refresh revised swap their old
+terms for the new ones. The build step keeps the indexes in the dashboard
+snapshot and extends them after an ingest (see DashboardQueries.from_sources).
+"""
+import numpy as np
+import pandas as pd
+
+
+class SimilarityIndex:
+    def __init__(self, countries, metric, unit):
+        self.countries = np.asarray(countries, dtype=object)
+        self.country_index = {name: i for i, name in enumerate(self.countries)}
+        self.metric = metric
+        self.unit = unit
+        n = len(self.countries)
+        self.n_weeks = 0
+        self.sums = np.zeros(n)
+        self.squares = np.zeros(n)
+        self.gram = np.zeros((n, n))
+        self.correlation = None
+        self.distances = None
+
+    @classmethod
+    def from_cube(cls, cube, metric, unit):
+        return cls(cube.countries, metric, unit).extend(cube)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.sums, self.squares, self.gram, self.correlation, self.distances)
+                   if a is not None)
+
+    def __getstate__(self):
+        # The correlation and distance matrices are derived again on the first query
+        return {**self.__dict__, 'correlation': None, 'distances': None}
+
+    def _block(self, cube, start):
+        block = cube.values[:, start:, cube.metric_index[self.metric], cube.unit_index[self.unit]]
+        return np.nan_to_num(block.astype(np.float64), nan=0.0, posinf=0.0, neginf=0.0)
+
+    def extend(self, cube, previous=None):
+        """Add the weeks of `cube` the index has not seen yet (the country axis must not change).
+
+        With `previous`, the cube the index was last extended with, the weeks that changed since are
+        replaced too. The statistics are replaced rather than updated in place, so a copy of a shared
+        (e.g. memory-mapped) index can be extended.
+        """
+        if not np.array_equal(cube.countries, self.countries):
+            raise ValueError('the countries changed; build a new index')
+        start = self.n_weeks
+        sums, squares, gram = self.sums, self.squares, self.gram
+        if previous is not None:
+            changed = cube.first_changed_week(previous)
+            if changed is None:
+                raise ValueError('the metrics or units changed; build a new index')
+            start = min(start, changed)
+            old = self._block(previous, start)
+            sums, squares, gram = sums - old.sum(axis=1), squares - (old ** 2).sum(axis=1), gram - old @ old.T
+        block = self._block(cube, start)
+        self.sums = sums + block.sum(axis=1)
+        self.squares = squares + (block ** 2).sum(axis=1)
+        self.gram = gram + block @ block.T
+        self.n_weeks = start + block.shape[1]
+        self.correlation = self.distances = None
+        return self
+
+    def _refresh(self):
+        t = self.n_weeks
+        with np.errstate(invalid='ignore', divide='ignore'):
+            spread = np.sqrt(t * self.squares - self.sums ** 2)
+            correlation = (t * self.gram - np.outer(self.sums, self.sums)) / np.outer(spread, spread)
+        # Flat series (e.g. never reported) have no shape to compare
+        correlation[~(spread > 0)] = np.nan
+        correlation[:, ~(spread > 0)] = np.nan
+        correlation = np.clip(correlation, -1.0, 1.0)
+        # Concurrent first queries may both compute them; the distances are set last
+        self.correlation = correlation
+        self.distances = np.sqrt(2 * t * (1 - correlation))
+
+    def most_similar(self, country, k=6):
+        """The `k` countries closest to `country` (Country_Region, distance, correlation), nearest first."""
+        if self.distances is None:
+            self._refresh()
+        i = self.country_index[country]
+        distances = self.distances[i].copy()
+        distances[i] = np.nan
+        candidates = np.flatnonzero(~np.isnan(distances))
+        k = min(k, len(candidates))
+        if k == 0:
+            return pd.DataFrame({'Country_Region': [], 'distance': [], 'correlation': []})
+        nearest = candidates[np.argpartition(distances[candidates], k - 1)[:k]]
+        nearest = nearest[np.argsort(distances[nearest], kind='stable')]
+        return pd.DataFrame({
+            'Country_Region': self.countries[nearest],
+            'distance': distances[nearest],
+            'correlation': self.correlation[i, nearest],
+        })
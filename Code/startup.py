@@ -0,0 +1,119 @@
+"""
+Startup-time report and cache prewarm of a dashboard process.
+
+A new Streamlit (or query server) process pays once for its imports, the
+dashboard data load (see dashboard_snapshot.py) and its first render. Each
+stage is recorded the first time it runs (`startup_report.mark`) with the
+age of the process at that point, shown in the app's timing panel and
+exported as the Prometheus gauge skitty_startup_seconds{stage=...} next to
+the span totals (see instrumentation.py), so cold starts can be tracked
+over deploys. With SKITTY_TIMING=1 each stage is also logged as one JSON
+line, like the timing spans.
+
+`start_prewarm` fills the process-wide query cache in a background thread
+with what the default views ask for first (every metric and unit of the
+default countries, the similarity indexes, the Part 2 fits and
+correlations), so the first sessions find them computed. The app runs it
+once per data version, so a newly published store is warmed too. Set
+SKITTY_PREWARM=0 to turn it off.
+"""
+import json
+import os
+import threading
+import time
+
+from chart_specs import LINE_WIDTH
+from correlation import METHODS
+from downsample import point_budget
+from instrumentation import add_collector, configure_logging, logger, timing_enabled
+
+# Countries the Part 1 multiselect starts with
+DEFAULT_COUNTRIES = ["Canada", "Nigeria", "Iceland", "Russia", "Sweden", "China", "US"]
+
+
+def process_age():
+    """Seconds since this process started (None where /proc is unavailable)."""
+    try:
+        with open('/proc/self/stat') as f:
+            # Fields after the command name, which may contain spaces; starttime is field 22
+            fields = f.read().rsplit(')', 1)[1].split()
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return uptime - int(fields[19]) / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StartupReport:
+    def __init__(self):
+        self.stages = {}  # stage -> (seconds, process age when it finished, details)
+        self._lock = threading.Lock()
+
+    def mark(self, stage, seconds, **details):
+        """Record a startup stage the first time it runs in this process; later calls are ignored."""
+        with self._lock:
+            if stage in self.stages:
+                return False
+            age = process_age()
+            self.stages[stage] = (seconds, age, details)
+        if not timing_enabled():
+            return True
+        configure_logging()
+        logger.info(json.dumps({
+            'event': 'startup',
+            'stage': stage,
+            'ms': round(seconds * 1000, 3),
+            'process_age_s': None if age is None else round(age, 3),
+            **details,
+        }))
+        return True
+
+    def table(self):
+        """Rows of (stage, ms, process age) for display."""
+        return [{'stage': stage, 'ms': round(seconds * 1000, 1),
+                 'process age (s)': None if age is None else round(age, 2), **details}
+                for stage, (seconds, age, details) in list(self.stages.items())]
+
+    def prometheus_lines(self):
+        lines = ['# HELP skitty_startup_seconds Duration of each startup stage of this process.',
+                 '# TYPE skitty_startup_seconds gauge']
+        for stage, (seconds, _, _) in list(self.stages.items()):
+            lines.append(f'skitty_startup_seconds{{stage="{stage}"}} {seconds:.6f}')
+        return lines
+
+
+startup_report = StartupReport()
+add_collector(startup_report.prometheus_lines)
+
+
+def prewarm(queries, countries=DEFAULT_COUNTRIES):
+    """Compute the default views of both parts into the query cache; returns the seconds it took."""
+    start = time.perf_counter()
+    cube = queries.cube
+    countries = [c for c in countries if c in cube.country_index]
+    first_day, last_day = cube.date_bounds
+    for metric in cube.metrics:
+        for unit in cube.units:
+            queries.series(countries, first_day, last_day, metric, unit, budget=point_budget(LINE_WIDTH))
+            queries.country_means(countries, first_day, last_day, metric, unit)
+            queries.similarity_index(metric, unit)
+
+    window = (first_day, last_day)
+    part2_countries = list(queries.plot2_table(window)['country'].unique())
+    queries.socioeconomic(part2_countries, window)
+    for log_scale in (False, True):
+        queries.regression(part2_countries, log_scale, False, window)
+    for method in METHODS:
+        queries.correlations(part2_countries, method, window=window)
+    seconds = time.perf_counter() - start
+    startup_report.mark('prewarm', seconds)
+    return seconds
+
+
+def start_prewarm(queries, countries=DEFAULT_COUNTRIES):
+    """Run `prewarm` in a daemon thread (None when SKITTY_PREWARM=0)."""
+    if os.environ.get('SKITTY_PREWARM', '1') == '0':
+        return None
+    thread = threading.Thread(target=prewarm, args=(queries, countries), name='prewarm', daemon=True)
+    thread.start()
+    return thread
@@ -1,11 +1,36 @@
+import time
+
+script_started = time.perf_counter()
+
+import sys
+
 import pandas as pd
 import numpy as np
-import altair as alt
 import streamlit as st
-from epiweeks import Week
-from datetime import datetime
+
+from chart_specs import (LINE_WIDTH, MAP_HEIGHT, MAP_WIDTH, PROJECTION, animated_map_spec, bar_spec, bubble_spec,
+                         crossfilter_spec, heatmap_spec, line_spec, map_spec, scatter_spec)
+from correlation import METHODS
+from data_loader import COVID_RATIOS, SOCIOECONOMIC_FACTORS
+from downsample import point_budget
+from instrumentation import Timings, configure_logging, timing_enabled
+from query_cache import query_cache
+from regression import bootstrap_table
+from rollups import LEVELS
+from shared_store import current_version, open_dashboard
+from startup import DEFAULT_COUNTRIES, start_prewarm, startup_report
+from world_geometry import GEOMETRY_LEVELS, join_country_values, load_topology
+
+# Only the first run of a process imports anything; later runs find the modules loaded
+startup_report.mark('imports', time.perf_counter() - script_started)
 
 st.set_page_config(page_title="COVID-19 Time Series Data & Socioeconomic Factors")
+
+# Stage timings of this run (no-ops unless SKITTY_TIMING=1 or ?timing=1, see instrumentation.py)
+timings = Timings(timing_enabled(st.query_params))
+if timings.enabled:
+    configure_logging()
+
 st.title("Global COVID-19 Data & Socioeconomic Factors in 2020")
 st.write(
     """
@@ -17,136 +42,170 @@ st.write(
 )
 
 # Section 1: COVID-19 Data Analysis
-url="https://raw.githubusercontent.com/wany115/BMI-706-SKITTY-Final-Project/refs/heads/main/Cleaned%20Data/Weekly%20Data.csv"
-df1 = pd.read_csv(url)
-df1['country-code'] = df1['country-code'].astype(str).str.zfill(3)
-df1['country-code'] = df1['country-code'].astype(int)
-df1 = df1.iloc[:,:-7]
-df1['Confirmed_per_100k'] = (df1['Confirmed'] / df1['Population']) * 100000
-df1['Deaths_per_100k'] = (df1['Deaths'] / df1['Population']) * 100000
-df1['Recovered_per_100k'] = (df1['Recovered'] / df1['Population']) * 100000
-df1['Active_per_100k'] = (df1['Active'] / df1['Population']) * 100000
-df1['Confirmed_per_km2'] = df1['Confirmed'] / df1['Population'] * df1['Density (P/Km²)']
-df1['Deaths_per_km2'] = df1['Deaths'] / df1['Population'] * df1['Density (P/Km²)']
-df1['Recovered_per_km2'] = df1['Recovered'] / df1['Population'] * df1['Density (P/Km²)'] 
-df1['Active_per_km2'] = df1['Active'] / df1['Population'] * df1['Density (P/Km²)'] 
-case_columns = {
-    'Confirmed': ['Confirmed', 'Confirmed_per_100k', 'Confirmed_per_km2'],
-    'Deaths': ['Deaths', 'Deaths_per_100k', 'Deaths_per_km2'],
-    'Recovered': ['Recovered', 'Recovered_per_100k', 'Recovered_per_km2'],
-    'Active': ['Active', 'Active_per_100k', 'Active_per_km2']
-}
-
-df1_long = pd.DataFrame()
-for key, cols in case_columns.items():
-    melted = pd.melt(df1, 
-                     id_vars=['Country_Region', 'country-code','Population', 'Density (P/Km²)', 'Week_Start_Date', 'MMWR_week'],
-                     value_vars=cols, 
-                     var_name='Case_Type', 
-                     value_name='Case')  # Use a generic value name
-    
-    melted['Case_Category'] = melted['Case_Type'].map({
-        cols[0]: 'Weekly Case',
-        cols[1]: 'Weekly Case per 100k',
-        cols[2]: 'Weekly Case per km2'
-    })
-    
-    # Add a new column for the metric (Confirmed, Deaths, etc.)
-    melted['Metric'] = key
-    
-    # Append to the main dataframe
-    df1_long = pd.concat([df1_long, melted], ignore_index=True)
-
-from vega_datasets import data
-source = alt.topo_feature(data.world_110m.url, 'countries')
-
-width = 600
-height  = 300
-project = 'equirectangular'
-
-# a gray map using as the visualization background
-background = alt.Chart(source
-).mark_geoshape(
-    fill='#aaa',
-    stroke='white'
-).properties(
-    width=width,
-    height=height
-).project(project)
-
-st.header("Part 1: Worldwide COVID-19 Weekly Cases in 2020")
+# Weekly case cube, region rollups and Part 2 table behind both parts, shared read-only across sessions.
+# With SKITTY_SHARED_STORE set they are memory-mapped from the store every worker process shares, and a
+# newly published version is picked up on the next rerun (see shared_store.py); otherwise they are
+# restored from this process's dashboard snapshot (see dashboard_snapshot.py).
+@st.cache_resource(max_entries=1, show_spinner="Loading COVID-19 data...")
+def load_queries(store_version):
+    # A version pruned by a publish since current_version() read it falls back to the newer current one
+    queries, report = open_dashboard(name=store_version)
+    startup_report.mark('data_load', report.seconds, from_snapshot=report.from_snapshot, shared=report.shared)
+    return queries, report
+
+
+with timings.span('load.dashboard'):
+    queries, dashboard_report = load_queries(current_version())
+case_cube = queries.cube
+rollups = queries.rollups
+
+
+# Derived selections go through queries.py and the process-wide query cache (see query_cache.py), keyed by
+# the normalized widget state and the data version, so identical views across sessions are computed once.
+# The results are shared: treat them as read-only.
+def joined_topology_size(topology):
+    # Arcs are shared with the base topology; only the geometry list and properties are new
+    geometries = topology['objects']['countries']['geometries']
+    return sum(sys.getsizeof(g) + sys.getsizeof(g.get('properties', {})) for g in geometries)
+
+
+# Country geometry with the selected means joined in (a region's mean is drawn on all its countries)
+def load_map_topology(map_detail, level, countries, start_date, end_date, metric, case_cat):
+    weeks = queries.week_range(start_date, end_date)
+    key = ('map', queries.version, map_detail, level, tuple(sorted(countries)), weeks.start, weeks.stop, metric,
+           case_cat)
+
+    def compute():
+        mean_case_data = queries.country_means(countries, start_date, end_date, metric, case_cat, level)
+        return join_country_values(map_detail, mean_case_data)
+    return query_cache.get(key, compute, size=joined_topology_size)
+
+# Years of the loaded week start dates, e.g. "2020" or "2020-2023"
+first_year, last_year = (week.item().year for week in case_cube.weeks[[0, -1]])
+covered_years = str(first_year) if first_year == last_year else f"{first_year}-{last_year}"
+
+st.header(f"Part 1: Worldwide COVID-19 Weekly Cases in {covered_years}")
 st.write(
-    """
+    f"""
     This section focuses on COVID-19 data from Johns Hopkins University. 
-    It provides insights into worldwide COVID-19 weekly cases across 2020, 
+    It provides insights into worldwide COVID-19 weekly cases across {covered_years}, 
     including trends and comparisons between countries.
     """
 )
 
-def get_mmwr_week(date):
-    return Week.fromdate(date).week
-
-start_date, end_date = st.slider("Select a range of date", 
-                                 datetime(2020, 1, 1).date(), datetime(2020, 12, 31).date(), 
-                                 (datetime(2020, 1, 1).date(), datetime(2020, 12, 31).date()))
-start_mmwr_week = get_mmwr_week(start_date)
-end_mmwr_week = get_mmwr_week(end_date)
-df1_date = df1_long[(df1_long['MMWR_week'] >= start_mmwr_week) & (df1_long['MMWR_week'] <= end_mmwr_week)]
-
-countries = st.multiselect("Countries (at most 7)", options=df1["Country_Region"].unique(), 
-                           default=["Canada", "Nigeria", "Iceland", "Russia", "Sweden", "China", "US"],
-                           max_selections = 7) 
-df1_date_ctry = df1_date[df1_date["Country_Region"].isin(countries)]
-
-metric = st.selectbox("Metric",options=df1_long["Metric"].unique()) 
-df1_date_ctry_metric = df1_date_ctry[df1_date_ctry["Metric"] == metric]
-
-case_cat = st.radio("Case Unit",options=df1_long["Case_Category"].unique())
-df1_date_ctry_metric_casecat = df1_date_ctry_metric[df1_date_ctry_metric["Case_Category"]==case_cat]
-
-mean_case_data = df1_date_ctry_metric_casecat.groupby(['Country_Region', 'country-code'], as_index=False).agg({'Case': 'mean'})
-
-chart_map = alt.Chart(source
-    ).mark_geoshape().encode(
-        # color=alt.Color(field='Case', type='quantitative', scale = case_scale, legend=alt.Legend(title='Quartiles', labelFontSize=6)),        
-        color=alt.Color('Case:Q', scale=alt.Scale(scheme="yelloworangebrown")),
-        tooltip=[
-            alt.Tooltip('Country_Region:N'),
-            alt.Tooltip('Case:Q') 
-        ]
-    ).transform_lookup(
-        lookup='id',
-        from_=alt.LookupData(mean_case_data, 'country-code', ['Country_Region','Case']),
-    ).properties(
-        title=f'Average {case_cat} of {metric}'
-    )
-
-(background + chart_map)
-
-is_log10 = st.checkbox("log10 scale")
-if is_log10:
-    chart_line = alt.Chart(df1_date_ctry_metric_casecat).mark_line(point=True).encode(
-        x = alt.X("Week_Start_Date:T", title = 'Week'),
-        y = alt.Y("Case:Q", scale=alt.Scale(type='log', base=10), title = f'log10 {case_cat}'),
-        color=alt.Color(field = 'Country_Region'),
-        tooltip = [alt.Tooltip('Country_Region:N'), alt.Tooltip('Week_Start_Date:T'), alt.Tooltip('Case:Q')]
-    ).properties(
-        title=f'{case_cat} of {metric}',
-        width = 600,
-        height = 400
-    )
-else:
-    chart_line = alt.Chart(df1_date_ctry_metric_casecat).mark_line(point=True).encode(
-        x = alt.X("Week_Start_Date:T", title = 'Week'),
-        y = alt.Y("Case:Q", title = case_cat),
-        color=alt.Color(field = 'Country_Region'),
-        tooltip = [alt.Tooltip('Country_Region:N'), alt.Tooltip('Week_Start_Date:T'), alt.Tooltip('Case:Q')]
-    ).properties(
-        title=f'{case_cat} of {metric}',
-        width = 600,
-        height = 400
-    )
-chart_line
+# Each part (and each chart with its own widgets) is a fragment, so a widget
+# change only reruns the charts that depend on it. Inputs shared across reruns
+# are cached above or below.
+# Replace the compared countries with `country` and the six with the most similar curve
+def fill_similar(country, metric, case_cat):
+    similar = queries.similar(country, metric, case_cat)
+    st.session_state['within_region'] = 'All'
+    st.session_state['within_sub_region'] = 'All'
+    st.session_state['compare_countries'] = [country] + list(similar['Country_Region'])
+
+
+@st.fragment
+@timings.section('part1')
+def part1_section():
+    # Bounds come from the loaded weeks; the range maps to week positions by binary search
+    first_day, last_day = case_cube.date_bounds
+    start_date, end_date = st.slider("Select a range of date", 
+                                     first_day, last_day, 
+                                     (first_day, last_day))
+    week_range = case_cube.date_slice(start_date, end_date)
+
+    # Drill down: compare regions, the sub-regions of a region, or the countries of a sub-region
+    level = st.radio("Compare", ['Countries'] + list(LEVELS), horizontal=True, key='compare_level')
+    region = sub_region = 'All'
+    if level != 'Regions':
+        region = st.selectbox("Within region", ['All'] + list(rollups['Regions'].groups), key='within_region')
+    sub_regions = [g for g in rollups['Sub-regions'].groups
+                   if region == 'All' or rollups['Sub-regions'].parents[g] == region]
+    if level == 'Countries':
+        sub_region = st.selectbox("Within sub-region", ['All'] + sub_regions, key='within_sub_region')
+
+    if level == 'Countries':
+        options = case_cube.countries
+        if sub_region != 'All':
+            options = options[rollups['Sub-regions'].members(sub_region)]
+        elif region != 'All':
+            options = options[rollups['Regions'].members(region)]
+        default = [c for c in DEFAULT_COUNTRIES if c in options]
+        # The selection lives in session state so the similarity search below can fill it in;
+        # keep the countries the filters still offer, or the defaults if none are left
+        offered = set(options)
+        selected = st.session_state.get('compare_countries')
+        kept = [c for c in selected if c in offered] if selected is not None else []
+        if not kept and (selected is None or selected):
+            kept = default or list(options[:7])
+        st.session_state['compare_countries'] = kept
+        countries = st.multiselect("Countries (at most 7)", options=options, key='compare_countries',
+                                   max_selections = 7)
+    else:
+        options = sub_regions if level == 'Sub-regions' else list(rollups['Regions'].groups)
+        countries = st.multiselect(f"{level} (at most 7)", options=options, 
+                                   default=list(options[:7]),
+                                   max_selections = 7) 
+
+    metric = st.selectbox("Metric",options=case_cube.metrics) 
+
+    case_cat = st.radio("Case Unit",options=case_cube.units)
+
+    # Similarity search over every country's curve (z-normalized, see similarity.py)
+    if level == 'Countries':
+        with st.expander("Find countries whose curve looks like this one"):
+            target_col, button_col = st.columns([3, 1], vertical_alignment='bottom')
+            target = target_col.selectbox("Country", case_cube.countries, key='similar_to')
+            button_col.button("Show them in the chart", on_click=fill_similar, args=(target, metric, case_cat))
+            with timings.span('part1.similarity'):
+                similar = queries.similar(target, metric, case_cat)
+            st.dataframe(similar, hide_index=True)
+
+    # Only the selected slice of the cube becomes a DataFrame
+    with timings.span('part1.filter'):
+        # Line chart rows, downsampled (LTTB) per country to what the chart width can show
+        df1_date_ctry_metric_casecat = queries.series(countries, start_date, end_date, metric, case_cat, level,
+                                                      budget=point_budget(LINE_WIDTH))
+
+    # The coarse geometry is about half the size, for small screens and slow connections
+    map_detail = st.radio("Map detail", options=list(GEOMETRY_LEVELS), horizontal=True)
+
+    # Play-over-time mode: every country's weekly values are sent once with the bare geometry,
+    # and a slider in the chart picks the week in the browser without a rerun
+    if st.toggle("Play over time (week slider on the map, all countries)"):
+        with timings.span('part1.aggregate'):
+            map_weeks = queries.all_countries(start_date, end_date, metric, case_cat)
+        with timings.span('part1.map.chart_build'):
+            week_labels = [str(week) for week in case_cube.weeks[week_range]]
+            chart_map = animated_map_spec(load_topology(map_detail), map_weeks, week_labels,
+                                          f'{case_cat} of {metric}', MAP_WIDTH, MAP_HEIGHT, PROJECTION)
+    else:
+        with timings.span('part1.aggregate'):
+            map_topology = load_map_topology(map_detail, level, countries, start_date, end_date, metric, case_cat)
+
+        # One dataset for the whole map: countries without a value are drawn gray.
+        # The spec template is built once (see chart_specs.py); the joined geometry is attached per rerun.
+        with timings.span('part1.map.chart_build'):
+            chart_map = map_spec(map_topology, f'Average {case_cat} of {metric}', MAP_WIDTH, MAP_HEIGHT,
+                                 PROJECTION)
+
+    with timings.span('part1.map.render'):
+        st.vega_lite_chart(chart_map)
+
+    line_chart_section(df1_date_ctry_metric_casecat, metric, case_cat)
+
+
+@st.fragment
+@timings.section('line')
+def line_chart_section(df1_date_ctry_metric_casecat, metric, case_cat):
+    is_log10 = st.checkbox("log10 scale")
+    with timings.span('line.chart_build'):
+        chart_line = line_spec(df1_date_ctry_metric_casecat, case_cat, metric, is_log10, LINE_WIDTH)
+    with timings.span('line.render'):
+        st.vega_lite_chart(chart_line)
+
+
+part1_section()
 
 # Spacer
 st.markdown("---")
@@ -161,184 +220,187 @@ st.write(
 )
 
 
-# Load the data from a CSV
-@st.cache_data
-def load_data():
-    df = pd.read_csv("https://raw.githubusercontent.com/wany115/BMI-706-SKITTY-Final-Project/refs/heads/main/Cleaned%20Data/plot2.csv")
-    return df
-
-
-df = load_data()
-
-# rename columns
-df.columns = ['country', 'health_expenditure', 'death_rate','GDP','life_expectancy','literacy_rate','net_migration',
-              'poverty_ratio','unemployment','population','density','confirmed','deaths','recovered','active']
-# calculate ratios
-df['covid_confirmed_ratio'] = df['confirmed'] / df['population']
-df['covid_deaths_ratio'] = df['deaths'] / df['population']
-df['covid_recovered_ratio'] = df['recovered'] / df['population']
-df['covid_active_ratio'] = df['active'] / df['population']
-
-# Dropdown for selecting the X and Y factors
-x_axis = st.selectbox('Select X-axis factor (Used for scatterplot and bar chart)', 
-                      options=['health_expenditure', 'death_rate', 'GDP', 'life_expectancy', 'literacy_rate', 'net_migration', 'poverty_ratio', 'unemployment'],
-                      index=0) # default heath_expenditure
-y_axis = st.selectbox('Select Y-axis factor', 
-                      options=['health_expenditure', 'death_rate', 'GDP', 'life_expectancy', 'literacy_rate', 'net_migration', 'poverty_ratio', 'unemployment'],
-                      index = 2) # default GDP
-
-# Dropdown for selecting the ratio category (confirmed, active, deaths, recovered)
-ratio_category = st.selectbox(
-    'Ratio category',
-    options=['covid_confirmed_ratio', 'covid_active_ratio', 'covid_deaths_ratio', 'covid_recovered_ratio'],
-    format_func=lambda x: x.replace('_', ' ').title(),
-    index=0  # Set default to 'confirmed_ratio
-)
-
-# Dropdown for selecting countries
-countries = st.multiselect('Country', 
-                           options=df['country'].unique(), 
-                           default=df['country'].unique())
-
-# Filter data based on selected countries
-filtered_df = df[df['country'].isin(countries)]
-
-# Section 1: Bubble Chart
-st.header("Bubble Chart: COVID-19 Ratio by Socioeconomic Factors")
-
-# Create the bubble chart
-bubble_chart = alt.Chart(filtered_df).mark_circle().encode(
-    x=alt.X(x_axis, title=x_axis.replace('_', ' ').title()),
-    y=alt.Y(y_axis, title=y_axis.replace('_', ' ').title()),
-    size=alt.Size(ratio_category, title=ratio_category.replace('_', ' ').title(), scale=alt.Scale(range=[100, 1000])),
-    color=alt.Color('country', legend=None),
-    tooltip=['country', ratio_category, x_axis, y_axis]
-).properties(
-    width=700,
-    height=500,
-    title=f'Bubble Chart: {x_axis.replace("_", " ").title()} vs {y_axis.replace("_", " ").title()} (Size: {ratio_category.replace("_", " ").title()})'
-)
-
-# Display the bubble chart
-st.altair_chart(bubble_chart, use_container_width=True)
+socioeconomic_factors = SOCIOECONOMIC_FACTORS
+covid_ratios = COVID_RATIOS
+
+
+# Intervals of the least-squares fit (also shown next to the robust fit, whose IRLS is too slow to resample)
+@st.cache_data(max_entries=16, show_spinner="Bootstrapping confidence intervals...")
+def load_bootstrap_table(countries, log_scale, window):
+    df = queries.plot2_table(window)
+    return bootstrap_table(df[df['country'].isin(countries)], socioeconomic_factors, covid_ratios,
+                           log_x=log_scale, log_y=log_scale, draws=1000)
+
+
+@st.fragment
+@timings.section('part2')
+def part2_section():
+    # COVID totals of a date window: two prefix-sum lookups per country (see prefix_store.py),
+    # so every chart of this part follows the slider without regrouping the weekly rows
+    first_day, last_day = case_cube.date_bounds
+    window = st.slider("Date window of the COVID totals", first_day, last_day, (first_day, last_day))
+    with timings.span('part2.load'):
+        df = queries.plot2_table(window)
+
+    # Dropdown for selecting the X and Y factors
+    x_axis = st.selectbox('Select X-axis factor (Used for scatterplot and bar chart)', 
+                          options=socioeconomic_factors,
+                          index=0) # default heath_expenditure
+    y_axis = st.selectbox('Select Y-axis factor', 
+                          options=socioeconomic_factors,
+                          index = 2) # default GDP
+
+    # Dropdown for selecting the ratio category (confirmed, active, deaths, recovered)
+    ratio_category = st.selectbox(
+        'Ratio category',
+        options=covid_ratios,
+        format_func=lambda x: x.replace('_', ' ').title(),
+        index=0  # Set default to 'confirmed_ratio
+    )
 
-st.caption("COVID ratio are total cases per country in 2020 divided by population. For instance: covid confirmed ratio = confirmed cases/population")
+    # Optional browser-side mode: the table is sent once and the charts filter each other
+    # through Vega-Lite params, so Python only reruns when the factors change
+    if st.toggle('Interactive crossfilter (filter in the browser)'):
+        crossfilter_log = st.checkbox('log10 axes', key='crossfilter_log')
+        with timings.span('part2.crossfilter.chart_build'):
+            crossfilter_chart = crossfilter_spec(df, x_axis, y_axis, ratio_category, crossfilter_log)
+        with timings.span('part2.crossfilter.render'):
+            st.vega_lite_chart(crossfilter_chart)
+        st.caption("The regression line is fitted in the browser on the clicked countries. "
+                   "Switch the crossfilter off for the server-side fits, the heatmap and the coefficient table.")
+        return
+
+    # Dropdown for selecting countries
+    countries = st.multiselect('Country', 
+                               options=df['country'].unique(), 
+                               default=df['country'].unique())
+
+    # Filter data based on selected countries
+    with timings.span('part2.filter'):
+        filtered_df = queries.socioeconomic(countries, window)
+
+    # Section 1: Bubble Chart
+    st.header("Bubble Chart: COVID-19 Ratio by Socioeconomic Factors")
+
+    # Create the bubble chart
+    with timings.span('part2.bubble.chart_build'):
+        bubble_chart = bubble_spec(filtered_df, x_axis, y_axis, ratio_category)
+
+    # Display the bubble chart
+    with timings.span('part2.bubble.render'):
+        st.vega_lite_chart(bubble_chart)
+
+    st.caption("COVID ratio are total cases per country in the selected date window (all of 2020 by default) divided by population. For instance: covid confirmed ratio = confirmed cases/population. "
+               "For a narrower window, countries missing from the weekly data have no ratio.")
+
+    #########################################################################################################
+    # Section 2: Scatterplot + Regression Line
+    st.header("Scatterplot + Regression Line")
+
+    # Regressions run on the server for every factor x ratio pair; the chart only draws the fitted line,
+    # with the correlation and the fit in the subtitle (see DashboardQueries.scatter_fit)
+    log_col, robust_col, bootstrap_col = st.columns(3)
+    log_scale = log_col.checkbox('log10 axes')
+    robust = robust_col.checkbox('Robust (Huber) fit')
+    bootstrap = bootstrap_col.checkbox('Bootstrap 95% CI')
+    with timings.span('part2.regression'):
+        regression_data, subtitle = queries.scatter_fit(x_axis, ratio_category, countries, log_scale, robust, window)
+
+    # Scatterplot, regression line and its confidence band
+    with timings.span('part2.scatter.chart_build'):
+        final_chart = scatter_spec(filtered_df, regression_data, x_axis, ratio_category, log_scale, subtitle)
+
+    # Display the final combined chart (scatterplot + regression line + correlation text as title)
+    with timings.span('part2.scatter.render'):
+        st.vega_lite_chart(final_chart)
+
+    with st.expander("Regression coefficients for every factor and ratio"):
+        coefficients = queries.regression(countries, log_scale, robust, window)
+        if bootstrap:
+            coefficients = coefficients.join(load_bootstrap_table(tuple(countries), log_scale, window))
+            if robust:
+                st.caption("The bootstrap intervals are those of the least-squares fit.")
+        coefficients = coefficients.drop(columns=['x_mean', 'sxx']).reset_index()
+        st.dataframe(coefficients, hide_index=True)
+        st.download_button('Download CSV', coefficients.to_csv(index=False), file_name='regression_coefficients.csv',
+                           mime='text/csv')
+
+    #########################################################################################################
+    # Section 3: Heatmap of correlations
+    st.header("Heatmap: correlations")
+    correlation_method = st.radio('Correlation method', options=METHODS, format_func=str.title, horizontal=True)
+    with timings.span('part2.heatmap.aggregate'):
+        correlation_long = queries.correlations(countries, correlation_method, window=window)
+
+    # Create the heatmap
+    with timings.span('part2.heatmap.chart_build'):
+        heatmap = heatmap_spec(correlation_long, correlation_method)
+
+    # Display the heatmap in Streamlit
+    with timings.span('part2.heatmap.render'):
+        st.vega_lite_chart(heatmap)
+
+    ############################################################################################
+    # Section 4: Bar chart
+    st.header("Bar chart: Raw cases filtered by socioeconomic factors")
+    bar_chart_section(df, x_axis)
+
+
+@st.fragment
+@timings.section('bar')
+def bar_chart_section(df, x_axis):
+    # Dropdown for case type (confirmed, active, deaths, recovered)
+    case_type = st.selectbox(
+        'Case Type',
+        options=['confirmed', 'active', 'deaths', 'recovered'],
+        format_func=lambda x: x.capitalize()
+    )
 
-#########################################################################################################
-# Section 2: Scatterplot + Regression Line
-st.header("Scatterplot + Regression Line")
+    # Slider for filtering countries based on the selected socioeconomic factor
+    min_value = float(df[x_axis].min())
+    max_value = float(df[x_axis].max())
 
-# Calculate the correlation coefficient between the selected socioeconomic factor and the selected COVID ratio
-correlation_coef = filtered_df[x_axis].corr(filtered_df[ratio_category])
+    factor_range = st.slider(
+        f'Select Range for {x_axis.replace("_", " ").title()}',
+        min_value=min_value,
+        max_value=max_value,
+        value=(min_value, max_value)  # Default range is the full range of the data
+    )
 
-# Create the scatterplot with a regression line
-scatter_plot = alt.Chart(filtered_df).mark_circle(size=100).encode(
-    x=alt.X(x_axis, title=x_axis.replace('_', ' ').title()),
-    y=alt.Y(ratio_category, title=ratio_category.replace('_', ' ').title()),
-    color=alt.Color('country', legend=None),
-    tooltip=['country', x_axis, ratio_category]
-)
+    # Filter the dataset based on the selected socioeconomic factor range
+    with timings.span('bar.filter'):
+        filtered_range_df = df[(df[x_axis] >= factor_range[0]) & (df[x_axis] <= factor_range[1])]
 
-# Add the regression line with slope and intercept in the tooltip
-regression_line = scatter_plot.transform_regression(
-    x_axis, ratio_category
-).mark_line(color='red').encode(
-    tooltip=[
-        alt.Tooltip('slope:Q', title='Slope'),
-        alt.Tooltip('intercept:Q', title='Intercept')
-    ]
-)
+    # Create a bar chart showing the raw cases for the filtered countries
+    with timings.span('bar.chart_build'):
+        bar_chart = bar_spec(filtered_range_df, case_type, x_axis)
 
-# Layer the scatterplot and regression line, and set the combined title
-final_chart = alt.layer(
-    scatter_plot + regression_line
-).properties(
-    width=700,
-    height=500,
-    title={
-        'text': f'Scatterplot: {x_axis.replace("_", " ").title()} vs {ratio_category.replace("_", " ").title()}',
-        'subtitle': f'Correlation: {correlation_coef:.2f}'
-    }
-).configure_title(
-    anchor='start',
-    fontSize=16,
-    fontWeight='bold',
-    subtitleFontSize=16,  # Subtitle styling
-    subtitleFontWeight='normal',
-    lineHeight=25  # Adjust title-subtitle spacing
-)
+    # Display the bar chart
+    with timings.span('bar.render'):
+        st.vega_lite_chart(bar_chart)
 
-# Display the final combined chart (scatterplot + regression line + correlation text as title)
-st.altair_chart(final_chart, use_container_width=True)
-
-#########################################################################################################
-# Section 3: Heatmap of correlations
-st.header("Heatmap: correlations")
-# Select columns for the correlation matrix
-correlation_columns = ['health_expenditure', 'death_rate', 'GDP', 'life_expectancy', 'literacy_rate', 'net_migration', 
-                       'poverty_ratio', 'unemployment', 'population', 'density', 
-                       'covid_confirmed_ratio', 'covid_deaths_ratio', 'covid_recovered_ratio', 'covid_active_ratio']
-
-# Calculate the correlation matrix
-correlation_matrix = df[correlation_columns].corr()
-
-# Convert the correlation matrix to a long format suitable for Altair
-correlation_long = correlation_matrix.reset_index().melt(id_vars='index')
-correlation_long.columns = ['Variable 1', 'Variable 2', 'Correlation']
-
-# Create the heatmap with Altair
-heatmap = alt.Chart(correlation_long).mark_rect().encode(
-    x=alt.X('Variable 1:N', title='Socioeconomic Factors and COVID-19 Metrics'),
-    y=alt.Y('Variable 2:N', title='Socioeconomic Factors and COVID-19 Metrics'),
-    color=alt.Color('Correlation:Q', scale=alt.Scale(scheme='redblue')),
-    tooltip=['Variable 1', 'Variable 2', 'Correlation']
-).properties(
-    width=600,
-    height=600,
-    title="Correlation Heatmap"
-)
 
-# Display the heatmap in Streamlit
-st.altair_chart(heatmap, use_container_width=True)
+part2_section()
 
-############################################################################################
-# Section 4: Bar chart
-st.header("Bar chart: Raw cases filtered by socioeconomic factors")
+st.caption(dashboard_report.summary())
 
-# Dropdown for case type (confirmed, active, deaths, recovered)
-case_type = st.selectbox(
-    'Case Type',
-    options=['confirmed', 'active', 'deaths', 'recovered'],
-    format_func=lambda x: x.capitalize()
-)
+timings.finish()
+# First render of the process (later runs are ignored); then fill the shared caches for the next sessions,
+# once per data version so a newly published store is warmed as well
+startup_report.mark('first_render', time.perf_counter() - script_started)
 
-# Slider for filtering countries based on the selected socioeconomic factor
-min_value = float(df[x_axis].min())
-max_value = float(df[x_axis].max())
 
-factor_range = st.slider(
-    f'Select Range for {x_axis.replace("_", " ").title()}',
-    min_value=min_value,
-    max_value=max_value,
-    value=(min_value, max_value)  # Default range is the full range of the data
-)
+@st.cache_resource(max_entries=1)
+def prewarm_caches(version, _queries):
+    return start_prewarm(_queries)
 
-# Filter the dataset based on the selected socioeconomic factor range
-filtered_range_df = df[(df[x_axis] >= factor_range[0]) & (df[x_axis] <= factor_range[1])]
-
-# Create a bar chart showing the raw cases for the filtered countries
-bar_chart = alt.Chart(filtered_range_df).mark_bar().encode(
-    x=alt.X('country:N', title='Country', sort=alt.EncodingSortField(field=case_type, order='descending')),
-    y=alt.Y(f'{case_type}:Q', title=f'Total {case_type.capitalize()} Cases'),
-    color=alt.Color('country:N', legend=None),
-    tooltip=['country', f'{case_type}', x_axis]
-).properties(
-    width=700,
-    height=500,
-    title=f'Total {case_type.capitalize()} Cases by Country (Filtered by {x_axis.replace("_", " ").title()})'
-).configure_axisX(
-    labelFontSize=10  # Set the font size for the x-axis labels
-)
 
-# Display the bar chart
-st.altair_chart(bar_chart, use_container_width=True)
+prewarm_caches(queries.version, queries)
+if timings.enabled:
+    # Debug panel with this run's spans (fragment-only reruns cannot write to the sidebar; they are only logged)
+    with st.sidebar.expander("Timing (ms)", expanded=True):
+        st.dataframe(timings.table(), hide_index=True)
+        st.caption("Startup of this process")
+        st.dataframe(startup_report.table(), hide_index=True)
+        st.caption("Query cache")
+        st.json(query_cache.stats())
@@ -0,0 +1,80 @@
+"""
+Shared fixtures: a small synthetic weekly table, shaped like 'Weekly Data.csv'.
+
+The modules are flat scripts in Code/, imported by name like the benchmarks do.
+
+    python -m pytest Code/tests
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+CODE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, CODE_DIR)
+
+from case_cube import CaseCube  # noqa: E402
+from data_loader import CASE_METRICS, WEEKLY_COLUMNS, prepare_weekly  # noqa: E402
+from queries import DashboardQueries  # noqa: E402
+
+# Country_Region -> (region, sub-region, country-code)
+COUNTRIES = {
+    'Italy': ('Europe', 'Southern Europe', 380),
+    'Spain': ('Europe', 'Southern Europe', 724),
+    'Sweden': ('Europe', 'Northern Europe', 752),
+    'Peru': ('Americas', 'Latin America and the Caribbean', 604),
+    'Chile': ('Americas', 'Latin America and the Caribbean', 152),
+    'Japan': ('Asia', 'Eastern Asia', 392),
+}
+
+
+def raw_weekly(n_weeks=30, missing=0.1, seed=0):
+    """Weekly rows in the CSV layout, with gamma-distributed counts and some missing country-weeks."""
+    rng = np.random.default_rng(seed)
+    weeks = pd.date_range('2020-01-06', periods=n_weeks, freq='7D')
+    rows = []
+    for country, (region, sub_region, code) in COUNTRIES.items():
+        population, density = int(rng.integers(1_000_000, 100_000_000)), float(rng.uniform(10, 300))
+        for week in weeks:
+            if rng.random() < missing:
+                continue
+            rows.append({'Country_Region': country, 'MMWR_week': week.isocalendar().week,
+                         'Week_Start_Date': week.strftime('%Y-%m-%d'), 'Population': population,
+                         'Density (P/Km²)': density, 'alpha-2': country[:2].upper(), 'alpha-3': country[:3].upper(),
+                         'country-code': code, 'region': region, 'sub-region': sub_region})
+    raw = pd.DataFrame(rows)
+    for metric in CASE_METRICS:
+        raw[metric] = rng.gamma(2.0, 1000.0, len(raw)).round()
+    return raw[WEEKLY_COLUMNS]
+
+
+@pytest.fixture
+def weekly():
+    """Prepared weekly table (data_loader.prepare_weekly), as load_weekly_data returns it."""
+    return prepare_weekly(raw_weekly())
+
+
+@pytest.fixture
+def loads():
+    """Earlier and current (weekly table, cube): the current load adds 10 weeks and revises week 12."""
+    raw = raw_weekly()
+    weeks = sorted(raw['Week_Start_Date'].unique())
+    earlier = prepare_weekly(raw[raw['Week_Start_Date'] < weeks[20]])
+    raw.loc[raw['Week_Start_Date'] == weeks[12], 'Confirmed'] += 100
+    current = prepare_weekly(raw)
+    return (earlier, CaseCube.from_weekly(earlier)), (current, CaseCube.from_weekly(current))
+
+
+@pytest.fixture
+def load_sources(tmp_path, monkeypatch):
+    """DashboardQueries.from_sources over a weekly table written to a CSV, with the Parquet snapshots in tmp_path."""
+    monkeypatch.setattr('data_loader.CACHE_DIR', str(tmp_path))
+
+    def load(raw, previous=None):
+        path = tmp_path / f'weekly-{len(list(tmp_path.glob("weekly-*.csv")))}.csv'
+        raw.to_csv(path, index=False)
+        monkeypatch.setenv('SKITTY_WEEKLY_SOURCE', str(path))
+        return DashboardQueries.from_sources(previous=previous)
+    return load
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from correlation import METHODS, CorrelationEngine
+
+COLUMNS = ['a', 'b', 'c', 'd']
+
+
+@pytest.fixture
+def table():
+    rng = np.random.default_rng(1)
+    values = rng.normal(size=(60, len(COLUMNS)))
+    values[:, 1] += 0.8 * values[:, 0]
+    values[:, 3] = np.exp(values[:, 2])  # monotone: Spearman 1, Pearson below
+    values[rng.random(values.shape) < 0.15] = np.nan  # pairwise-complete rows differ per pair
+    df = pd.DataFrame(values, columns=COLUMNS)
+    df.insert(0, 'country', [f'country {i}' for i in range(len(df))])
+    return df
+
+
+@pytest.mark.parametrize('method', METHODS)
+def test_matrix_matches_pandas(table, method):
+    engine = CorrelationEngine(table, COLUMNS)
+    expected = table[COLUMNS].corr(method=method)
+    pd.testing.assert_frame_equal(engine.matrix(method=method), expected, check_exact=False, atol=1e-10)
+
+
+@pytest.mark.parametrize('method', METHODS)
+@pytest.mark.parametrize('size', [5, 20, 50])
+def test_subset_matches_pandas(table, method, size):
+    # Small and large subsets take the two sides of the sufficient-statistics sum
+    engine = CorrelationEngine(table, COLUMNS)
+    countries = list(table['country'].sample(size, random_state=size))
+    expected = table[table['country'].isin(countries)][COLUMNS].corr(method=method)
+    pd.testing.assert_frame_equal(engine.matrix(countries, method), expected, check_exact=False, atol=1e-10)
+
+
+def test_pair_and_long(table):
+    engine = CorrelationEngine(table, COLUMNS)
+    assert engine.pair('a', 'b') == pytest.approx(table['a'].corr(table['b']))
+    long = engine.long()
+    assert list(long.columns) == ['Variable 1', 'Variable 2', 'Correlation']
+    assert len(long) == len(COLUMNS) ** 2
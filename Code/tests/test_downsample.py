@@ -0,0 +1,72 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from downsample import downsample_series, lttb, point_budget
+
+
+def reference_lttb(points, threshold):
+    """Steinarsson's Largest-Triangle-Three-Buckets, point by point; returns the kept indices."""
+    n = len(points)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+    every = (n - 2) / (threshold - 2)
+    kept, a = [0], 0
+    for i in range(threshold - 2):
+        avg_start, avg_end = math.floor((i + 1) * every) + 1, min(math.floor((i + 2) * every) + 1, n)
+        avg_x = sum(points[j][0] for j in range(avg_start, avg_end)) / (avg_end - avg_start)
+        avg_y = sum(points[j][1] for j in range(avg_start, avg_end)) / (avg_end - avg_start)
+        best, best_area = None, -1.0
+        for j in range(math.floor(i * every) + 1, math.floor((i + 1) * every) + 1):
+            area = abs((points[a][0] - avg_x) * (points[j][1] - points[a][1])
+                       - (points[a][0] - points[j][0]) * (avg_y - points[a][1])) * 0.5
+            if area > best_area:
+                best, best_area = j, area
+        kept.append(best)
+        a = best
+    kept.append(n - 1)
+    return kept
+
+
+@pytest.mark.parametrize('n, threshold', [(52, 20), (300, 37), (1000, 100), (101, 99), (10, 3)])
+def test_lttb_matches_reference(n, threshold):
+    rng = np.random.default_rng(n)
+    x = np.cumsum(rng.uniform(0.5, 1.5, n))
+    y = np.cumsum(rng.normal(size=n))
+    expected = reference_lttb(list(zip(x, y)), threshold)
+    np.testing.assert_array_equal(lttb(x, y, threshold), expected)
+
+
+def test_lttb_under_budget_keeps_everything():
+    np.testing.assert_array_equal(lttb(np.arange(10.0), np.zeros(10), 10), np.arange(10))
+    np.testing.assert_array_equal(lttb(np.arange(10.0), np.zeros(10), 2), np.arange(10))
+
+
+def test_downsample_series_per_group():
+    rng = np.random.default_rng(4)
+    frames = []
+    for country, n in [('A', 200), ('B', 40), ('C', 120)]:
+        frames.append(pd.DataFrame({'country': country, 'day': pd.date_range('2020-01-01', periods=n),
+                                    'value': rng.gamma(2, 10, n)}))
+    df = pd.concat(frames).sample(frac=1, random_state=0)  # shuffled rows
+    result = downsample_series(df, 'day', 'value', 'country', 50)
+
+    for country, group in df.groupby('country'):
+        group = group.sort_values('day')
+        kept = result[result['country'] == country]
+        if len(group) <= 50:
+            pd.testing.assert_frame_equal(kept.reset_index(drop=True), group.reset_index(drop=True))
+            continue
+        # The LTTB picks plus the series' maximum and minimum, in date order
+        x = group['day'].to_numpy().astype('datetime64[ns]').astype(np.int64)
+        picks = set(reference_lttb(list(zip(x, group['value'])), 50))
+        picks |= {int(np.argmax(group['value'])), int(np.argmin(group['value']))}
+        expected = group.iloc[sorted(picks)].reset_index(drop=True)
+        pd.testing.assert_frame_equal(kept.reset_index(drop=True), expected)
+
+
+def test_point_budget():
+    assert point_budget(700) == 350
+    assert point_budget(1) == 3
@@ -0,0 +1,63 @@
+"""Full vs incremental ingest: the daily file ingested in two runs gives what a single full run gives."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import COUNTRIES
+from data_loader import WEEKLY_FILE
+from ingest import ANNUAL_FILE, CODE_COLUMNS, ingest
+
+
+@pytest.fixture
+def sources(tmp_path):
+    """Daily file (two provinces for some countries, a year boundary), population and country code tables."""
+    rng = np.random.default_rng(5)
+    days = pd.date_range('2020-11-20', '2021-02-10')
+    rows = []
+    for country in COUNTRIES:
+        for province in ['North', 'South'] if country in ('Italy', 'Japan') else ['']:
+            counts = rng.poisson(200, (len(days), 3))
+            rows += [{'ObservationDate': day.strftime('%m/%d/%Y'), 'Province/State': province,
+                      'Country/Region': country, 'Confirmed': c, 'Deaths': d, 'Recovered': r}
+                     for day, (c, d, r) in zip(days, counts)]
+    daily = pd.DataFrame(rows)
+
+    population = pd.DataFrame({'Country (or dependency)': list(COUNTRIES),
+                               'Population (2020)': rng.integers(1_000_000, 100_000_000, len(COUNTRIES)),
+                               'Density (P/Km²)': rng.integers(10, 300, len(COUNTRIES))})
+    codes = pd.DataFrame({'Country': list(COUNTRIES)})
+    for column in CODE_COLUMNS:
+        codes[column] = [f'{column} {i}' for i in range(len(COUNTRIES))]
+    codes['country-code'] = [code for _, _, code in COUNTRIES.values()]
+    codes['region'] = [region for region, _, _ in COUNTRIES.values()]
+    codes['sub-region'] = [sub_region for _, sub_region, _ in COUNTRIES.values()]
+
+    paths = {name: str(tmp_path / f'{name}.csv') for name in ['daily', 'population', 'codes']}
+    daily.to_csv(paths['daily'], index=False)
+    population.to_csv(paths['population'], index=False)
+    codes.to_csv(paths['codes'], index=False)
+    return daily, paths
+
+
+def read_outputs(directory):
+    return pd.read_csv(directory / WEEKLY_FILE), pd.read_csv(directory / ANNUAL_FILE)
+
+
+@pytest.mark.parametrize('cutoff', ['12/02/2020', '12/31/2020', '01/13/2021'])
+def test_incremental_ingest_matches_full(tmp_path, sources, cutoff):
+    daily, paths = sources
+    full_dir, incremental_dir = tmp_path / 'full', tmp_path / 'incremental'
+    full_dir.mkdir()
+    incremental_dir.mkdir()
+    ingest(paths['daily'], paths['population'], paths['codes'], output_dir=str(full_dir), full=True)
+
+    # The first run stops mid-week (and, for one cutoff, at the end of a year); the second adds the days after it
+    dates = pd.to_datetime(daily['ObservationDate'])
+    first_part = str(tmp_path / 'first.csv')
+    daily[dates <= pd.Timestamp(cutoff)].to_csv(first_part, index=False)
+    ingest(first_part, paths['population'], paths['codes'], output_dir=str(incremental_dir))
+    state = ingest(paths['daily'], output_dir=str(incremental_dir), country_codes_path=paths['codes'])
+    assert state['previous_observation_date'] == pd.Timestamp(cutoff).strftime('%Y-%m-%d')
+
+    for full, incremental in zip(read_outputs(full_dir), read_outputs(incremental_dir)):
+        pd.testing.assert_frame_equal(incremental, full)
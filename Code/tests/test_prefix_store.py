@@ -0,0 +1,53 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from case_cube import CaseCube
+from data_loader import CASE_METRICS
+from prefix_store import PLOT2_CASES, PrefixStore
+
+
+@pytest.fixture
+def cube(weekly):
+    return CaseCube.from_weekly(weekly)
+
+
+def reference_totals(weekly, start, end):
+    """Per-country sums of the weeks overlapping [start, end], by a groupby over the weekly rows."""
+    week_start = weekly['Week_Start_Date']
+    rows = weekly[(week_start > pd.Timestamp(start) - pd.Timedelta(days=7)) & (week_start <= pd.Timestamp(end))]
+    totals = rows.groupby('Country_Region', observed=False)[CASE_METRICS].sum()
+    return totals.astype(np.float64)
+
+
+@pytest.mark.parametrize('start, end', [
+    ('2020-01-06', '2020-08-02'),  # the whole range
+    ('2020-02-12', '2020-03-20'),  # starts and ends mid-week
+    ('2020-03-01', '2020-03-01'),  # a single day
+    ('2019-12-01', '2020-01-05'),  # before the first week
+])
+def test_window_totals_match_groupby(weekly, cube, start, end):
+    store = PrefixStore(cube)
+    start, end = datetime.date.fromisoformat(start), datetime.date.fromisoformat(end)
+    totals = store.totals(cube.date_slice(start, end))
+    expected = reference_totals(weekly, start, end).reindex(cube.countries, fill_value=0.0)
+    np.testing.assert_allclose(totals, expected.to_numpy(), rtol=1e-5)
+
+
+def test_window_table(weekly, cube):
+    store = PrefixStore(cube)
+    plot2 = pd.DataFrame({'country': ['Japan', 'Italy', 'Narnia'], 'population': [1.25e8, 6.0e7, 1.0e6]})
+    start, end = datetime.date(2020, 3, 1), datetime.date(2020, 5, 31)
+    table = store.window_table(plot2, cube.date_slice(start, end))
+
+    expected = reference_totals(weekly, start, end)
+    for name in ['Japan', 'Italy']:
+        row = table[table['country'] == name].iloc[0]
+        np.testing.assert_allclose(row[PLOT2_CASES].to_numpy(dtype=np.float64), expected.loc[name], rtol=1e-5)
+        assert row['covid_confirmed_ratio'] == pytest.approx(row['confirmed'] / row['population'])
+    # No weekly country matches: no totals
+    assert table[table['country'] == 'Narnia'][PLOT2_CASES].isna().all(axis=None)
+    # The Part 2 table itself is left as it was
+    assert list(plot2.columns) == ['country', 'population']
@@ -0,0 +1,98 @@
+import threading
+import time
+from concurrent.futures import Future
+
+import pytest
+
+from query_cache import QueryCache
+
+
+def fixed_size(value):
+    return 10
+
+
+def in_thread(call):
+    """Future of `call()` run in a daemon thread, so a caller stuck waiting fails the test instead of hanging it."""
+    outcome = Future()
+
+    def run():
+        try:
+            outcome.set_result(call())
+        except BaseException as error:
+            outcome.set_exception(error)
+    threading.Thread(target=run, daemon=True).start()
+    return outcome
+
+
+def wait_for_coalesced(cache, count):
+    deadline = time.monotonic() + 5
+    while cache.stats()['coalesced'] < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_single_flight():
+    cache = QueryCache()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return 'value'
+
+    results = [in_thread(lambda: cache.get('key', compute)) for _ in range(4)]
+    # Release the first computation once the three other callers are waiting for it
+    wait_for_coalesced(cache, 3)
+    release.set()
+    assert [result.result(5) for result in results] == ['value'] * 4
+    assert len(calls) == 1
+    assert cache.stats()['misses'] == 1 and cache.stats()['coalesced'] == 3
+    assert cache.get('key', lambda: 'other') == 'value'
+
+
+def test_lru_eviction():
+    cache = QueryCache(max_bytes=30)
+    for key in 'abc':
+        cache.get(key, lambda key=key: key.upper(), size=fixed_size)
+    cache.get('a', lambda: 'unused', size=fixed_size)  # a becomes the most recently used
+    cache.get('d', lambda: 'D', size=fixed_size)
+    stats = cache.stats()
+    assert stats['entries'] == 3 and stats['bytes'] == 30 and stats['evictions'] == 1
+    # b was evicted: asking again computes it, a is still cached
+    assert cache.get('a', lambda: 'new', size=fixed_size) == 'A'
+    assert cache.get('b', lambda: 'new', size=fixed_size) == 'new'
+
+
+def test_values_over_the_budget_are_not_kept():
+    cache = QueryCache(max_bytes=30)
+    cache.get('small', lambda: 'small', size=fixed_size)
+    assert cache.get('large', lambda: 'large', size=lambda value: 31) == 'large'
+    stats = cache.stats()
+    assert stats['entries'] == 1 and stats['bytes'] == 10 and stats['evictions'] == 0
+    assert cache.get('large', lambda: 'again', size=lambda value: 31) == 'again'
+
+
+@pytest.mark.parametrize('failing', ['compute', 'size'])
+def test_errors_reach_the_waiters_and_clear_the_key(failing):
+    cache = QueryCache()
+    release = threading.Event()
+
+    def compute():
+        release.wait(5)
+        if failing == 'compute':
+            raise ValueError(failing)
+        return 'value'
+
+    def size(value):
+        if failing == 'size':
+            raise ValueError(failing)
+        return 10
+
+    results = [in_thread(lambda: cache.get('key', compute, size)) for _ in range(2)]
+    wait_for_coalesced(cache, 1)
+    release.set()
+    for result in results:
+        with pytest.raises(ValueError, match=failing):
+            result.result(5)
+    # Nothing is left in flight: the next caller computes instead of waiting forever
+    assert in_thread(lambda: cache.get('key', lambda: 'again', fixed_size)).result(5) == 'again'
@@ -0,0 +1,119 @@
+"""The HTTP API of query_server.py: parameter checks, conditional requests and content negotiation."""
+import gzip
+import http.client
+import io
+import json
+import threading
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from conftest import raw_weekly
+from query_server import CONTENT_TYPES, make_server
+
+
+@pytest.fixture
+def server(load_sources):
+    """(queries, get): a server on a free port and a function returning (response, body) of a GET."""
+    queries = load_sources(raw_weekly())
+    httpd = make_server(port=0, queries=queries)
+    # A short poll interval, since shutdown() waits for the loop to notice
+    thread = threading.Thread(target=httpd.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+
+    def get(path, **headers):
+        connection = http.client.HTTPConnection('127.0.0.1', httpd.server_port, timeout=10)
+        connection.request('GET', path, headers={name.replace('_', '-'): value for name, value in headers.items()})
+        response = connection.getresponse()
+        body = response.read()
+        connection.close()
+        return response, body
+
+    yield queries, get
+    httpd.shutdown()
+    httpd.server_close()
+    thread.join()
+
+
+@pytest.mark.parametrize('path', [
+    '/series?country=Atlantis',
+    '/series?budget=2',
+    '/series?budget=many',
+    '/series?metric=Cases',
+    '/series?level=Continents',
+    '/series?format=xml',
+    '/means?start=2020-13-01',
+    '/similar?country=Atlantis',
+    '/similar?country=Italy&k=0',
+    '/correlations?method=kendall',
+])
+def test_invalid_parameters_get_400(server, path):
+    _, get = server
+    response, body = get(path)
+    assert response.status == 400
+    assert 'error' in json.loads(body)
+    # Even for a client that would accept any cached representation
+    response, _ = get(path, If_None_Match='*')
+    assert response.status == 400
+
+
+def test_unknown_endpoint_gets_404(server):
+    _, get = server
+    assert get('/cases')[0].status == 404
+
+
+def test_etag_and_not_modified(server):
+    queries, get = server
+    response, body = get('/series?country=Italy&country=Spain')
+    assert response.status == 200 and body
+    etag = response.getheader('ETag')
+    assert queries.version in etag
+
+    # The country order does not matter; the countries and the format do
+    assert get('/series?country=Spain&country=Italy')[0].getheader('ETag') == etag
+    assert get('/series?country=Italy&country=Peru')[0].getheader('ETag') != etag
+    assert get('/series?country=Italy&country=Spain&format=csv')[0].getheader('ETag') != etag
+
+    response, body = get('/series?country=Spain&country=Italy', If_None_Match=etag)
+    assert response.status == 304 and body == b''
+    assert response.getheader('ETag') == etag
+    response, _ = get('/series?country=Italy&country=Spain', If_Modified_Since=response.getheader('Last-Modified'))
+    assert response.status == 304
+    assert get('/series?country=Italy&country=Peru', If_None_Match=etag)[0].status == 200
+
+
+def test_gzip(server):
+    _, get = server
+    plain, body = get('/series')
+    assert plain.getheader('Content-Encoding') is None
+    response, compressed = get('/series', Accept_Encoding='gzip, deflate')
+    assert response.getheader('Content-Encoding') == 'gzip'
+    assert len(compressed) < len(body)
+    assert gzip.decompress(compressed) == body
+    # Small bodies are not worth compressing
+    response, _ = get('/similar?country=Italy&k=1', Accept_Encoding='gzip')
+    assert response.status == 200 and response.getheader('Content-Encoding') is None
+
+
+@pytest.mark.parametrize('query, headers', [
+    ('&format=arrow', {}),
+    ('', {'Accept': CONTENT_TYPES['arrow']}),
+], ids=['parameter', 'accept'])
+def test_arrow_and_csv(server, query, headers):
+    queries, get = server
+    path = '/series?country=Italy&country=Chile&metric=Deaths'
+    expected = queries.series(['Italy', 'Chile'], None, None, 'Deaths', 'Weekly Case')
+
+    response, body = get(path + query, **headers)
+    assert response.getheader('Content-Type') == CONTENT_TYPES['arrow']
+    table = pa.ipc.open_stream(body).read_all()
+    pd.testing.assert_frame_equal(table.to_pandas(), expected.reset_index(drop=True))
+
+    response, body = get(path + '&format=csv')
+    assert response.getheader('Content-Type') == CONTENT_TYPES['csv']
+    rows = pd.read_csv(io.BytesIO(body))
+    assert list(rows.columns) == list(expected.columns) and len(rows) == len(expected)
+    response, body = get(path)
+    assert response.getheader('Content-Type') == CONTENT_TYPES['json']
+    assert len(json.loads(body)) == len(expected)
@@ -0,0 +1,156 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from regression import HUBER_C, T_TABLE, bootstrap_table, fit_table, line_data, t_critical
+
+FACTORS = ['f1', 'f2']
+RATIOS = ['r1', 'r2', 'r3']
+
+
+@pytest.fixture
+def table():
+    rng = np.random.default_rng(2)
+    n = 80
+    df = pd.DataFrame({'f1': rng.uniform(1, 10, n), 'f2': rng.lognormal(2, 1, n)})
+    df['r1'] = 0.5 * df['f1'] + rng.normal(0, 1, n)
+    df['r2'] = -0.02 * df['f2'] + 3 + rng.normal(0, 0.5, n)
+    df['r3'] = rng.lognormal(0, 1, n)
+    df.loc[rng.random(n) < 0.1, 'f1'] = np.nan
+    df.loc[rng.random(n) < 0.1, 'r2'] = np.nan
+    df.loc[:4, 'r1'] += 40  # outliers for the robust fit
+    return df
+
+
+def complete(df, x, y):
+    pair = df[[x, y]].dropna()
+    return pair[x].to_numpy(), pair[y].to_numpy()
+
+
+def ols(x, y):
+    """Textbook simple regression: slope, intercept, r2, slope SE, intercept SE."""
+    n = len(x)
+    slope, intercept = np.polyfit(x, y, 1)
+    residuals = y - (intercept + slope * x)
+    sxx = ((x - x.mean()) ** 2).sum()
+    s2 = (residuals ** 2).sum() / (n - 2)
+    r2 = np.corrcoef(x, y)[0, 1] ** 2
+    return slope, intercept, r2, np.sqrt(s2 / sxx), np.sqrt(s2 * (1 / n + x.mean() ** 2 / sxx))
+
+
+def huber(x, y, iterations=20):
+    """Huber IRLS of one pair, with the MAD scale of the residuals re-estimated every iteration."""
+    slope, intercept = np.polyfit(x, y, 1)
+    for _ in range(iterations):
+        residuals = y - (intercept + slope * x)
+        scale = np.median(np.abs(residuals - np.median(residuals))) / 0.6745
+        u = np.abs(residuals) / scale
+        w = np.where(u > HUBER_C, HUBER_C / np.where(u > 0, u, 1), 1.0)
+        previous = slope
+        slope, intercept = np.polyfit(x, y, 1, w=np.sqrt(w))
+        if np.isclose(slope, previous, rtol=1e-8):
+            break
+    return slope, intercept
+
+
+def t_probability(t, dof):
+    """P(|T| < t) for an integer dof, from the finite series of the Student t distribution."""
+    theta = np.arctan(t / np.sqrt(dof))
+    c2 = np.cos(theta) ** 2
+    if dof % 2:
+        total = term = np.cos(theta) if dof > 1 else 0.0
+        for k in range(3, dof - 1, 2):
+            term *= (k - 1) / k * c2
+            total += term
+        return 2 / np.pi * (theta + np.sin(theta) * total)
+    total = term = 1.0
+    for k in range(2, dof - 1, 2):
+        term *= (k - 1) / k * c2
+        total += term
+    return np.sin(theta) * total
+
+
+def t_quantile(dof, level):
+    """Two-sided quantile by bisection on t_probability."""
+    low, high = 0.0, 1000.0
+    for _ in range(100):
+        middle = (low + high) / 2
+        low, high = (middle, high) if t_probability(middle, dof) < level else (low, middle)
+    return low
+
+
+@pytest.mark.parametrize('level', sorted(T_TABLE))
+def test_t_critical_matches_the_t_distribution(level):
+    dof = np.arange(1, 121)
+    expected = [t_quantile(d, level) for d in dof]
+    np.testing.assert_allclose(t_critical(dof, level), expected, atol=5e-4)
+    assert t_critical(1, level) == pytest.approx(expected[0], abs=5e-4)
+    assert np.isnan(t_critical([0, -1, np.nan], level)).all()
+
+
+def test_ols_matches_reference(table):
+    fits = fit_table(table, FACTORS, RATIOS)
+    for x in FACTORS:
+        for y in RATIOS:
+            xs, ys = complete(table, x, y)
+            fit = fits.loc[(x, y)]
+            assert fit['n'] == len(xs)
+            expected = ols(xs, ys)
+            actual = [fit['slope'], fit['intercept'], fit['r2'], fit['slope_se'], fit['intercept_se']]
+            np.testing.assert_allclose(actual, expected, rtol=1e-8)
+
+
+def test_log_fit_drops_non_positive_values(table):
+    table = table.copy()
+    table.loc[5:9, 'r2'] = -1.0
+    fits = fit_table(table, FACTORS, RATIOS, log_x=True, log_y=True)
+    logged = np.log10(table[FACTORS + RATIOS].where(table[FACTORS + RATIOS] > 0))
+    xs, ys = complete(logged, 'f2', 'r2')
+    assert fits.loc[('f2', 'r2'), 'n'] == len(xs)
+    np.testing.assert_allclose(fits.loc[('f2', 'r2'), ['slope', 'intercept']], np.polyfit(xs, ys, 1), rtol=1e-8)
+
+
+def test_huber_matches_reference(table):
+    fits = fit_table(table, FACTORS, RATIOS, robust=True)
+    for x in FACTORS:
+        for y in RATIOS:
+            expected = huber(*complete(table, x, y))
+            np.testing.assert_allclose(fits.loc[(x, y), ['slope', 'intercept']], expected, rtol=1e-6)
+    # The outliers pull the least-squares slope away from 0.5, much less the robust one
+    ols_slope = fit_table(table, FACTORS, RATIOS).loc[('f1', 'r1'), 'slope']
+    assert abs(fits.loc[('f1', 'r1'), 'slope'] - 0.5) < abs(ols_slope - 0.5)
+
+
+def test_line_data_band(table):
+    fit = fit_table(table, FACTORS, RATIOS).loc[('f1', 'r1')]
+    line = line_data(fit, 1, 10, points=11)
+    np.testing.assert_allclose(line['fit'], fit['intercept'] + fit['slope'] * np.linspace(1, 10, 11))
+    assert (line['lower'] < line['fit']).all() and (line['fit'] < line['upper']).all()
+    # Narrowest at the mean of x
+    widths = line['upper'] - line['lower']
+    assert widths.idxmin() == int(np.argmin(np.abs(line['x'] - fit['x_mean'])))
+
+
+def test_bootstrap_brackets_the_fit(table):
+    fits = fit_table(table, FACTORS, RATIOS)
+    intervals = bootstrap_table(table, FACTORS, RATIOS, draws=400, seed=3)
+    assert intervals.index.equals(fits.index)
+    pd.testing.assert_frame_equal(intervals, bootstrap_table(table, FACTORS, RATIOS, draws=400, seed=3))
+    slopes = fits['slope']
+    assert ((intervals['slope_lower'] <= slopes) & (slopes <= intervals['slope_upper'])).all()
+
+
+@pytest.mark.parametrize('rows', [0, 1, 2])
+def test_small_selections_have_no_interval(table, rows):
+    # An empty or tiny country selection: NaN fits, bands and intervals, and no RuntimeWarning on the way
+    small = table.head(rows)
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        fits = fit_table(small, FACTORS, RATIOS, robust=True)
+        line = line_data(fits.loc[('f1', 'r1')], 1, 10)
+        intervals = bootstrap_table(small, FACTORS, RATIOS, draws=50)
+    assert intervals.index.equals(fits.index)
+    assert intervals.isna().all().all()
+    assert line[['lower', 'upper']].isna().all().all()
@@ -0,0 +1,60 @@
+"""Rollups extended after an ingest vs built from scratch."""
+import logging
+
+import numpy as np
+import pytest
+
+from conftest import raw_weekly
+from data_loader import prepare_weekly
+from rollups import LEVELS, RegionRollup
+
+
+def assert_same_rollup(rollup, expected):
+    np.testing.assert_array_equal(rollup.groups, expected.groups)
+    np.testing.assert_array_equal(rollup.membership, expected.membership)
+    assert rollup.parents == expected.parents
+    np.testing.assert_array_equal(rollup.cube.weeks, expected.cube.weeks)
+    np.testing.assert_allclose(rollup.cube.values, expected.cube.values, rtol=1e-6, equal_nan=True)
+
+
+def test_first_changed_week(loads):
+    (_, previous), (_, cube) = loads
+    assert cube.first_changed_week(previous) == 12
+    assert cube.first_changed_week(cube) == len(cube.weeks)
+
+
+@pytest.mark.parametrize('level', list(LEVELS))
+def test_extended_rollup_matches_full_build(loads, level):
+    (earlier, previous), (current, cube) = loads
+    rollup = RegionRollup.from_weekly(earlier, previous, level)
+    rollup.extend(cube, cube.first_changed_week(previous))
+    assert_same_rollup(rollup, RegionRollup.from_weekly(current, cube, level))
+
+
+def revise(raw, country, column, change):
+    raw = raw.copy()
+    rows = raw['Country_Region'] == country
+    raw.loc[rows, column] = change(raw.loc[rows, column])
+    return raw
+
+
+@pytest.mark.parametrize('change, extended', [
+    (None, 'Regions, Sub-regions'),
+    (('Italy', 'Population', lambda population: 2 * population), 'no'),  # per 100k of both levels
+    (('Spain', 'Density (P/Km²)', lambda density: density / 4), 'no'),  # per km²
+    (('Japan', 'region', lambda _: 'Europe'), 'no'),  # a new region, and a new parent of Eastern Asia
+    (('Chile', 'sub-region', lambda _: 'South America'), 'Regions'),  # a new sub-region in the same region
+], ids=['unchanged', 'population', 'density', 'region', 'sub-region'])
+def test_from_sources_rebuilds_rollups_when_the_metadata_changes(load_sources, caplog, change, extended):
+    raw = raw_weekly()
+    weeks = sorted(raw['Week_Start_Date'].unique())
+    previous = load_sources(raw[raw['Week_Start_Date'] < weeks[20]])
+    if change is not None:
+        raw = revise(raw, *change)
+
+    with caplog.at_level(logging.INFO, logger='queries'):
+        queries = load_sources(raw, previous)
+    current = prepare_weekly(raw)
+    for level in LEVELS:
+        assert_same_rollup(queries.rollups[level], RegionRollup.from_weekly(current, queries.cube, level))
+    assert f'Extended the {extended} rollups' in caplog.text
@@ -0,0 +1,64 @@
+"""Publish -> open -> prune round trips of the shared memory-mapped store."""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import raw_weekly
+from query_cache import QueryCache
+from rollups import LEVELS
+from shared_store import current_version, open_dashboard, open_version, publish
+
+
+@pytest.fixture
+def versions(load_sources):
+    """Two loads of the synthetic sources, the second with a revised week (so another data version)."""
+    raw = raw_weekly()
+    first = load_sources(raw)
+    raw.loc[raw['Week_Start_Date'] == raw['Week_Start_Date'].max(), 'Deaths'] += 10
+    second = load_sources(raw)
+    assert first.version != second.version
+    return first, second
+
+
+def assert_same_data(opened, queries):
+    np.testing.assert_array_equal(opened.cube.values, queries.cube.values)
+    for level in LEVELS:
+        np.testing.assert_array_equal(opened.rollups[level].cube.values, queries.rollups[level].cube.values)
+    pd.testing.assert_frame_equal(opened.plot2, queries.plot2)
+    # Answered from the mapped arrays, not from the results `queries` cached under the same version
+    opened.cache = QueryCache()
+    metric, unit = queries.cube.metrics[0], queries.cube.units[1]
+    pd.testing.assert_frame_equal(opened.series(['Italy', 'Peru'], None, None, metric, unit),
+                                  queries.series(['Italy', 'Peru'], None, None, metric, unit))
+    pd.testing.assert_frame_equal(opened.regression(), queries.regression())
+
+
+def test_publish_open_prune(tmp_path, versions):
+    first, second = versions
+    store = str(tmp_path / 'store')
+    first_name = publish(first, store, keep=1)
+    assert current_version(store) == first_name
+    opened, report = open_version(first_name, store)
+    assert report.shared and opened.version == first.version
+    assert not opened.cube.values.flags.writeable  # a read-only view of the mapping
+    assert_same_data(opened, first)
+
+    second_name = publish(second, store, keep=1)
+    assert current_version(store) == second_name
+    assert sorted(name for name in os.listdir(store) if name[0].isdigit()) == [second_name]
+    assert_same_data(open_version(second_name, store)[0], second)
+
+
+def test_open_dashboard_skips_a_pruned_version(tmp_path, versions):
+    # A worker read CURRENT, then a publish pruned that version before the worker opened it
+    first, second = versions
+    store = str(tmp_path / 'store')
+    first_name = publish(first, store, keep=1)
+    publish(second, store, keep=1)
+    with pytest.raises(FileNotFoundError):
+        open_version(first_name, store)
+    opened, _ = open_dashboard(store, name=first_name)
+    assert opened.version == second.version
+    assert open_dashboard(store)[0].version == second.version
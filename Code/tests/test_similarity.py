@@ -0,0 +1,32 @@
+"""Similarity search against a direct z-normalized distance, and an index extended after an ingest vs built again."""
+import numpy as np
+import pandas as pd
+
+from similarity import SimilarityIndex
+
+UNIT = 'Weekly Case per 100k'
+
+
+def test_most_similar_matches_direct_distances(loads):
+    _, (_, cube) = loads
+    index = SimilarityIndex.from_cube(cube, 'Confirmed', UNIT)
+    series = np.nan_to_num(cube.values[:, :, cube.metric_index['Confirmed'], cube.unit_index[UNIT]].astype(np.float64))
+    z = (series - series.mean(axis=1, keepdims=True)) / series.std(axis=1, keepdims=True)
+    distances = np.sqrt(((z[:, None, :] - z[None, :, :]) ** 2).sum(axis=-1))
+
+    i = cube.country_index['Italy']
+    nearest = index.most_similar('Italy', 3)
+    order = [j for j in np.argsort(distances[i]) if j != i][:3]
+    assert list(nearest['Country_Region']) == list(cube.countries[order])
+    np.testing.assert_allclose(nearest['distance'], distances[i, order], rtol=1e-6)
+    np.testing.assert_allclose(nearest['correlation'], [np.corrcoef(series[i], series[j])[0, 1] for j in order])
+
+
+def test_extended_similarity_matches_full_build(loads):
+    (_, previous), (_, cube) = loads
+    index = SimilarityIndex.from_cube(previous, 'Confirmed', UNIT).extend(cube, previous)
+    expected = SimilarityIndex.from_cube(cube, 'Confirmed', UNIT)
+    assert index.n_weeks == expected.n_weeks
+    for name in ['sums', 'squares', 'gram']:
+        np.testing.assert_allclose(getattr(index, name), getattr(expected, name), rtol=1e-9)
+    pd.testing.assert_frame_equal(index.most_similar('Italy', 3), expected.most_similar('Italy', 3))
@@ -0,0 +1,57 @@
+"""
+Bundled world geometry for the Part 1 choropleth.
+
+The TopoJSON files in 'Cleaned Data/geo' are built by build_world_geometry.py
+and versioned by file name. Case values are joined onto the country
+geometries on the server, so the browser receives a single dataset with no
+CDN fetch and no client-side lookup.
+"""
+import copy
+import json
+import os
+from functools import lru_cache
+
+import numpy as np
+
+from data_loader import DATA_DIR
+
+GEOMETRY_DIR = os.path.join(DATA_DIR, 'geo')
+GEOMETRY_VERSION = 1
+
+# level -> (quantization, simplification tolerance in degrees)
+GEOMETRY_LEVELS = {
+    'Standard': (1e5, 0),
+    'Coarse': (1e4, 0.5),
+}
+
+
+def geometry_path(level):
+    return os.path.join(GEOMETRY_DIR, f'world-110m.v{GEOMETRY_VERSION}.{level.lower()}.topo.json')
+
+
+@lru_cache(maxsize=None)
+def load_topology(level='Standard'):
+    with open(geometry_path(level)) as f:
+        return json.load(f)
+
+
+def join_country_values(level, values):
+    """
+    Copy of the topology whose country geometries carry `Country_Region` and `Case`
+    properties; countries without a value keep only their id. `values` has
+    Country_Region, country-code and Case columns (e.g. CaseCube.mean_by_country).
+    """
+    topology = load_topology(level)
+    by_code = {int(code): (country, float(case)) for code, country, case
+               in zip(values['country-code'], values['Country_Region'], values['Case']) if np.isfinite(case)}
+
+    joined = dict(topology)  # arcs and transform are shared, only the geometries are copied
+    joined['objects'] = {'countries': copy.copy(topology['objects']['countries'])}
+    geometries = []
+    for geometry in topology['objects']['countries']['geometries']:
+        match = by_code.get(geometry.get('id'))
+        if match:
+            geometry = dict(geometry, properties={'Country_Region': match[0], 'Case': match[1]})
+        geometries.append(geometry)
+    joined['objects']['countries']['geometries'] = geometries
+    return joined